@@ -4,8 +4,16 @@ from src.common.config import settings
 import uvicorn
 from contextlib import asynccontextmanager
 from src.common.logger import get_logger
-from src.core.models import init_supabase_client, init_twilio_client, init_gemini_client
-from src.routes import webhook
+from src.core.models import init_supabase_client, init_twilio_client, init_gemini_client, init_history_store, init_artifact_cache
+from src.routes import deploy, health, history, preview, status, webhook
+from src.handlers.vercel import close_vercel_client
+from src.handlers.whatsapp import deliver_message
+from src.services.deploy import drain_deploys
+from src.services.health import start_health_monitor, stop_health_monitor
+from src.services.outbound import start_outbound_scheduler, stop_outbound_scheduler
+from src.services.resilience import DeadlineMiddleware
+from src.services.usage import start_usage_ledger, stop_usage_ledger
+from src.services.write_behind import start_write_behind, stop_write_behind
 
 logger = get_logger(__name__)
 
@@ -20,6 +28,12 @@ async def lifespan(app: FastAPI):
         app.state.supabase = await init_supabase_client()
         app.state.twilio = init_twilio_client()
         app.state.gemini = init_gemini_client()
+        app.state.history = init_history_store(app.state.gemini)
+        app.state.artifacts = init_artifact_cache()
+        app.state.outbound = start_outbound_scheduler(deliver_message)
+        app.state.writes = start_write_behind(app.state.supabase)
+        app.state.usage = start_usage_ledger(app.state.writes)
+        app.state.health = start_health_monitor(app.state)
         
         logger.info("Application started successfully")
 
@@ -29,6 +43,16 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("Shutting down SiteshipAI API")
+        await stop_health_monitor()
+        # Jobs still need the clients and the outbound queue to finish or report failure
+        await drain_deploys(app.state, settings.DEPLOY_DRAIN_TIMEOUT_SECONDS)
+        gemini = getattr(app.state, "gemini", None)
+        if gemini is not None:
+            gemini.prompt_cache.stop()
+        await close_vercel_client()
+        await stop_outbound_scheduler()
+        await stop_usage_ledger()
+        await stop_write_behind()
     
 
 def create_app() -> FastAPI:
@@ -45,7 +69,13 @@ def create_app() -> FastAPI:
         redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
         lifespan=lifespan,
     )
+    app.include_router(health.router)
     app.include_router(webhook.router)
+    app.include_router(deploy.router)
+    app.include_router(history.router)
+    app.include_router(preview.router)
+    app.include_router(status.router)
+    app.add_middleware(DeadlineMiddleware)
     return app
 
 
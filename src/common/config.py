@@ -2,7 +2,7 @@
 Configuration settings for the EPD Product Linking.
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import Field, field_validator, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -26,6 +26,18 @@ class Settings(BaseSettings):
         ..., description="Secret key for signature verification"
     )
     ENABLE_AUTH: bool = Field(default=True, description="Enable API authentication")
+    WEBHOOK_MAX_BODY_BYTES: int = Field(
+        16 * 1024, description="Inbound webhook bodies larger than this are rejected"
+    )
+    PUBLIC_BASE_URL: Optional[str] = Field(
+        None, description="Externally reachable base URL of this API, used for deploy callback URLs"
+    )
+    API_KEY: Optional[SecretStr] = Field(
+        None, description="Bearer token for the history and export API"
+    )
+    HISTORY_PAGE_SIZE: int = Field(50, description="Default page size of the history API")
+    HISTORY_MAX_PAGE_SIZE: int = Field(200, description="Largest page size the history API accepts")
+    EXPORT_PAGE_SIZE: int = Field(500, description="Rows fetched per query while streaming an export")
 
     ALLOWED_ORIGINS: List[str] = Field(
         default=[
@@ -61,23 +73,62 @@ class Settings(BaseSettings):
 
     # OPENAI_API_KEY: str = Field(..., description="OpenAI API key")
     EMBEDDING_MODEL: str = Field(
-        "text-embedding-3-large", description="OpenAI embedding model name"
+        "gemini-embedding-001", description="Gemini embedding model name"
     )
     EMBEDDING_MODEL_DIMENSION: int = Field(
         3072,
-        description="The text-embedding-3-large model has a size of 3072 dimensions",
+        description="The gemini-embedding-001 model has a size of up to 3072 dimensions",
     )
     EMBEDDING_MODEL_PRICE: float = Field(
-        0.13,
-        description="The pricing for text-embedding-3-large is $0.13 per 1 million tokens",
+        0.15,
+        description="The pricing for gemini-embedding-001 is $0.15 per 1 million tokens",
     )
     COMPLETION_MODEL: str = Field(..., description="OpenAI completion model name")
 
     SUPPORTED_LLM_MODELS: List[str] = Field(
-        ["gemini-2.5-pro", "gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1"],
+        ["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite", "gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1"],
         description="Supported LLM models",
     )
-    
+    LLM_MODEL_TIERS: Dict[str, List[str]] = Field(
+        default={
+            "new_site": ["gemini-2.5-pro", "gemini-2.5-flash"],
+            "edit": ["gemini-2.5-flash", "gemini-2.5-pro"],
+            "summary": ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+            "plan": ["gemini-2.5-flash", "gemini-2.5-flash-lite"],
+        },
+        description="Candidate models per task type (new_site, edit, summary, plan), most preferred first",
+    )
+    LLM_EDIT_MAX_WORDS: int = Field(
+        default=40, description="Longest follow-up prompt, in words, routed to the edit tier instead of new_site"
+    )
+    LLM_THINKING_BUDGETS: Dict[str, int] = Field(
+        default={"gemini-2.5-pro": 128, "gemini-2.5-flash": 0, "gemini-2.5-flash-lite": 0},
+        description="Thinking budget per model (gemini-2.5-pro cannot disable thinking, 128 is its minimum)",
+    )
+    LLM_TIMEOUT_SECONDS: float = Field(
+        default=120.0, description="Per-model timeout before falling back to the next model in the tier"
+    )
+    LLM_HEDGE_ENABLED: bool = Field(
+        default=False, description="Send a hedged request to the next model once the primary passes its p95 latency"
+    )
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=4, description="Maximum number of LLM requests in flight at once"
+    )
+    MULTI_PAGE_MAX_PAGES: int = Field(
+        default=6, description="Maximum number of pages generated for a multi-page site"
+    )
+    LLM_MODEL_PRICES: Dict[str, Dict[str, float]] = Field(
+        default={
+            "gemini-2.5-pro": {"input": 1.25, "cached_input": 0.31, "output": 10.0},
+            "gemini-2.5-flash": {"input": 0.30, "cached_input": 0.075, "output": 2.50},
+            "gemini-2.5-flash-lite": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+        },
+        description="USD per 1 million input, cached input and output (including thinking) tokens per model",
+    )
+    USAGE_FLUSH_INTERVAL_SECONDS: float = Field(
+        default=60.0, description="How often per-user and per-project usage rollups are written to the usage_rollups table"
+    )
+
     TELEGRAM_BOT_TOKEN: str = Field(
         ..., description="Telegram bot token for webhook integration"
     )
@@ -85,6 +136,26 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = Field(
         ..., description="Gemini API key for code generation"
     )
+
+    # The current system instructions are about 270 tokens, below every
+    # model's minimum, so no cache is created until the prefix grows past
+    # PROMPT_CACHE_MIN_TOKENS. /status/upstreams reports it under below_minimum.
+    PROMPT_CACHE_ENABLED: bool = Field(
+        default=True, description="Cache the fixed system instructions with the provider's context cache"
+    )
+    PROMPT_CACHE_TTL_SECONDS: int = Field(
+        default=3600, description="Lifetime of a cached instruction prefix"
+    )
+    PROMPT_CACHE_REFRESH_MARGIN_SECONDS: int = Field(
+        default=300, description="Extend a cached prefix this long before it expires"
+    )
+    PROMPT_CACHE_MIN_TOKENS: Dict[str, int] = Field(
+        default={"gemini-2.5-flash": 1024, "gemini-2.5-pro": 4096},
+        description="Minimum cacheable prefix size per model; smaller prefixes are sent inline",
+    )
+    PROMPT_CACHE_DEFAULT_MIN_TOKENS: int = Field(
+        default=4096, description="Minimum cacheable prefix size for models not in PROMPT_CACHE_MIN_TOKENS"
+    )
     
     TWILIO_ACCOUNT_SID: str = Field(
        ..., description="Twillio Account SID"
@@ -93,11 +164,108 @@ class Settings(BaseSettings):
     TWILIO_AUTH_TOKEN: str = Field(
        ..., description="Twillio Auth Token"
     )
+    TWILIO_HTTP_TIMEOUT_SECONDS: float = Field(
+        10.0, description="Timeout of a single Twilio API request, so blocking calls in threads cannot hang"
+    )
+
+    VERCEL_TOKEN: Optional[str] = Field(
+        None, description="Vercel API token; when unset, deploys go through the vercel-deploy edge function"
+    )
+    VERCEL_TEAM_ID: Optional[str] = Field(None, description="Vercel team to deploy into")
+    VERCEL_API_URL: str = Field("https://api.vercel.com", description="Vercel API base URL")
+    VERCEL_UPLOAD_CONCURRENCY: int = Field(8, description="Parallel file uploads per deployment")
+    VERCEL_DEPLOY_TIMEOUT_SECONDS: float = Field(
+        300.0, description="How long to wait for a deployment to become ready"
+    )
+
+    OUTBOUND_COALESCE_WINDOW_SECONDS: float = Field(
+        0.3, description="Messages to the same recipient queued within this window are merged into one"
+    )
+    OUTBOUND_MESSAGES_PER_SECOND: float = Field(
+        20.0, description="Outbound message budget per sender number"
+    )
+    OUTBOUND_BURST: int = Field(20, description="Outbound burst size per sender number")
 
-   
+    REQUEST_TIMEOUT_SECONDS: float = Field(
+        14.0, description="Deadline for handling an HTTP request (Twilio gives up on webhooks after 15 seconds)"
+    )
+    DEPLOY_JOB_TIMEOUT_SECONDS: float = Field(600.0, description="Deadline for a background deploy job")
+    DEPLOY_MAX_RUNNING_JOBS: int = Field(
+        50, description="New requests are turned away with a busy reply beyond this many running deploy jobs"
+    )
+    DEPLOY_DRAIN_TIMEOUT_SECONDS: float = Field(
+        20.0, description="Time running deploy jobs get to finish on shutdown before they are cancelled"
+    )
+    DEPLOY_CALLBACK_TOKEN_MAX_AGE_SECONDS: int = Field(
+        3600, description="Deploy callback tokens older than this are rejected"
+    )
+    UPSTREAM_TIMEOUT_SECONDS: Dict[str, float] = Field(
+        default={"edge_function": 300.0, "gemini": 300.0, "embeddings": 15.0, "storage": 30.0, "twilio": 15.0},
+        description="Per-call timeout per upstream",
+    )
+    UPSTREAM_DEFAULT_TIMEOUT_SECONDS: float = Field(30.0, description="Per-call timeout for other upstreams")
+    UPSTREAM_MAX_CONCURRENCY: Dict[str, int] = Field(
+        default={"edge_function": 16, "storage": 16, "twilio": 16},
+        description="Upper bound of the adaptive concurrency limit per upstream (Gemini uses LLM_MAX_CONCURRENCY)",
+    )
+    UPSTREAM_DEFAULT_MAX_CONCURRENCY: int = Field(16, description="Concurrency limit for other upstreams")
+    UPSTREAM_MAX_QUEUE: int = Field(32, description="Calls that may wait for a concurrency slot per upstream")
+    UPSTREAM_LATENCY_TOLERANCE: float = Field(
+        2.0, description="Calls slower than this multiple of the average latency shrink the concurrency limit"
+    )
+    CIRCUIT_FAILURE_THRESHOLD: int = Field(5, description="Consecutive failures that open an upstream's circuit")
+    CIRCUIT_RESET_SECONDS: float = Field(30.0, description="How long a circuit stays open before a probe call")
+
+    BUILD_OPTIMIZE: bool = Field(
+        default=True, description="Minify and precompress generated sites before deploy"
+    )
+    BUILD_INLINE_CSS_MAX_BYTES: int = Field(
+        default=14 * 1024,
+        description="Inline style.css into the HTML when the minified stylesheet is at most this size",
+    )
+
+    PREVIEW_ENABLED: bool = Field(
+        default=True, description="Send a preview link as soon as the site is built, before the deploy finishes"
+    )
+    PREVIEW_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Memory budget of the preview artifact cache")
+    PREVIEW_CACHE_DIR: Optional[str] = Field(
+        "./tmp/previews", description="Disk tier of the preview artifact cache (unset for memory only)"
+    )
+    PREVIEW_DISK_MAX_ARTIFACTS: int = Field(500, description="Previews kept in the disk tier")
+
+    WRITE_BEHIND_BATCH_SIZE: int = Field(100, description="Rows per table that trigger an immediate write-behind flush")
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS: float = Field(
+        1.0, description="Maximum time a row waits in the write-behind buffer before it is written"
+    )
+    WRITE_BEHIND_MAX_ATTEMPTS: int = Field(
+        10, description="Attempts before a failing write-behind batch is moved to the spool's failed.jsonl"
+    )
+    WRITE_BEHIND_SPOOL_DIR: Optional[str] = Field(
+        "./tmp/write_behind", description="Spool for unwritten write-behind rows (unset to keep them in memory only)"
+    )
+
+    HEALTH_PROBES: List[str] = Field(
+        ["supabase", "gemini", "twilio", "browser"], description="Dependencies probed in the background for /readyz"
+    )
+    HEALTH_CRITICAL_PROBES: List[str] = Field(
+        ["supabase"], description="Probes that make the worker not ready when failing; others only mark it degraded"
+    )
+    HEALTH_PROBE_INTERVAL_SECONDS: float = Field(15.0, description="Time between background dependency probes")
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = Field(5.0, description="Timeout of a single dependency probe")
+    HEALTH_MAX_LOOP_LAG_SECONDS: float = Field(
+        1.0, description="Event-loop lag above which the worker reports not ready"
+    )
+    HEALTH_MAX_OUTBOUND_DEPTH: int = Field(1000, description="Queued outbound messages above which the worker reports not ready")
+    HEALTH_MAX_WRITE_BEHIND_DEPTH: int = Field(10000, description="Queued write-behind rows above which the worker reports not ready")
 
     CHUNK_SIZE: int = Field(100, description="Size of data processing chunks")
     TOP_K: int = Field(5, description="Number of top results to retrieve")
+    HISTORY_INDEX_DIR: str = Field(
+        "./tmp/index", description="Directory for the per-project history vector indexes"
+    )
+    HISTORY_RETRIEVE_TIMEOUT_SECONDS: float = Field(
+        5.0, description="Deploy jobs generate without project history when retrieving it takes longer"
+    )
 
     @field_validator("ALLOWED_ORIGINS", mode="before")
     @classmethod
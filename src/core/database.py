@@ -39,7 +39,7 @@ def init_db_client() -> Client:
             headers={"Authorization": f"Bearer {settings.SUPABASE_KEY}"}
         )
         
-        _db_client:Client = create_client(
+        _db_client = create_client(
             settings.SUPABASE_URL, settings.SUPABASE_KEY,options=options
         )
 
@@ -97,6 +97,8 @@ def check_db_health() -> bool:
         if client is None:
             return False
 
+        # A client object says nothing about the database; run the cheapest real query
+        client.table("users").select("id").limit(1).execute()
         return True
 
     except Exception as e:
@@ -3,7 +3,11 @@ import google.genai as genai
 from src.common.config import settings
 from src.common.logger import get_logger
 from supabase import create_async_client, Client as SupabaseClient
+from src.services.artifacts import ArtifactCache
 from src.services.gemini import Gemini
+from src.services.embeddings import GeminiEmbedder
+from src.services.history_index import HistoryStore
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client as TwilioClient
 
 logger = get_logger(__name__)
@@ -22,7 +26,8 @@ def init_twilio_client() -> TwilioClient:
     """
     Initialize and return the Twilio client.
     """
-    return TwilioClient(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    http_client = TwilioHttpClient(timeout=settings.TWILIO_HTTP_TIMEOUT_SECONDS)
+    return TwilioClient(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
 
 def init_gemini_client() -> Gemini:
     """
@@ -31,3 +36,20 @@ def init_gemini_client() -> Gemini:
     logger.info("Initializing Gemini client")
     initialize_gemini = genai.Client(api_key=settings.GEMINI_API_KEY)
     return Gemini(initialize_gemini)
+
+def init_history_store(gemini: Gemini) -> HistoryStore:
+    """
+    Initialize and return the project history index store.
+    """
+    embedder = GeminiEmbedder(gemini.client, settings.EMBEDDING_MODEL, settings.EMBEDDING_MODEL_DIMENSION)
+    return HistoryStore(embedder, settings.HISTORY_INDEX_DIR, chunk_size=settings.CHUNK_SIZE, top_k=settings.TOP_K)
+
+def init_artifact_cache() -> ArtifactCache:
+    """
+    Initialize and return the preview artifact cache.
+    """
+    return ArtifactCache(
+        settings.PREVIEW_CACHE_MAX_BYTES,
+        settings.PREVIEW_CACHE_DIR,
+        max_disk_artifacts=settings.PREVIEW_DISK_MAX_ARTIFACTS,
+    )
@@ -1,7 +1,10 @@
 # /backend/handlers/snapshot.py
 # Handles generating webpage snapshots using Playwright (Python's Puppeteer equivalent).
 
+import os
+
 from playwright.async_api import async_playwright
+from playwright.sync_api import sync_playwright
 
 async def generate_snapshot(url: str) -> bytes:
     """
@@ -15,4 +18,20 @@ async def generate_snapshot(url: str) -> bytes:
         await page.goto(url)
         screenshot_bytes = await page.screenshot()
         await browser.close()
-        return screenshot_bytes
\ No newline at end of file
+        return screenshot_bytes
+
+
+_chromium_path = None
+
+
+def check_browser() -> bool:
+    """
+    Checks that Playwright's Chromium build is installed. The driver is only
+    started on the first check, to look up the executable path; later checks
+    just look for the file. Blocking on the first call: run it in a thread.
+    """
+    global _chromium_path
+    if _chromium_path is None:
+        with sync_playwright() as p:
+            _chromium_path = p.chromium.executable_path
+    return os.path.exists(_chromium_path)
@@ -1,8 +1,9 @@
 # Handles Supabase database and storage operations.
+import json
 from datetime import datetime
 import aiofiles
-from fastapi.responses import JSONResponse
 from src.common.logger import get_logger
+from src.services.resilience import UpstreamUnavailable, get_upstream
 
 
 logger = get_logger(__name__)
@@ -19,36 +20,45 @@ async def save_html_to_storage(supabase_client, user_id: str, project_name: str,
     # Upload bytes
     bucket_file_path = f"{user_id}/{project_name}/{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
 
-    response = supabase_client.storage.from_(bucket_name).upload(
-        bucket_file_path, zip_data, {"content-type": "application/zip"}
+    bucket = supabase_client.storage.from_(bucket_name)
+    response = await get_upstream("storage").call(
+        lambda: bucket.upload(bucket_file_path, zip_data, {"content-type": "application/zip"})
     )
     
     if hasattr(response, 'error') and response.error:
         logger.error("Upload failed with error: %s", response.error)
 
     # Supabase public URL format
-    public_url = f"{supabase_client.storage.from_(bucket_name).get_public_url(bucket_file_path)}"
+    public_url = f"{await bucket.get_public_url(bucket_file_path)}"
 
     return public_url
 
-async def trigger_edge_function_and_deploy_to_vercel(supabase_client, payload: dict):
-    
+async def trigger_edge_function_and_deploy_to_vercel(supabase_client, payload: dict) -> dict:
+    """
+    Invokes the vercel-deploy edge function and returns its JSON result.
+
+    Errors are returned as ``{"status": "ERROR", "message": ...}`` rather than raised,
+    with ``"busy": True`` when the call was shed without reaching the function.
+    """
     try:
-        result = await supabase_client.functions.invoke(
-            'vercel-deploy',
-            invoke_options={
-                "method": "POST",
-                "headers": {
-                    "Content-Type": "application/json"
-                },
-                "body": payload
-            }
+        result = await get_upstream("edge_function").call(
+            lambda: supabase_client.functions.invoke(
+                'vercel-deploy',
+                invoke_options={
+                    "method": "POST",
+                    "headers": {
+                        "Content-Type": "application/json"
+                    },
+                    "body": payload
+                }
+            )
         )
 
-        return result
+        return json.loads(result) if isinstance(result, (bytes, str)) else result
 
+    except UpstreamUnavailable as e:
+        logger.warning(f"Edge function call shed: {e}")
+        return {"status": "ERROR", "message": f"Edge function unavailable: {str(e)}", "busy": True}
     except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"message": f"Error invoking edge function: {str(e)}"}
-        )
+        logger.error(f"Error invoking edge function: {e!r}")
+        return {"status": "ERROR", "message": f"Error invoking edge function: {str(e)}"}
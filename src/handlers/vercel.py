@@ -1,10 +1,216 @@
 # /backend/handlers/vercel.py
 # Handles deploying static files to Vercel.
 
-from typing import List
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-async def deploy_to_vercel(files: List[str]) -> str:
-    """Deploys a set of files to Vercel."""
-    # TODO: Implement the Vercel Deployments API call
-    print(f"Deploying files to Vercel: {files}")
-    return "https://placeholder-deployment-url.vercel.app"
\ No newline at end of file
+import httpx
+from src.common.config import settings
+from src.common.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+READY_STATES = {"READY"}
+FAILED_STATES = {"ERROR", "CANCELED"}
+
+
+class VercelDeployError(Exception):
+    """Raised when a deployment cannot be created or does not become ready."""
+
+
+@dataclass
+class DeployFile:
+    name: str
+    data: bytes
+
+    @property
+    def sha(self) -> str:
+        return hashlib.sha1(self.data).hexdigest()
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class VercelClient:
+    """
+    Client for the Vercel Deployments API.
+
+    Files are referenced by SHA-1 when the deployment is created; only the
+    files Vercel reports as missing are uploaded, in parallel over one pooled
+    connection, before the deployment is created again and polled until ready.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        team_id: Optional[str] = None,
+        base_url: str = "https://api.vercel.com",
+        max_parallel_uploads: int = 8,
+        poll_interval: float = 1.0,
+        max_poll_interval: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.team_id = team_id
+        self.max_parallel_uploads = max_parallel_uploads
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token}"},
+            limits=httpx.Limits(max_connections=max_parallel_uploads, max_keepalive_connections=max_parallel_uploads),
+            timeout=httpx.Timeout(30.0),
+            transport=transport,
+        )
+
+    async def deploy(
+        self,
+        name: str,
+        files: Dict[str, bytes],
+        target: str = "production",
+        timeout: float = 300.0,
+        on_state: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Deploy ``files`` (path -> content) as project ``name``.
+
+        ``on_state`` is awaited with each new ``readyState`` while polling.
+        Returns the ready deployment, including its public ``url``.
+        """
+        deploy_files = [DeployFile(path, data) for path, data in files.items()]
+        deployment = await self.create_deployment(name, deploy_files, target)
+        if deployment.get("missing"):
+            missing = set(deployment["missing"])
+            await self.upload_files([f for f in deploy_files if f.sha in missing])
+            deployment = await self.create_deployment(name, deploy_files, target)
+            if deployment.get("missing"):
+                raise VercelDeployError(f"Files still missing after upload: {deployment['missing']}")
+        return await self.wait_until_ready(deployment["id"], timeout, on_state)
+
+    async def create_deployment(self, name: str, files: List[DeployFile], target: str = "production") -> Dict[str, Any]:
+        """Create a deployment. Returns ``{"missing": [sha, ...]}`` when files must be uploaded first."""
+        response = await self._client.post(
+            "/v13/deployments",
+            params=self._params(),
+            json={
+                "name": name,
+                "target": target,
+                "files": [{"file": f.name, "sha": f.sha, "size": f.size} for f in files],
+                "projectSettings": {"framework": None},
+            },
+        )
+        if response.status_code == 400:
+            error = response.json().get("error", {})
+            if error.get("code") == "missing_files":
+                return {"missing": error.get("missing", [])}
+        self._raise_for_status(response, "create deployment")
+        return response.json()
+
+    async def upload_files(self, files: List[DeployFile]) -> None:
+        """Upload ``files`` in parallel, deduplicated by SHA."""
+        unique = {f.sha: f for f in files}
+        semaphore = asyncio.Semaphore(self.max_parallel_uploads)
+
+        async def upload(file: DeployFile) -> None:
+            async with semaphore:
+                response = await self._client.post(
+                    "/v2/files",
+                    params=self._params(),
+                    content=file.data,
+                    headers={
+                        "Content-Type": "application/octet-stream",
+                        "x-vercel-digest": file.sha,
+                    },
+                )
+                self._raise_for_status(response, f"upload {file.name}")
+
+        await asyncio.gather(*(upload(f) for f in unique.values()))
+        logger.info(f"Uploaded {len(unique)} file(s) to Vercel")
+
+    async def wait_until_ready(
+        self,
+        deployment_id: str,
+        timeout: float = 300.0,
+        on_state: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Poll a deployment with exponential backoff until it is ready, failed or ``timeout`` passes."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        interval = self.poll_interval
+        last_state = None
+        while True:
+            response = await self._client.get(f"/v13/deployments/{deployment_id}", params=self._params())
+            self._raise_for_status(response, "get deployment")
+            deployment = response.json()
+            state = deployment.get("readyState")
+            if on_state is not None and state != last_state:
+                await on_state(state)
+            last_state = state
+            if state in READY_STATES:
+                deployment["url"] = _public_url(deployment.get("url", ""))
+                return deployment
+            if state in FAILED_STATES:
+                raise VercelDeployError(f"Deployment {deployment_id} finished with state {state}")
+            if loop.time() + interval > deadline:
+                raise VercelDeployError(f"Deployment {deployment_id} not ready after {timeout:.0f}s (state {state})")
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _params(self) -> Dict[str, str]:
+        return {"teamId": self.team_id} if self.team_id else {}
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, action: str) -> None:
+        if response.is_error:
+            raise VercelDeployError(f"Vercel failed to {action}: {response.status_code} {response.text[:200]}")
+
+
+_vercel_client: Optional[VercelClient] = None
+
+
+def get_vercel_client() -> Optional[VercelClient]:
+    """
+    Get the shared Vercel client, or None when no token is configured.
+    """
+    global _vercel_client
+
+    if _vercel_client is None and settings.VERCEL_TOKEN:
+        _vercel_client = VercelClient(
+            settings.VERCEL_TOKEN,
+            team_id=settings.VERCEL_TEAM_ID,
+            base_url=settings.VERCEL_API_URL,
+            max_parallel_uploads=settings.VERCEL_UPLOAD_CONCURRENCY,
+        )
+    return _vercel_client
+
+
+async def close_vercel_client() -> None:
+    """
+    Close the shared Vercel client connection pool.
+    """
+    global _vercel_client
+
+    if _vercel_client is not None:
+        await _vercel_client.aclose()
+        _vercel_client = None
+
+
+async def deploy_to_vercel(files: List[str], project_name: str = "siteship") -> str:
+    """Deploys a set of files to Vercel and returns the deployment URL."""
+    client = get_vercel_client()
+    if client is None:
+        raise VercelDeployError("VERCEL_TOKEN is not configured")
+    contents = {Path(path).name: Path(path).read_bytes() for path in files}
+    deployment = await client.deploy(project_name, contents, timeout=settings.VERCEL_DEPLOY_TIMEOUT_SECONDS)
+    return deployment["url"]
+
+
+def _public_url(host: str) -> str:
+    return host if host.startswith("http") else f"https://{host}"
@@ -1,21 +1,81 @@
+import base64
+import hashlib
+import hmac
 import os
+from typing import List, Tuple
+from urllib.parse import urlsplit
 import httpx
 from src.common.config import settings
 from src.common.logger import get_logger
+from src.services.outbound import Priority, get_outbound_scheduler
 logger = get_logger(__name__)
 from twilio.twiml.messaging_response import MessagingResponse
 
-def send_message(twilio_client, from_whatsapp_number:str, to_number:str, text: str) -> None:
+def send_message(twilio_client, from_whatsapp_number:str, to_number:str, text: str, priority: Priority = Priority.FINAL) -> None:
+    """Queue a WhatsApp message on the outbound scheduler.
+
+    Messages are sent directly when the scheduler is not running.
+
+    Args:
+        twilio_client: The Twilio client instance.
+        from_whatsapp_number (str): Our WhatsApp sender number.
+        to_number (str): Recipient number, e.g. 'whatsapp:+97798XXXXXXX'.
+        text (str): Message body.
+        priority (Priority): FINAL for results and replies, PROGRESS for status updates.
+    """
+    scheduler = get_outbound_scheduler()
+    if scheduler is None:
+        deliver_message(twilio_client, from_whatsapp_number, to_number, text)
+        return
+    scheduler.enqueue(twilio_client, from_whatsapp_number, to_number, text, priority)
+
+
+def deliver_message(twilio_client, from_whatsapp_number:str, to_number:str, text: str) -> None:
     """Send a WhatsApp message using Twilio.
 
     Args:
         twilio_client: The Twilio client instance.
-        from_whatsapp_number (str): _description_
-        to_number (str): _description_
-        text (str): _description_
+        from_whatsapp_number (str): Our WhatsApp sender number.
+        to_number (str): Recipient number, e.g. 'whatsapp:+97798XXXXXXX'.
+        text (str): Message body.
     """
     twilio_client.messages.create(
         body=text,
         from_=from_whatsapp_number,
         to=to_number  # e.g. 'whatsapp:+97798XXXXXXX'
     )
+
+
+def check_twilio(twilio_client) -> bool:
+    """Check the Twilio API is reachable and our account is active (blocking, run it in a thread)."""
+    account = twilio_client.api.v2010.accounts(settings.TWILIO_ACCOUNT_SID).fetch()
+    return account.status == "active"
+
+
+def compute_twilio_signature(url: str, params: List[Tuple[str, str]], auth_token: str) -> str:
+    """Compute the X-Twilio-Signature for a form-encoded request.
+
+    The URL is followed by every parameter name and value, sorted by name
+    and then value, signed with HMAC-SHA1 using the account auth token.
+    """
+    data = url + "".join(name + value for name, value in sorted(set(params)))
+    digest = hmac.new(auth_token.encode("utf-8"), data.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def is_valid_twilio_signature(url: str, params: List[Tuple[str, str]], signature: str, auth_token: str) -> bool:
+    """Check a Twilio signature in constant time, with and without the default port in the URL."""
+    expected = signature.encode("utf-8")
+    for candidate in _url_port_variants(url):
+        if hmac.compare_digest(compute_twilio_signature(candidate, params, auth_token).encode("ascii"), expected):
+            return True
+    return False
+
+
+def _url_port_variants(url: str) -> List[str]:
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    default_port = 443 if parts.scheme == "https" else 80
+    without_port = parts._replace(netloc=host).geturl()
+    with_port = parts._replace(netloc=f"{host}:{parts.port or default_port}").geturl()
+    return [url] + [u for u in (without_port, with_port) if u != url]
@@ -0,0 +1,90 @@
+# routes/dependencies.py
+import hmac
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import Header, HTTPException, Request, status
+from src.common.config import settings
+from src.handlers.whatsapp import is_valid_twilio_signature
+
+
+@dataclass(slots=True, frozen=True)
+class InboundMessage:
+    """A parsed inbound WhatsApp message from the Twilio webhook."""
+
+    from_number: str
+    to_number: str
+    body: str
+    message_sid: Optional[str]
+    wa_id: Optional[str]
+    profile_name: Optional[str]
+
+
+async def inbound_whatsapp_message(request: Request) -> InboundMessage:
+    """
+    Read, authenticate and parse the Twilio webhook body exactly once.
+
+    Oversized bodies and unsigned requests are rejected before the body is
+    read; the signature is checked before any database or LLM work.
+    """
+    max_bytes = settings.WEBHOOK_MAX_BODY_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length is not None and (not content_length.isdigit() or int(content_length) > max_bytes):
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request body too large")
+
+    signature = request.headers.get("x-twilio-signature")
+    if settings.ENABLE_AUTH and not signature:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Missing signature")
+
+    if not request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected form-encoded body")
+
+    raw = bytearray()
+    async for chunk in request.stream():
+        raw += chunk
+        if len(raw) > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request body too large")
+
+    params = parse_qsl(raw.decode("utf-8", errors="replace"), keep_blank_values=True)
+    if settings.ENABLE_AUTH and not is_valid_twilio_signature(_signed_url(request), params, signature, settings.TWILIO_AUTH_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid signature")
+
+    form = dict(params)
+    missing = [name for name in ("From", "To", "Body") if name not in form]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Missing fields: {', '.join(missing)}")
+
+    return InboundMessage(
+        from_number=form["From"],
+        to_number=form["To"],
+        body=form["Body"],
+        message_sid=form.get("SmsMessageSid"),
+        wa_id=form.get("WaId"),
+        profile_name=form.get("ProfileName"),
+    )
+
+
+async def require_api_key(authorization: Optional[str] = Header(None)) -> None:
+    """Require ``Authorization: Bearer <API_KEY>`` when ENABLE_AUTH is on."""
+    if not settings.ENABLE_AUTH:
+        return
+    if settings.API_KEY is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="API key not configured")
+
+    scheme, _, token = (authorization or "").partition(" ")
+    expected = settings.API_KEY.get_secret_value().encode("utf-8")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode("utf-8"), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def _signed_url(request: Request) -> str:
+    """The URL Twilio requested, which is what it signs (PUBLIC_BASE_URL when behind a proxy)."""
+    if settings.PUBLIC_BASE_URL:
+        url = settings.PUBLIC_BASE_URL.rstrip("/") + request.url.path
+        return f"{url}?{request.url.query}" if request.url.query else url
+    return str(request.url)
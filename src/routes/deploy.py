@@ -0,0 +1,24 @@
+# routes/deploy.py
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from src.common.logger import get_logger
+from src.services.deploy import handle_deploy_event
+from src.services.deploy_jobs import verify_job_token
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/deploy-callback")
+async def deploy_callback(request: Request, token: str, event: Dict[str, Any]):
+    """Receive progress and completion events for a deploy job."""
+    job = verify_job_token(token)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid callback token")
+
+    logger.info(f"Deploy event {event.get('event')} ({event.get('status')}) for job {job.job_id}")
+    applied = await handle_deploy_event(request.app.state, job, event)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"success": True, "applied": applied})
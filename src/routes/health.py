@@ -0,0 +1,26 @@
+# routes/health.py
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from src.services.health import NOT_READY, get_health_monitor
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: answered from memory, so it only fails when the worker cannot respond at all."""
+    monitor = get_health_monitor()
+    return monitor.liveness() if monitor is not None else {"status": "alive"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness from the cached dependency probes, event-loop lag and queue saturation."""
+    monitor = get_health_monitor()
+    if monitor is None:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": NOT_READY, "problems": ["health monitor not running"]},
+        )
+    ready, report = monitor.readiness()
+    return JSONResponse(status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE, content=report)
@@ -0,0 +1,58 @@
+# routes/history.py
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.routes.dependencies import require_api_key
+from src.services.db import get_projects_page, get_prompts_page
+from src.services.export import export_user_history
+from src.utils.pagination import decode_cursor, encode_cursor
+
+logger = get_logger(__name__)
+
+router = APIRouter(dependencies=[Depends(require_api_key)])
+
+PageSize = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE)
+
+
+@router.get("/users/{user_id}/projects")
+async def list_projects(request: Request, user_id: str, limit: int = PageSize, cursor: Optional[str] = None):
+    """A page of the user's projects, newest first."""
+    rows = await get_projects_page(request.app.state.supabase, user_id, limit + 1, _after(cursor))
+    return _page(rows, limit)
+
+
+@router.get("/projects/{project_id}/prompts")
+async def list_prompts(request: Request, project_id: str, limit: int = PageSize, cursor: Optional[str] = None):
+    """A page of the project's prompt history, newest first."""
+    rows = await get_prompts_page(request.app.state.supabase, project_id, limit + 1, _after(cursor))
+    return _page(rows, limit)
+
+
+@router.get("/users/{user_id}/export")
+async def export_history(request: Request, user_id: str):
+    """Stream all of the user's projects and prompts as NDJSON."""
+    return StreamingResponse(
+        export_user_history(request.app.state.supabase, user_id, settings.EXPORT_PAGE_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="siteship-export.ndjson"'},
+    )
+
+
+def _after(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _page(rows: Optional[List[Dict[str, Any]]], limit: int) -> Dict[str, Any]:
+    """One page of items; one extra row was fetched to tell whether another page follows."""
+    if rows is None:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Database query failed")
+    items = rows[:limit]
+    return {"items": items, "next_cursor": encode_cursor(items[-1]) if len(rows) > limit else None}
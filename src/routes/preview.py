@@ -0,0 +1,71 @@
+# routes/preview.py
+import mimetypes
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import RedirectResponse
+from src.services.artifacts import Artifact
+
+router = APIRouter(prefix="/preview")
+
+# Previews are addressed by content hash, so a version never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+ENCODING_PREFERENCE = ("br", "gzip")
+# Generated sites are untrusted and share the API's origin: run them in an
+# opaque origin (no cookies or storage of this host) and never sniff types
+SECURITY_HEADERS = {"Content-Security-Policy": "sandbox allow-scripts", "X-Content-Type-Options": "nosniff"}
+
+
+@router.get("/{project_id}/{version}")
+async def preview_root(project_id: str, version: str):
+    """Redirect to the trailing-slash URL so relative asset links resolve inside the preview."""
+    return RedirectResponse(f"/preview/{project_id}/{version}/", status_code=status.HTTP_308_PERMANENT_REDIRECT)
+
+
+@router.get("/{project_id}/{version}/{path:path}")
+async def preview_file(request: Request, project_id: str, version: str, path: str):
+    """Serve one file of a generated site from the artifact cache."""
+    artifact = await request.app.state.artifacts.get(version)
+    name = path or "index.html"
+    if artifact is None or artifact.project_id != project_id or name not in artifact.files:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Preview not found")
+
+    encoding = _negotiate(request.headers.get("accept-encoding", ""), artifact, name)
+    etag = f'"{artifact.etags[name]}-{encoding}"' if encoding else f'"{artifact.etags[name]}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding", **SECURITY_HEADERS}
+
+    if_none_match = _etag_list(request.headers.get("if-none-match", ""))
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = artifact.compressed[name][encoding] if encoding else artifact.files[name]
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _negotiate(accept_encoding: str, artifact: Artifact, name: str) -> str:
+    """The preferred precompressed variant the client accepts, or '' for the identity body."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    available = artifact.compressed.get(name, {})
+    for coding in ENCODING_PREFERENCE:
+        if coding in available and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return ""
+
+
+def _etag_list(header: str) -> List[str]:
+    """Entity tags in an If-None-Match header; weak tags compare equal to strong ones here."""
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
@@ -0,0 +1,29 @@
+# routes/status.py
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from src.routes.dependencies import require_api_key
+from src.services.deploy import running_jobs
+from src.services.resilience import upstreams_snapshot
+from src.services.usage import get_usage_ledger
+
+router = APIRouter(prefix="/status", dependencies=[Depends(require_api_key)])
+
+
+@router.get("/upstreams")
+async def upstream_status(request: Request):
+    """Concurrency limits, circuit breakers, model routing and prompt cache stats of every upstream."""
+    gemini = request.app.state.gemini
+    return {
+        "upstreams": upstreams_snapshot(),
+        "models": gemini.router.snapshot(),
+        "prompt_cache": gemini.prompt_cache.stats(),
+        "deploy_jobs": {"running": running_jobs()},
+    }
+
+
+@router.get("/usage")
+async def usage_summary(top: int = Query(20, ge=1, le=200)):
+    """LLM tokens, latency and estimated cost since startup, with the most expensive users and projects."""
+    ledger = get_usage_ledger()
+    if ledger is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Usage accounting is not running")
+    return ledger.summary(top)
@@ -1,15 +1,21 @@
 # routes/webhook.py
-from fastapi import APIRouter, Request, logger, status, Form
+import uuid
+from fastapi import APIRouter, Depends, Request, status
 from fastapi.responses import JSONResponse
 from src.handlers.whatsapp import send_message
-from src.handlers.supabase import save_html_to_storage, trigger_edge_function_and_deploy_to_vercel
+from src.services.outbound import Priority
+from src.handlers.supabase import save_html_to_storage
+from src.routes.dependencies import InboundMessage, inbound_whatsapp_message
+from src.services.deploy import accepting_deploys, start_deploy
+from src.services.resilience import BUSY_MESSAGE
+from src.services.deploy_jobs import DeployJob
+from src.utils.multipage import wants_multi_page
 from src.utils.parser import parse_mode_response_code, cleanup_temp_dir
 from src.common.logger import get_logger
 from src.services.db import (
     get_user_by_phone, create_user, update_user_state, create_project,
-    get_user_projects, get_project_by_id, save_prompt
+    get_user_projects, get_project_by_id
 )
-import json
 
 logger = get_logger(__name__)
 
@@ -17,19 +23,18 @@ router = APIRouter()
 
 
 @router.post("/whatsapp-webhook")
-async def whatsapp_webhook(request: Request, From: str = Form(...), To: str = Form(...), Body: str = Form(...)):
+async def whatsapp_webhook(request: Request, message: InboundMessage = Depends(inbound_whatsapp_message)):
     """Handle incoming WhatsApp webhook requests."""
+    From, To, Body = message.from_number, message.to_number, message.body
     logger.info(f"From: {From}, To: {To}, Body: {Body}")
     
     # Get clients from app.state
     supabase = request.app.state.supabase
     twilio = request.app.state.twilio
     
-    form_data = await request.form()
-    data = dict(form_data)
-    message_id = data.get('SmsMessageSid')
-    wa_id = data.get('WaId')
-    profile_name = data.get('ProfileName')
+    message_id = message.message_sid
+    wa_id = message.wa_id
+    profile_name = message.profile_name
 
     if not message_id or not wa_id or not Body:
         return {"ok": False, "reason": "Invalid payload"}
@@ -104,9 +109,14 @@ async def whatsapp_webhook(request: Request, From: str = Form(...), To: str = Fo
              send_message(twilio, To, From, "Welcome 👋\nI can help you build a website in minutes.\nDo you want to:\n1️⃣ Start a new project\n2️⃣ Continue existing project\nReply with 1 or 2.")
              return JSONResponse(status_code=status.HTTP_200_OK, content={"success": True})
 
-        send_message(twilio, To, From, "Generating Code... This may take awhile. 🚀")
+        if not accepting_deploys(request.app.state):
+            send_message(twilio, To, From, BUSY_MESSAGE)
+            return JSONResponse(status_code=status.HTTP_200_OK, content={"success": True})
+
+        send_message(twilio, To, From, "Generating Code... This may take awhile. 🚀", priority=Priority.PROGRESS)
         
-        await save_prompt(supabase, user_id, project_id, message_id, Body)
+        # The deploy job inserts the prompt row, so the webhook does not wait for it
+        prompt_id = str(uuid.uuid4())
 
         last_summary = project.get("last_ai_summary", "")
         
@@ -119,19 +129,14 @@ async def whatsapp_webhook(request: Request, From: str = Form(...), To: str = Fo
                 "message_id": message_id, 
                 "profile_name": profile_name,
                 "project_id": project_id,
-                "last_ai_summary": last_summary
+                "last_ai_summary": last_summary,
+                "multi_page": wants_multi_page(Body),
             }
         }
         
-        res = await trigger_edge_function_and_deploy_to_vercel(supabase, payload)
-        try:
-            res_json = json.loads(res)
-            if res_json:
-                send_message(twilio, To, From, f"Your request has been processed. Current Status: {res_json.get('status', 'Unknown')}")
-        except Exception as e:
-            logger.error(f"Error processing response: {e}")
-            send_message(twilio, To, From, "Something Went Wrong! Please Try Again.")
-            
+        job = DeployJob.create(user_id, project_id, prompt_id, sender=To, recipient=From)
+        start_deploy(request.app.state, job, payload)
+
         return JSONResponse(status_code=status.HTTP_200_OK, content={"success": True})
 
     # Default for existing user with no state (or IDLE)
@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of built sites for instant previews.
+
+Built sites are stored under a hash of their content: a bounded in-memory
+LRU tier serves recent previews, and a disk tier keeps older ones across
+evictions and restarts. Every file carries its precompressed variants from
+the build stage and a strong ETag derived from its content.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import shutil
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.common.logger import get_logger
+from src.utils.build import BuildResult
+
+
+logger = get_logger(__name__)
+
+VERSION_PATTERN = re.compile(r"^[0-9a-f]{20}$")
+
+
+@dataclass
+class Artifact:
+    project_id: str
+    version: str
+    files: Dict[str, bytes]
+    compressed: Dict[str, Dict[str, bytes]] = field(default_factory=dict)
+    etags: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_build(cls, project_id: str, build: BuildResult) -> "Artifact":
+        digest = hashlib.sha256(str(project_id).encode("utf-8"))
+        etags = {}
+        for name in sorted(build.files):
+            file_hash = hashlib.sha256(build.files[name]).hexdigest()
+            etags[name] = file_hash[:32]
+            digest.update(f"\0{name}\0{file_hash}".encode("utf-8"))
+        return cls(
+            project_id=str(project_id),
+            version=digest.hexdigest()[:20],
+            files=dict(build.files),
+            compressed={name: dict(variants) for name, variants in build.compressed.items()},
+            etags=etags,
+        )
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for data in self.files.values()) + sum(
+            len(data) for variants in self.compressed.values() for data in variants.values()
+        )
+
+
+class ArtifactCache:
+    """
+    Two-tier artifact store.
+
+    Args:
+        max_bytes: Memory budget of the LRU tier.
+        directory: Disk tier location; None keeps artifacts in memory only.
+        max_disk_artifacts: Oldest artifacts on disk are removed beyond this count.
+    """
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None, max_disk_artifacts: int = 500):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.max_disk_artifacts = max_disk_artifacts
+        self._memory: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def put(self, project_id: str, build: BuildResult) -> Artifact:
+        """Store a built site and return its artifact; storing the same content again is a no-op."""
+        artifact = Artifact.from_build(project_id, build)
+        self._remember(artifact)
+        if self.directory is not None:
+            try:
+                await asyncio.to_thread(self._write, artifact)
+            except OSError as e:
+                logger.error(f"Failed to write preview {artifact.version} to disk: {e}")
+        return artifact
+
+    async def get(self, version: str) -> Optional[Artifact]:
+        """The artifact for ``version`` from memory, else from disk, else None."""
+        artifact = self._memory.get(version)
+        if artifact is not None:
+            self._memory.move_to_end(version)
+            self.hits += 1
+            return artifact
+        if self.directory is not None and VERSION_PATTERN.match(version):
+            artifact = await asyncio.to_thread(self._read, version)
+            if artifact is not None:
+                self.disk_hits += 1
+                self._remember(artifact)
+                return artifact
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "artifacts": len(self._memory),
+            "bytes": self._memory_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, artifact: Artifact) -> None:
+        if artifact.version in self._memory:
+            self._memory.move_to_end(artifact.version)
+            return
+        if artifact.size > self.max_bytes:
+            return
+        self._memory[artifact.version] = artifact
+        self._memory_bytes += artifact.size
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+
+    def _write(self, artifact: Artifact) -> None:
+        target = self.directory / artifact.version
+        if target.exists():
+            return
+        staging = self.directory / f".{artifact.version}.tmp"
+        staging.mkdir(parents=True, exist_ok=True)
+        # Files are stored by index so generated names never become paths
+        manifest = {"project_id": artifact.project_id, "files": {}}
+        for index, (name, data) in enumerate(sorted(artifact.files.items())):
+            (staging / str(index)).write_bytes(data)
+            encodings = []
+            for encoding, encoded in artifact.compressed.get(name, {}).items():
+                (staging / f"{index}.{encoding}").write_bytes(encoded)
+                encodings.append(encoding)
+            manifest["files"][name] = {"index": index, "etag": artifact.etags[name], "encodings": encodings}
+        (staging / "manifest.json").write_text(json.dumps(manifest))
+        staging.rename(target)
+        self._prune()
+
+    def _read(self, version: str) -> Optional[Artifact]:
+        source = self.directory / version
+        try:
+            manifest = json.loads((source / "manifest.json").read_text())
+            artifact = Artifact(project_id=manifest["project_id"], version=version, files={})
+            for name, entry in manifest["files"].items():
+                index = entry["index"]
+                artifact.files[name] = (source / str(index)).read_bytes()
+                artifact.compressed[name] = {
+                    encoding: (source / f"{index}.{encoding}").read_bytes() for encoding in entry["encodings"]
+                }
+                artifact.etags[name] = entry["etag"]
+            return artifact
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _prune(self) -> None:
+        stored = sorted(
+            (path for path in self.directory.iterdir() if VERSION_PATTERN.match(path.name)),
+            key=lambda path: path.stat().st_mtime,
+        )
+        for path in stored[: max(0, len(stored) - self.max_disk_artifacts)]:
+            shutil.rmtree(path, ignore_errors=True)
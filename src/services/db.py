@@ -1,8 +1,23 @@
 from src.common.logger import get_logger
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 logger = get_logger(__name__)
 
+# Columns returned by the history API and export; large columns such as model_response stay out
+PROJECT_COLUMNS = "id,name,last_ai_summary,created_at"
+PROMPT_COLUMNS = "id,project_id,message_id,prompt_text,status,deploy_url,created_at"
+
+async def ping(supabase) -> bool:
+    """
+    Run the cheapest real query to check the database is reachable.
+    """
+    try:
+        await supabase.table("users").select("id").limit(1).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Database ping failed: {e}")
+        return False
+
 async def get_user_by_phone(supabase, phone_number: str) -> Optional[Dict[str, Any]]:
     """
     Get user by phone number.
@@ -81,9 +96,9 @@ async def get_project_by_id(supabase, project_id: str) -> Optional[Dict[str, Any
         logger.error(f"Error fetching project {project_id}: {e}")
         return None
 
-async def save_prompt(supabase, user_id: str, project_id: str, message_id: str, prompt_text: str, model_response: str = None) -> Optional[Dict[str, Any]]:
+async def save_prompt(supabase, user_id: str, project_id: str, message_id: str, prompt_text: str, prompt_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
-    Save a prompt to the prompts table.
+    Save a prompt to the prompts table, with a client-generated id when given.
     """
     try:
         data = {
@@ -91,8 +106,9 @@ async def save_prompt(supabase, user_id: str, project_id: str, message_id: str,
             "project_id": project_id,
             "message_id": message_id,
             "prompt_text": prompt_text,
-            "model_response": model_response
         }
+        if prompt_id:
+            data["id"] = prompt_id
         response = await supabase.table("prompts").insert(data).execute()
         if response.data:
             return response.data[0]
@@ -100,3 +116,92 @@ async def save_prompt(supabase, user_id: str, project_id: str, message_id: str,
     except Exception as e:
         logger.error(f"Error saving prompt for user {user_id}: {e}")
         return None
+
+async def update_project(supabase, project_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Update columns on a project.
+    """
+    try:
+        response = await supabase.table("projects").update(data).eq("id", project_id).execute()
+        if response.data:
+            return response.data[0]
+        return None
+    except Exception as e:
+        logger.error(f"Error updating project {project_id}: {e}")
+        return None
+
+async def update_prompt_status(supabase, prompt_id: str, data: Dict[str, Any]) -> Optional[bool]:
+    """
+    Update a prompt's deploy columns unless it already has a final status (READY or ERROR).
+
+    Returns True when this call updated the row, so callers can act only once per prompt,
+    False when the row already had a final status, and None when the update failed.
+    """
+    try:
+        response = await (
+            supabase.table("prompts")
+            .update(data)
+            .eq("id", prompt_id)
+            .or_("status.is.null,status.not.in.(READY,ERROR)")
+            .execute()
+        )
+        return bool(response.data)
+    except Exception as e:
+        logger.error(f"Error updating prompt {prompt_id}: {e}")
+        return None
+
+async def update_prompt_usage(supabase, prompt_id: str, data: Dict[str, Any]) -> bool:
+    """
+    Record the token, latency and cost columns of a prompt's generation.
+    """
+    try:
+        response = await supabase.table("prompts").update(data).eq("id", prompt_id).execute()
+        return bool(response.data)
+    except Exception as e:
+        logger.error(f"Error recording usage for prompt {prompt_id}: {e}")
+        return False
+
+async def write_rows(supabase, table: str, rows: List[Dict[str, Any]], on_conflict: str = "id", ignore_duplicates: bool = False) -> bool:
+    """
+    Bulk upsert rows into a table in one request.
+    """
+    try:
+        await supabase.table(table).upsert(rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Error writing {len(rows)} rows to {table}: {e}")
+        return False
+
+async def get_projects_page(supabase, user_id: str, limit: int, after: Optional[Tuple[str, str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Get one page of a user's projects, newest first.
+
+    ``after`` is the (created_at, id) of the last row of the previous page.
+    Returns None if the query failed.
+    """
+    return await _keyset_page(supabase, "projects", PROJECT_COLUMNS, "user_id", user_id, limit, after)
+
+async def get_prompts_page(supabase, project_id: str, limit: int, after: Optional[Tuple[str, str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Get one page of a project's prompts, newest first.
+
+    ``after`` is the (created_at, id) of the last row of the previous page.
+    Returns None if the query failed.
+    """
+    return await _keyset_page(supabase, "prompts", PROMPT_COLUMNS, "project_id", project_id, limit, after)
+
+async def _keyset_page(supabase, table: str, columns: str, column: str, value: str, limit: int, after: Optional[Tuple[str, str]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Keyset pagination on (created_at, id): rows strictly after the cursor in
+    descending order, so every page is an index range scan instead of an offset.
+    """
+    try:
+        query = supabase.table(table).select(columns).eq(column, value)
+        if after:
+            created_at, row_id = after
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")')
+        response = await query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
+        return response.data or []
+    except Exception as e:
+        logger.error(f"Error fetching {table} page for {column} {value}: {e}")
+        return None
@@ -0,0 +1,314 @@
+"""
+Site generation and deployment pipeline.
+
+Deploys run as detached jobs: the webhook returns as soon as a job is
+started, progress and completion arrive as deploy events (posted to
+``/deploy-callback`` by the edge function, or emitted in-process by the
+native Vercel path), and the user is notified once with the final result.
+
+When a Vercel token is configured the site is generated, built and deployed
+from this service directly. Otherwise, or if the native path fails, the
+request goes to the ``vercel-deploy`` Supabase edge function.
+"""
+
+import asyncio
+import dataclasses
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.handlers.supabase import trigger_edge_function_and_deploy_to_vercel
+from src.handlers.vercel import VercelClient, get_vercel_client
+from src.handlers.whatsapp import send_message
+from src.services.db import save_prompt, update_project, update_prompt_status, update_prompt_usage
+from src.services.deploy_jobs import DeployJob, callback_url
+from src.services.outbound import Priority
+from src.services.resilience import BUSY_MESSAGE, deadline_scope, get_upstream
+from src.services.router import classify_request
+from src.services.usage import usage_scope
+from src.utils.multipage import wants_multi_page
+from src.utils.build import BuildResult
+from src.utils.parser import build_site_files, extract_code_blocks
+from src.utils.validator import repair_site
+
+
+logger = get_logger(__name__)
+
+PROGRESS = "progress"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_running_jobs: Dict[asyncio.Task, DeployJob] = {}
+# Jobs whose final event was handled, oldest first: de-duplication for jobs without a
+# prompt row to record the final status on, or whose final status could not be written
+_finished_jobs: "OrderedDict[str, None]" = OrderedDict()
+_FINISHED_JOBS_MAX = 10000
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def start_deploy(app_state, job: DeployJob, payload: Dict[str, Any]) -> asyncio.Task:
+    """Start ``job`` in the background and return its task."""
+    payload["metadata"]["job_id"] = job.job_id
+    payload["metadata"]["callback_url"] = callback_url(job)
+    task = asyncio.create_task(run_deploy_job(app_state, job, payload))
+    _running_jobs[task] = job
+    task.add_done_callback(lambda done: _running_jobs.pop(done, None))
+    return task
+
+
+def running_jobs() -> int:
+    return len(_running_jobs)
+
+
+async def drain_deploys(app_state, timeout: float) -> None:
+    """
+    Wait up to ``timeout`` seconds for running deploy jobs to finish, then
+    cancel the rest and tell their users the request failed.
+    """
+    if not _running_jobs:
+        return
+    logger.info(f"Waiting for {len(_running_jobs)} running deploy jobs")
+    _, pending = await asyncio.wait(list(_running_jobs), timeout=timeout)
+    if not pending:
+        return
+    jobs = [_running_jobs[task] for task in pending]
+    logger.warning(f"Cancelling {len(pending)} deploy jobs still running at shutdown")
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for job in jobs:
+        await handle_deploy_event(app_state, job, {"event": FAILED, "message": "Cancelled at shutdown"})
+
+
+def accepting_deploys(app_state) -> bool:
+    """
+    Whether a new deploy job can be started now. When it cannot, the request
+    is turned away with a busy reply instead of queueing behind a degraded upstream.
+    """
+    if len(_running_jobs) >= settings.DEPLOY_MAX_RUNNING_JOBS:
+        return False
+    native = get_vercel_client() is not None and app_state.gemini.upstream.accepting()
+    return native or get_upstream("edge_function").accepting()
+
+
+async def run_deploy_job(app_state, job: DeployJob, payload: Dict[str, Any]) -> None:
+    """Deploy natively when possible, otherwise hand the job to the edge function."""
+    # The job outlives the webhook request, so it gets its own deadline. The
+    # deadline only bounds upstream calls, the timeout bounds everything else.
+    with deadline_scope(settings.DEPLOY_JOB_TIMEOUT_SECONDS, detach=True), \
+         usage_scope(job.user_id, job.project_id) as usage:
+        try:
+            async with asyncio.timeout(settings.DEPLOY_JOB_TIMEOUT_SECONDS):
+                job = await _persist_prompt(app_state, job, payload)
+                await _load_history(app_state, job, payload)
+                await _run_deploy_job(app_state, job, payload)
+        except TimeoutError:
+            logger.error(f"Deploy job {job.job_id} timed out after {settings.DEPLOY_JOB_TIMEOUT_SECONDS}s")
+            await handle_deploy_event(app_state, job, {"event": FAILED, "message": "Deploy job timed out"})
+        finally:
+            if job.prompt_id and usage.calls:
+                await update_prompt_usage(app_state.supabase, job.prompt_id, usage.columns())
+
+
+async def _run_deploy_job(app_state, job: DeployJob, payload: Dict[str, Any]) -> None:
+    client = get_vercel_client()
+    if client is not None:
+        try:
+            await deploy_natively(app_state, client, job, payload)
+            return
+        except Exception as e:
+            logger.error(f"Native deploy failed for job {job.job_id}, falling back to edge function: {e}")
+
+    result = await trigger_edge_function_and_deploy_to_vercel(app_state.supabase, payload)
+    if result.get("status") == "ERROR":
+        await handle_deploy_event(app_state, job, {"event": FAILED, **result})
+    elif result.get("url") or not payload["metadata"].get("callback_url"):
+        # The edge function answered with the final result instead of calling back
+        await handle_deploy_event(app_state, job, {"event": COMPLETED, **result})
+    else:
+        await handle_deploy_event(app_state, job, {"event": PROGRESS, "status": result.get("status", "QUEUED")})
+
+
+async def deploy_natively(app_state, client: VercelClient, job: DeployJob, payload: Dict[str, Any]) -> None:
+    """Generate code with Gemini, run the build stage and deploy it with the Vercel API."""
+    metadata = payload["metadata"]
+    last_summary = metadata.get("last_ai_summary") or ""
+    gemini = app_state.gemini
+
+    await handle_deploy_event(app_state, job, {"event": PROGRESS, "status": "GENERATING"})
+    files = await generate_site_files(gemini, payload)
+    build = build_site_files(files)
+    await publish_preview(app_state, job, build)
+
+    async def on_state(state: str) -> None:
+        await handle_deploy_event(app_state, job, {"event": PROGRESS, "status": state})
+
+    deployment, summary = await asyncio.gather(
+        client.deploy(
+            project_slug(payload["project_name"], job.project_id),
+            build.files,
+            timeout=settings.VERCEL_DEPLOY_TIMEOUT_SECONDS,
+            on_state=on_state,
+        ),
+        gemini.summarize_project(payload["prompt"], last_summary),
+    )
+    await handle_deploy_event(
+        app_state, job, {"event": COMPLETED, "status": deployment.get("readyState"), "url": deployment["url"], "summary": summary}
+    )
+    # The site is live and the user has the URL; indexing its pages can take its time
+    pages = [text for name, text in files.items() if name.endswith(".html")]
+    _in_background(app_state.history.add_site(job.project_id, *pages))
+
+
+async def publish_preview(app_state, job: DeployJob, build: BuildResult) -> Optional[str]:
+    """
+    Cache the built site for ``/preview`` and send the user its link while
+    the deploy is still running. Returns the preview URL, if one was sent.
+    """
+    if not settings.PREVIEW_ENABLED or not settings.PUBLIC_BASE_URL:
+        return None
+    artifact = await app_state.artifacts.put(job.project_id, build)
+    url = f"{settings.PUBLIC_BASE_URL.rstrip('/')}/preview/{job.project_id}/{artifact.version}/"
+    send_message(app_state.twilio, job.sender, job.recipient, f"Preview ready while we deploy:\n{url}", priority=Priority.PROGRESS)
+    return url
+
+
+async def generate_site_files(gemini, payload: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Generate the site files for a request.
+
+    Multi-page requests are planned once and their pages generated
+    concurrently; if that fails the request is built as a single page.
+    The files are then validated, and only files that cannot be fixed
+    locally are regenerated.
+    """
+    metadata = payload["metadata"]
+    last_summary = metadata.get("last_ai_summary") or ""
+    history = metadata.get("relevant_history")
+
+    files = None
+    if metadata.get("multi_page", wants_multi_page(payload["prompt"])):
+        try:
+            files = await gemini.generate_multi_page_site(payload["prompt"], last_summary, history=history)
+        except Exception as e:
+            logger.error(f"Multi-page generation failed, generating a single page instead: {e}")
+
+    if files is None:
+        code = await gemini.generate_website_code(
+            payload["prompt"],
+            last_summary,
+            task=classify_request(payload["prompt"], bool(last_summary)),
+            history=history,
+        )
+        files = extract_code_blocks(code)
+    return await repair_site(files, gemini.repair_file)
+
+
+async def handle_deploy_event(app_state, job: DeployJob, event: Dict[str, Any]) -> bool:
+    """
+    Apply a deploy event to the prompt and project rows.
+
+    Completion and failure notify the user exactly once per job; repeated
+    final events are ignored. Returns True when the event was applied.
+    """
+    kind = event.get("event")
+    status = event.get("status") or ("READY" if kind == COMPLETED else "ERROR" if kind == FAILED else "BUILDING")
+    if kind not in (PROGRESS, COMPLETED, FAILED):
+        logger.warning(f"Ignoring unknown deploy event {kind!r} for job {job.job_id}")
+        return False
+
+    if kind == PROGRESS:
+        if job.prompt_id:
+            return bool(await update_prompt_status(app_state.supabase, job.prompt_id, {"status": status}))
+        return True
+
+    final_status = "READY" if kind == COMPLETED else "ERROR"
+    if not await _claim_final(app_state, job, {"status": final_status, "deploy_url": event.get("url")}):
+        logger.info(f"Duplicate final event for job {job.job_id} ignored")
+        return False
+
+    if kind == COMPLETED:
+        if event.get("summary"):
+            await update_project(app_state.supabase, job.project_id, {"last_ai_summary": event["summary"]})
+        message = f"Your request has been processed. Current Status: {status}"
+        if event.get("url"):
+            message += f"\n{event['url']}"
+    else:
+        logger.error(f"Deploy job {job.job_id} failed: {event.get('message')}")
+        message = BUSY_MESSAGE if event.get("busy") else "Something Went Wrong! Please Try Again."
+
+    send_message(app_state.twilio, job.sender, job.recipient, message)
+    return True
+
+
+def project_slug(project_name: str, project_id: str) -> str:
+    """Vercel project name: lowercase letters, digits and dashes, at most 100 characters."""
+    slug = re.sub(r"[^a-z0-9]+", "-", project_name.lower()).strip("-") or "site"
+    suffix = re.sub(r"[^a-z0-9]", "", str(project_id).lower())[:8]
+    return f"{slug[:90]}-{suffix}".strip("-")
+
+
+async def _persist_prompt(app_state, job: DeployJob, payload: Dict[str, Any]) -> DeployJob:
+    """
+    Insert the job's prompt row before any status update targets it. The row
+    is written directly rather than through the write-behind buffer, because
+    status, deploy and usage updates must find it. If the insert fails the
+    job is tracked without the row.
+    """
+    if not job.prompt_id:
+        return job
+    saved = await save_prompt(
+        app_state.supabase, job.user_id, job.project_id, payload["metadata"].get("message_id"), payload["prompt"],
+        prompt_id=job.prompt_id,
+    )
+    if saved:
+        return job
+    logger.warning(f"Prompt row {job.prompt_id} could not be saved, deploy job {job.job_id} continues without it")
+    job = dataclasses.replace(job, prompt_id=None)
+    payload["metadata"]["callback_url"] = callback_url(job)
+    return job
+
+
+async def _load_history(app_state, job: DeployJob, payload: Dict[str, Any]) -> None:
+    """
+    Retrieve the project history relevant to the prompt, then index the
+    prompt itself in the background. Both need embedding calls, so they run
+    in the job rather than before the webhook replies; generation starts
+    without history if retrieving it takes longer than HISTORY_RETRIEVE_TIMEOUT_SECONDS.
+    """
+    metadata = payload["metadata"]
+    if "relevant_history" not in metadata:
+        try:
+            metadata["relevant_history"] = await asyncio.wait_for(
+                app_state.history.retrieve(job.project_id, payload["prompt"]), settings.HISTORY_RETRIEVE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"History retrieval for job {job.job_id} timed out, generating without it")
+            metadata["relevant_history"] = []
+    _in_background(app_state.history.add_prompt(job.project_id, payload["prompt"]))
+
+
+def _in_background(coroutine) -> asyncio.Task:
+    """Run best-effort work (history indexing) off the job's path, keeping a reference until it finishes."""
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _claim_final(app_state, job: DeployJob, data: Dict[str, Any]) -> bool:
+    """Whether this is the job's first final event. A failed status write still notifies the user."""
+    if job.job_id in _finished_jobs:
+        return False
+    if job.prompt_id:
+        claimed = await update_prompt_status(app_state.supabase, job.prompt_id, data)
+        if claimed is False:
+            return False
+        if claimed is None:
+            logger.error(f"Final status of job {job.job_id} not recorded on prompt {job.prompt_id}, notifying anyway")
+    _finished_jobs[job.job_id] = None
+    if len(_finished_jobs) > _FINISHED_JOBS_MAX:
+        _finished_jobs.popitem(last=False)
+    return True
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Deploy jobs and their signed callback URLs.
+
+A job's routing context (who to notify, which rows to update) travels inside
+an HMAC-signed token in the callback URL, so any worker can handle the
+callback without shared in-memory state.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from src.common.config import settings
+
+
+@dataclass(slots=True)
+class DeployJob:
+    job_id: str
+    user_id: str
+    project_id: str
+    prompt_id: Optional[str]
+    sender: str
+    recipient: str
+
+    @classmethod
+    def create(cls, user_id: str, project_id: str, prompt_id: Optional[str], sender: str, recipient: str) -> "DeployJob":
+        return cls(uuid.uuid4().hex, user_id, project_id, prompt_id, sender, recipient)
+
+
+def sign_job(job: DeployJob, issued_at: Optional[int] = None) -> str:
+    """Encode ``job`` and its issue time as ``<base64url json>.<hex hmac-sha256>``."""
+    data = {**asdict(job), "iat": int(time.time()) if issued_at is None else issued_at}
+    body = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{body}.{_signature(body)}"
+
+
+def verify_job_token(token: str) -> Optional[DeployJob]:
+    """
+    Decode a token produced by ``sign_job``. Returns None if it is malformed,
+    the signature does not match or it is older than DEPLOY_CALLBACK_TOKEN_MAX_AGE_SECONDS.
+    """
+    body, _, signature = token.partition(".")
+    try:
+        # Non-ASCII tokens make both the signature and compare_digest raise
+        if not body or not hmac.compare_digest(signature, _signature(body)):
+            return None
+        data = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+        age = time.time() - data.pop("iat")
+        # A minute of clock skew between workers is tolerated
+        if not -60 <= age <= settings.DEPLOY_CALLBACK_TOKEN_MAX_AGE_SECONDS:
+            return None
+        return DeployJob(**data)
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def callback_url(job: DeployJob) -> Optional[str]:
+    """Per-job callback URL, or None when PUBLIC_BASE_URL is not configured."""
+    if not settings.PUBLIC_BASE_URL:
+        return None
+    return f"{settings.PUBLIC_BASE_URL.rstrip('/')}/deploy-callback?token={sign_job(job)}"
+
+
+def _signature(body: str) -> str:
+    return hmac.new(settings.SIGNATURE_SECRET.encode("utf-8"), body.encode("ascii"), hashlib.sha256).hexdigest()
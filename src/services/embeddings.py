@@ -0,0 +1,70 @@
+"""
+Text embedders used by the project history index.
+"""
+
+import hashlib
+import re
+from typing import List, Protocol
+
+import google.genai as genai
+import numpy as np
+from google.genai import types
+from src.common.logger import get_logger
+from src.services.resilience import get_upstream
+
+
+logger = get_logger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(Protocol):
+    """Turns texts into a ``(len(texts), dimension)`` float32 matrix."""
+
+    dimension: int
+
+    async def embed(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray: ...
+
+
+class GeminiEmbedder:
+    """
+    Embeddings from the Gemini ``embed_content`` API, called through the
+    ``embeddings`` upstream so a stalled call times out and trips its breaker.
+    """
+
+    def __init__(self, client: genai.Client, model: str, dimension: int):
+        self.client = client
+        self.model = model
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray:
+        response = await get_upstream("embeddings").call(
+            lambda: self.client.aio.models.embed_content(
+                model=self.model,
+                contents=texts,
+                config=types.EmbedContentConfig(task_type=task_type, output_dimensionality=self.dimension),
+            )
+        )
+        return np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+
+
+class HashingEmbedder:
+    """
+    Deterministic local stand-in for tests and offline development.
+
+    Uses signed feature hashing of lower-cased word unigrams and bigrams, so
+    texts sharing vocabulary land close together.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = [t.lower() for t in _TOKEN_RE.findall(text)]
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                matrix[row, value % self.dimension] += 1.0 if value >> 63 else -1.0
+        return matrix
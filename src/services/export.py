@@ -0,0 +1,59 @@
+"""
+Streaming export of a user's projects and prompt history.
+
+Rows are read page by page with keyset pagination and written out as NDJSON
+as they arrive, so memory use stays at one page per table however long the
+history is.
+"""
+
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.common.logger import get_logger
+from src.services.db import get_projects_page, get_prompts_page
+
+
+logger = get_logger(__name__)
+
+PageFetcher = Callable[[Optional[Tuple[str, str]]], Awaitable[Optional[List[Dict[str, Any]]]]]
+
+
+class ExportError(Exception):
+    """Raised when a page query fails part-way through an export."""
+
+
+async def iter_pages(fetch: PageFetcher, page_size: int) -> AsyncIterator[Dict[str, Any]]:
+    """Yield every row from ``fetch(after)``, one page at a time."""
+    after = None
+    while True:
+        rows = await fetch(after)
+        if rows is None:
+            raise ExportError("Page query failed")
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["created_at"], str(rows[-1]["id"]))
+
+
+async def export_user_history(supabase, user_id: str, page_size: int) -> AsyncIterator[str]:
+    """
+    NDJSON lines for each of the user's projects, each followed by its prompts.
+
+    A failed query ends the stream with an ``error`` line, since the status
+    code has already been sent.
+    """
+    projects = iter_pages(lambda after: get_projects_page(supabase, user_id, page_size, after), page_size)
+    try:
+        async for project in projects:
+            yield _line("project", project)
+            prompts = iter_pages(lambda after: get_prompts_page(supabase, project["id"], page_size, after), page_size)
+            async for prompt in prompts:
+                yield _line("prompt", prompt)
+    except ExportError as e:
+        logger.error(f"Export for user {user_id} stopped early: {e}")
+        yield _line("error", {"message": "Export incomplete, please retry"})
+
+
+def _line(kind: str, row: Dict[str, Any]) -> str:
+    return json.dumps({"type": kind, **row}, default=str, ensure_ascii=False) + "\n"
@@ -1,9 +1,18 @@
+import asyncio
 import httpx
+import time
+from typing import Dict, List, Optional
 
 import google.genai as genai
 from google.genai import types
 from src.common.config import settings
 from src.common.logger import get_logger
+from src.services.resilience import create_upstream
+from src.services.prompt_cache import GeminiCacheProvider, PromptPrefixCache
+from src.services.router import InvalidResponse, ModelRouter, RoutedResult, TaskType
+from src.services.usage import LLMUsage, record_llm_usage
+from src.utils.parser import find_code_block
+from src.utils.multipage import PagePlan, SitePlan, assemble_site, extract_page_blocks, parse_site_plan
 
 
 logger = get_logger(__name__)
@@ -11,56 +20,327 @@ logger = get_logger(__name__)
 GEMINI_API_KEY = settings.GEMINI_API_KEY
 
 
+
+SYSTEM_INSTRUCTIONS = """
+You are an expert AI web developer.
+Your task is to generate a simple but complete static website based on the requirements given by the user.
+Please provide the HTML, CSS, and JavaScript code strictly in the output format below.
+---
+    ✅ Instructions:
+    - Create a single-page responsive website.
+    - Use only HTML, CSS, and minimal JavaScript if needed.
+    - Include clear structure: header, main, footer.
+    - Add placeholder text and cloud images if details are missing.
+    - Use clean, readable indentation.
+    - Write all code inline in one file.
+    - Do NOT include explanations — only the final code.
+    - style.css should be linked in the html file with <link rel="stylesheet" href="style.css"> inside <head>, and script.js with <script src="script.js"></script> just before </body>.
+    - Return the code block fenced in triple backticks with `html`, `css`, and `javascript` tags.
+---
+Example output format:
+```html
+<!-- Your generated HTML goes here -->
+```css
+<!-- Your generated CSS goes here -->
+```javascript
+<!--Your generated JavaScript goes here -->
+```
+"""
+
+SUMMARY_PROMPT = """
+Summarize this website project in at most five sentences for a developer who will make the next change.
+Keep earlier decisions unless the new request overrides them.
+
+Previous summary:
+{previous_summary}
+
+Latest request:
+{user_input}
+"""
+
+PLAN_PROMPT = """
+Plan a small multi-page static website for the requirements below. Do not write the pages yet.
+Respond with JSON only, in this shape:
+{{
+  "pages": [{{"file": "index.html", "title": "Home", "purpose": "What this page contains"}}],
+  "design": {{
+    "palette": {{"primary": "#...", "background": "#...", "text": "#..."}},
+    "typography": {{"body": "...", "headings": "..."}},
+    "shared_css": "CSS shared by every page: :root custom properties for the tokens, base elements, header, .site-nav, footer"
+  }}
+}}
+Use at most {max_pages} pages. The first page is the home page, index.html.
+
+{request}"""
+
+PAGE_INSTRUCTIONS = """
+You are an expert AI web developer building one page of a multi-page static website.
+You are given the requirements, the site plan with shared design tokens, and the page to build.
+---
+    ✅ Instructions:
+    - Build only the requested page, with a header, main and footer.
+    - Link the shared stylesheet with <link rel="stylesheet" href="style.css"> in <head>. The page's javascript block is linked automatically.
+    - Put an empty <nav data-site-nav></nav> inside the header; the site navigation is filled in automatically.
+    - Use the shared custom properties and classes. Only add CSS this page needs, with selectors prefixed by body[data-page="<page name>"].
+    - Add placeholder text and cloud images if details are missing.
+    - Do NOT include explanations — only the final code.
+    - Return the html block, then optional css and javascript blocks, fenced in triple backticks with `html`, `css`, and `javascript` tags.
+---
+"""
+
+REPAIR_PROMPT = """
+The file {name} of a generated static website has these problems:
+{problems}
+
+{context}
+
+Return only the complete corrected {name}, fenced in triple backticks with `{language}`. Change nothing else.
+"""
+
+# Fence languages accepted for each file type, the first one is asked for
+REPAIR_LANGUAGES = {".html": ("html",), ".css": ("css",), ".js": ("javascript", "js")}
+
+
 class Gemini:
     """ Service class for interacting with Gemini Pro API."""
     def __init__(self,client: genai.Client):
         self.client = client
+        self.prompt_cache = PromptPrefixCache(
+            GeminiCacheProvider(client),
+            SYSTEM_INSTRUCTIONS,
+            ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS,
+            refresh_margin_seconds=settings.PROMPT_CACHE_REFRESH_MARGIN_SECONDS,
+            min_tokens=settings.PROMPT_CACHE_MIN_TOKENS,
+            default_min_tokens=settings.PROMPT_CACHE_DEFAULT_MIN_TOKENS,
+        )
+        self.router = ModelRouter(
+            {task: self._tier_models(task) for task in TaskType},
+            timeout_seconds=settings.LLM_TIMEOUT_SECONDS,
+            hedge=settings.LLM_HEDGE_ENABLED,
+        )
+        self.upstream = create_upstream("gemini", max_concurrency=settings.LLM_MAX_CONCURRENCY)
         logger.info("Gemini client initialized")
 
-    async def generate_website_code(self,user_input: str) -> str:
-        """Generate static website code from Gemini Pro."""
-        get_prompt_template = self.generate_prompt_from_payload(user_input)
-        try: 
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=get_prompt_template,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=128) # Disables thinking
-                    
-                ),
+    async def generate_website_code(
+        self,
+        user_input: str,
+        project_summary: str = "",
+        task: TaskType = TaskType.NEW_SITE,
+        history: Optional[List[str]] = None,
+    ) -> str:
+        """Generate static website code, routed to the model tier for ``task``."""
+        contents = self.generate_prompt_suffix(user_input, project_summary, history)
+
+        async def call(model: str) -> str:
+            response = await self._generate(
+                task,
+                model=model,
+                contents=contents,
+                config=await self._generation_config(model, thinking_config=self._thinking_config(model)),
             )
-            # logger.info("Gemini response received: %s", model_text)
+            self.prompt_cache.record_usage(response.usage_metadata)
             return response.text
+
+        try: 
+            result = await self._route(task, call, validate=lambda text: bool(text) and "```html" in text)
+            logger.info(f"Website code generated by {result.model} in {result.latency:.1f}s (hedged: {result.hedged})")
+            return result.value
         except Exception as e:
             logger.exception("Error calling Gemini: %s", e)
             return f"Error calling Gemini: {str(e)}"
 
-    def generate_prompt_from_payload(self, user_input: str) -> str:
-        """Generate prompt from the payload."""
-        return f"""
-            You are an expert AI web developer.
-            Your task is to generate a simple but complete static website based on the following requirements:
-            {user_input}
-            Please provide the HTML, CSS, and JavaScript code strictly in the output format below.
-            ---
-                ✅ Instructions:
-                - Create a single-page responsive website.
-                - Use only HTML, CSS, and minimal JavaScript if needed.
-                - Include clear structure: header, main, footer.
-                - Add placeholder text and cloud images if details are missing.
-                - Use clean, readable indentation.
-                - Write all code inline in one file.
-                - Do NOT include explanations — only the final code.
-                - style.css should be linked in the html file <style src="style.css"></style> and script.js should be linked in the html file <script src="script.js"></script>. Please be sure to include these links inside the <header> tags in html code.
-                - Return the code block fenced in triple backticks with `html`, `css`, and `javascript` tags.
-            ---
-            Example output format:
-            ```html
-            <!-- Your generated HTML goes here -->
-            ```css
-            <!-- Your generated CSS goes here -->
-            ```javascript
-            <!--Your generated JavaScript goes here -->
-            ```
-            
+    async def summarize_project(self, user_input: str, previous_summary: str = "") -> str:
+        """Fold the latest request into the running project summary, using the summary tier."""
+        contents = SUMMARY_PROMPT.format(previous_summary=previous_summary or "(none)", user_input=user_input)
+
+        async def call(model: str) -> str:
+            response = await self._generate(
+                TaskType.SUMMARY,
+                model=model,
+                contents=contents,
+                config=types.GenerateContentConfig(thinking_config=self._thinking_config(model)),
+            )
+            return response.text
+
+        try:
+            result = await self._route(TaskType.SUMMARY, call, validate=lambda text: bool(text and text.strip()))
+            return result.value.strip()
+        except Exception as e:
+            logger.error(f"Error summarizing project: {e}")
+            return previous_summary
+
+    async def generate_multi_page_site(
+        self,
+        user_input: str,
+        project_summary: str = "",
+        history: Optional[List[str]] = None,
+    ) -> Dict[str, str]:
+        """
+        Generate a multi-page site: plan the pages and shared design with one
+        fast call, then generate every page concurrently and assemble them.
+
+        Pages other than the home page are left out if their generation fails.
+
+        Raises:
+            AllModelsFailed: If no model produced a usable plan.
+            ValueError: If the home page could not be generated.
         """
+        plan = await self.generate_site_plan(user_input, project_summary, history)
+        results = await asyncio.gather(
+            *(self.generate_page(user_input, plan, page) for page in plan.pages), return_exceptions=True
+        )
+
+        pages: Dict[str, Dict[str, str]] = {}
+        for page, result in zip(plan.pages, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Generating {page.file} failed: {result}")
+                continue
+            pages[page.file] = result
+        if "index.html" not in pages:
+            raise ValueError("Home page could not be generated")
+
+        plan.pages = [page for page in plan.pages if page.file in pages]
+        return assemble_site(plan, pages)
+
+    async def generate_site_plan(
+        self,
+        user_input: str,
+        project_summary: str = "",
+        history: Optional[List[str]] = None,
+    ) -> SitePlan:
+        """Ask the plan tier for the page list and shared design tokens."""
+        contents = PLAN_PROMPT.format(
+            max_pages=settings.MULTI_PAGE_MAX_PAGES,
+            request=self.generate_prompt_suffix(user_input, project_summary, history),
+        )
+
+        async def call(model: str) -> SitePlan:
+            response = await self._generate(
+                TaskType.PLAN,
+                model=model,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json", thinking_config=self._thinking_config(model)
+                ),
+            )
+            return parse_site_plan(response.text, settings.MULTI_PAGE_MAX_PAGES)
+
+        result = await self._route(TaskType.PLAN, call)
+        logger.info(f"Site plan with {len(result.value.pages)} pages generated by {result.model} in {result.latency:.1f}s")
+        return result.value
+
+    async def generate_page(self, user_input: str, plan: SitePlan, page: PagePlan) -> Dict[str, str]:
+        """Generate one page of ``plan`` and return its html, css and js blocks."""
+        contents = (
+            f"Requirements:\n{user_input}\n\nSite plan:\n{plan.outline()}\n\n"
+            f"Shared CSS (already in style.css):\n{plan.shared_css}\n\n"
+            f'Build the page {page.file} (page name "{page.slug}"): {page.title}. {page.purpose}'
+        )
+
+        async def call(model: str) -> Dict[str, str]:
+            response = await self._generate(
+                TaskType.NEW_SITE,
+                model=model,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    system_instruction=PAGE_INSTRUCTIONS, thinking_config=self._thinking_config(model)
+                ),
+            )
+            return extract_page_blocks(response.text)
+
+        result = await self._route(TaskType.NEW_SITE, call)
+        logger.info(f"Page {page.file} generated by {result.model} in {result.latency:.1f}s")
+        return result.value
+
+    async def repair_file(self, name: str, files: Dict[str, str], problems: List[str]) -> str:
+        """
+        Ask the edit tier for a corrected version of one site file.
+
+        A missing stylesheet or script is written from the HTML that links it.
+        """
+        languages = REPAIR_LANGUAGES.get(name[name.rfind("."):], ("html",))
+        language = languages[0]
+        if name in files:
+            context = f"Current {name}:\n```{language}\n{files[name]}\n```"
+        else:
+            pages = "\n\n".join(f"{page}:\n```html\n{text}\n```" for page, text in files.items() if page.endswith(".html"))
+            context = f"{name} does not exist yet; write it for these pages.\n\n{pages}"
+        contents = REPAIR_PROMPT.format(name=name, problems="\n".join(f"- {p}" for p in problems), context=context, language=language)
+
+        async def call(model: str) -> str:
+            response = await self._generate(
+                TaskType.EDIT,
+                model=model,
+                contents=contents,
+                config=types.GenerateContentConfig(thinking_config=self._thinking_config(model)),
+            )
+            block = find_code_block(response.text, *languages)
+            if not block:
+                raise InvalidResponse(f"No {language} block in repair of {name}")
+            return block
+
+        result = await self._route(TaskType.EDIT, call)
+        logger.info(f"Repaired {name} with {result.model} in {result.latency:.1f}s")
+        return result.value
+
+    async def ping(self) -> bool:
+        """Check the API is reachable and the key is valid with a model lookup, which uses no tokens."""
+        models = self._tier_models(TaskType.SUMMARY) or self._tier_models(TaskType.NEW_SITE)
+        await self.client.aio.models.get(model=models[0] if models else "gemini-2.5-flash")
+        return True
+
+    def generate_prompt_from_payload(self, user_input: str, project_summary: str = "", history: Optional[List[str]] = None) -> str:
+        """Generate the full prompt (instructions and requirements) from the payload."""
+        return SYSTEM_INSTRUCTIONS + self.generate_prompt_suffix(user_input, project_summary, history)
+
+    def generate_prompt_suffix(self, user_input: str, project_summary: str = "", history: Optional[List[str]] = None) -> str:
+        """Generate the per-request part of the prompt that follows the cached instructions."""
+        prompt = f"Requirements:\n{user_input}\n"
+        if project_summary:
+            prompt += f"\nSummary of the project so far:\n{project_summary}\n"
+        if history:
+            prompt += "\nRelevant earlier requests and site sections:\n" + "\n".join(f"- {item}" for item in history) + "\n"
+        return prompt
+
+    async def _generation_config(self, model: str, **kwargs) -> types.GenerateContentConfig:
+        """Reference the cached instruction prefix, or send it inline when caching is unavailable."""
+        cache_name = await self.prompt_cache.get(model) if settings.PROMPT_CACHE_ENABLED else None
+        if cache_name:
+            return types.GenerateContentConfig(cached_content=cache_name, **kwargs)
+        return types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTIONS, **kwargs)
+
+    async def _route(self, task: TaskType, call, validate=None) -> RoutedResult:
+        """Run ``call`` against the model tier for ``task``."""
+        return await self.router.run(task, call, validate=validate)
+
+    async def _generate(self, task: TaskType, model: str, contents, config: types.GenerateContentConfig) -> types.GenerateContentResponse:
+        """
+        Call ``model`` through the Gemini upstream's concurrency limit, breaker
+        and deadline, and record the call's tokens, latency and cost.
+        """
+        queued_at = time.monotonic()
+        started = None
+
+        async def request() -> types.GenerateContentResponse:
+            nonlocal started
+            started = time.monotonic()
+            return await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+        response = await self.upstream.call(request)
+        record_llm_usage(LLMUsage.from_metadata(
+            model, task.value, response.usage_metadata,
+            queue_seconds=started - queued_at, call_seconds=time.monotonic() - started,
+        ))
+        return response
+
+    def _thinking_config(self, model: str) -> Optional[types.ThinkingConfig]:
+        budget = settings.LLM_THINKING_BUDGETS.get(model)
+        return types.ThinkingConfig(thinking_budget=budget) if budget is not None else None
+
+    @staticmethod
+    def _tier_models(task: TaskType) -> List[str]:
+        """Configured models for ``task`` that this client can serve."""
+        return [
+            model for model in settings.LLM_MODEL_TIERS.get(task.value, [])
+            if model.startswith("gemini") and model in settings.SUPPORTED_LLM_MODELS
+        ]
@@ -0,0 +1,258 @@
+"""
+Liveness and readiness signals.
+
+``HealthMonitor`` probes the worker's dependencies (Supabase, the Gemini
+API, Twilio, the snapshot browser) on a fixed interval in the background and
+caches the results, so probe traffic does not grow with how often the
+orchestrator polls ``/readyz``. It also samples event-loop lag, and reads
+queue saturation (running deploy jobs, queued outbound messages, unwritten
+write-behind rows) from memory when asked.
+
+A failing critical probe, a lagging event loop or a saturated queue make the
+worker not ready; failing non-critical probes only mark it degraded. A probe
+that times out is not cancelled (probes running in threads cannot be), and
+rounds skip it until it has finished, so stuck probes cannot pile up.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.handlers.snapshot import check_browser
+from src.handlers.whatsapp import check_twilio
+from src.services.db import ping
+from src.services.deploy import running_jobs
+from src.services.outbound import get_outbound_scheduler
+from src.services.write_behind import get_write_behind
+
+
+logger = get_logger(__name__)
+
+NOT_READY = "not_ready"
+DEGRADED = "degraded"
+READY = "ready"
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    ok: bool
+    latency_seconds: float
+    checked_at: float
+    error: Optional[str] = None
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "latency_ms": round(self.latency_seconds * 1000),
+            "age_seconds": round(now - self.checked_at, 1),
+            "error": self.error,
+        }
+
+
+class HealthMonitor:
+    """
+    Background dependency probes and event-loop lag sampling.
+
+    Args:
+        probes: Name to coroutine function returning whether the dependency is healthy.
+        critical: Probe names that make the worker not ready when failing.
+        interval_seconds: Time between probe rounds.
+        timeout_seconds: Timeout of each probe.
+        max_loop_lag_seconds: Event-loop lag above which the worker is not ready.
+        lag_sample_seconds: How often event-loop lag is sampled.
+        saturation: Returns ``{name: {"depth": ..., "limit": ...}}`` for the worker's queues.
+    """
+
+    def __init__(
+        self,
+        probes: Dict[str, Callable[[], Awaitable[bool]]],
+        critical: Iterable[str] = (),
+        interval_seconds: float = 15.0,
+        timeout_seconds: float = 5.0,
+        max_loop_lag_seconds: float = 1.0,
+        lag_sample_seconds: float = 0.25,
+        saturation: Optional[Callable[[], Dict[str, Dict[str, int]]]] = None,
+    ):
+        self.probes = probes
+        self.critical = set(critical)
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_loop_lag_seconds = max_loop_lag_seconds
+        self.lag_sample_seconds = lag_sample_seconds
+        self.saturation = saturation
+        self.results: Dict[str, ProbeResult] = {}
+        self.started_at = time.time()
+        self.draining = False
+        # Lag samples covering about one probe interval
+        self._lag_samples: Deque[float] = deque(maxlen=max(1, int(interval_seconds / lag_sample_seconds)))
+        self._tasks = []
+        # Probe call still in flight (possibly past its timeout) and when it started, per probe
+        self._running: Dict[str, Tuple[asyncio.Future, float]] = {}
+
+    @property
+    def loop_lag(self) -> float:
+        """Worst event-loop lag seen over the last probe interval."""
+        return max(self._lag_samples, default=0.0)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._probe_loop()), asyncio.create_task(self._lag_loop())]
+
+    async def close(self) -> None:
+        """Report not ready from now on and stop probing."""
+        self.draining = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for call, _ in self._running.values():
+            call.cancel()
+        self._running = {}
+
+    async def run_probes(self) -> Dict[str, ProbeResult]:
+        """Run every probe concurrently and cache the results."""
+        names = list(self.probes)
+        results = await asyncio.gather(*(self._probe(name) for name in names))
+        self.results = dict(zip(names, results))
+        return self.results
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "uptime_seconds": round(time.time() - self.started_at)}
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Whether the worker should receive traffic, with the report behind the decision. Uses cached state only."""
+        now = time.time()
+        # Results older than a few rounds mean the probe loop itself is stuck
+        stale_after = 3 * self.interval_seconds + self.timeout_seconds
+        problems = ["shutting down"] if self.draining else []
+        degraded = []
+        for name in self.probes:
+            result = self.results.get(name)
+            if result is not None and result.ok and now - result.checked_at <= stale_after:
+                continue
+            if name not in self.critical:
+                degraded.append(name)
+            elif result is None:
+                problems.append(f"{name} not probed yet")
+            else:
+                problems.append(f"{name} unavailable")
+
+        if self.loop_lag > self.max_loop_lag_seconds:
+            problems.append("event loop lagging")
+        saturation = self.saturation() if self.saturation else {}
+        for name, queue in saturation.items():
+            if queue["depth"] >= queue["limit"]:
+                problems.append(f"{name} saturated")
+
+        report = {
+            "status": NOT_READY if problems else DEGRADED if degraded else READY,
+            "problems": problems,
+            "degraded": degraded,
+            "checks": {name: result.as_dict(now) for name, result in self.results.items()},
+            "event_loop": {"lag_seconds": round(self.loop_lag, 3), "max_lag_seconds": self.max_loop_lag_seconds},
+            "saturation": saturation,
+        }
+        return not problems, report
+
+    async def _probe(self, name: str) -> ProbeResult:
+        running = self._running.get(name)
+        if running is not None and not running[0].done():
+            logger.warning(f"Health probe {name} still running, skipping this round")
+            return ProbeResult(False, time.monotonic() - running[1], time.time(), "still running")
+
+        started = time.monotonic()
+        error = None
+        try:
+            call = asyncio.ensure_future(self.probes[name]())
+            # The outcome of a call that outlives its timeout is not needed
+            call.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._running[name] = (call, started)
+            await asyncio.wait({call}, timeout=self.timeout_seconds)
+            if not call.done():
+                ok, error = False, "timed out"
+            else:
+                ok = bool(call.result())
+                if not ok:
+                    error = "check failed"
+        except Exception as e:
+            ok, error = False, type(e).__name__
+            logger.debug(f"Health probe {name} raised: {e}")
+        if not ok:
+            logger.warning(f"Health probe {name} failed: {error}")
+        return ProbeResult(ok, time.monotonic() - started, time.time(), error)
+
+    async def _probe_loop(self) -> None:
+        while True:
+            try:
+                await self.run_probes()
+            except Exception as e:
+                logger.error(f"Health probe round failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def _lag_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_sample_seconds)
+            self._lag_samples.append(max(0.0, loop.time() - started - self.lag_sample_seconds))
+
+
+def queue_saturation() -> Dict[str, Dict[str, int]]:
+    """Depth and readiness limit of the worker's in-memory queues."""
+    saturation = {"deploy_jobs": {"depth": running_jobs(), "limit": settings.DEPLOY_MAX_RUNNING_JOBS}}
+    outbound = get_outbound_scheduler()
+    if outbound is not None:
+        saturation["outbound"] = {"depth": outbound.depth(), "limit": settings.HEALTH_MAX_OUTBOUND_DEPTH}
+    writes = get_write_behind()
+    if writes is not None:
+        saturation["write_behind"] = {"depth": writes.depth(), "limit": settings.HEALTH_MAX_WRITE_BEHIND_DEPTH}
+    return saturation
+
+
+_monitor: Optional[HealthMonitor] = None
+
+
+def start_health_monitor(app_state) -> HealthMonitor:
+    """
+    Create the global health monitor for the clients on ``app_state`` and start probing.
+    """
+    global _monitor
+
+    available = {
+        "supabase": lambda: ping(app_state.supabase),
+        "gemini": lambda: app_state.gemini.ping(),
+        "twilio": lambda: asyncio.to_thread(check_twilio, app_state.twilio),
+        "browser": lambda: asyncio.to_thread(check_browser),
+    }
+    _monitor = HealthMonitor(
+        {name: available[name] for name in settings.HEALTH_PROBES if name in available},
+        critical=settings.HEALTH_CRITICAL_PROBES,
+        interval_seconds=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+        timeout_seconds=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+        max_loop_lag_seconds=settings.HEALTH_MAX_LOOP_LAG_SECONDS,
+        saturation=queue_saturation,
+    )
+    _monitor.start()
+    return _monitor
+
+
+def get_health_monitor() -> Optional[HealthMonitor]:
+    """
+    Get the global health monitor, or None when it is not running.
+    """
+    return _monitor
+
+
+async def stop_health_monitor() -> None:
+    """
+    Stop probing and remove the global health monitor.
+    """
+    global _monitor
+
+    if _monitor is not None:
+        monitor, _monitor = _monitor, None
+        await monitor.close()
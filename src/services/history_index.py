@@ -0,0 +1,241 @@
+"""
+Per-project retrieval index over prompt history and generated site sections.
+
+Each project keeps an append-only float32 matrix of unit-normalised chunk
+embeddings (memory-mapped from ``vectors.f32``) next to a JSON-lines file of
+the chunk records, each naming its vector row, so only the top-k relevant
+chunks are pulled into a prompt no matter how long the project history grows.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from src.common.logger import get_logger
+from src.services.embeddings import Embedder
+
+
+logger = get_logger(__name__)
+
+_SECTION_RE = re.compile(r"<(header|nav|section|main|footer)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+_UNSAFE_PATH_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def chunk_text(text: str, chunk_size: int) -> List[str]:
+    """Split ``text`` into chunks of at most ``chunk_size`` words."""
+    words = text.split()
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+
+def split_sections(html: str) -> List[str]:
+    """Top-level layout sections of a generated page, or the whole page if it has none."""
+    sections = [match.group(0) for match in _SECTION_RE.finditer(html)]
+    return sections or [html]
+
+
+class ProjectHistoryIndex:
+    """
+    Vectors and records for a single project.
+
+    Every record line stores the vector row it belongs to, so a crash
+    between the two appends is detected on the next sync and both files are
+    truncated back to the last consistent pair. Disk access is serialised
+    across workers with a file lock; in memory the index only ever reads the
+    records appended since its last sync.
+    """
+
+    def __init__(self, directory: Path, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+        self.records: List[Dict[str, Any]] = []
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        # Bytes of the records file already read into ``records``
+        self._records_offset = 0
+        self.refresh()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def records_path(self) -> Path:
+        return self.directory / "records.jsonl"
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, vectors: np.ndarray, records: List[Dict[str, Any]]) -> None:
+        """Append unit-normalised ``vectors`` and their records to disk."""
+        vectors = _normalise(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._file_lock():
+            # Pick up rows other workers appended, so the new rows are numbered after them
+            self._sync()
+            first = len(self.records)
+            # Vectors first: a crash between the writes leaves rows without records, which _sync truncates
+            with open(self.vectors_path, "ab") as f:
+                vectors.tofile(f)
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                for row, record in enumerate(records, start=first):
+                    f.write(json.dumps({**record, "row": row}) + "\n")
+            self._sync()
+
+    def refresh(self) -> None:
+        """Read records other workers have appended since the last sync."""
+        if self.vectors_path.exists():
+            with self._file_lock():
+                self._sync()
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """Top-``k`` records by cosine similarity to ``query``."""
+        count = len(self.records)
+        if count == 0 or k <= 0:
+            return []
+        query = _normalise(np.asarray(query, dtype=np.float32).reshape(1, self.dimension))[0]
+        scores = self._vectors[:count] @ query
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.records[i]) for i in top]
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(self.directory / "index.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Read new consistent records and truncate anything after them. Called under the file lock."""
+        if not self.vectors_path.exists():
+            return
+        row_bytes = 4 * self.dimension
+        size = self.vectors_path.stat().st_size
+        rows = size // row_bytes
+        tail = b""
+        if self.records_path.exists():
+            with open(self.records_path, "rb") as f:
+                f.seek(self._records_offset)
+                tail = f.read()
+
+        offset = self._records_offset
+        new = []
+        for line in tail.splitlines(keepends=True):
+            row = len(self.records) + len(new)
+            if not line.endswith(b"\n") or row >= rows:
+                break
+            if not line.strip():
+                offset += len(line)
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            # Records written before rows were stored are numbered by position
+            if record.pop("row", row) != row:
+                break
+            new.append(record)
+            offset += len(line)
+
+        count = len(self.records) + len(new)
+        if offset < self._records_offset + len(tail):
+            logger.warning(f"Truncating {self._records_offset + len(tail) - offset} bytes of unmatched history records in {self.directory}")
+            os.truncate(self.records_path, offset)
+        if size > count * row_bytes:
+            logger.warning(f"Truncating {size - count * row_bytes} bytes of unmatched history vectors in {self.directory}")
+            os.truncate(self.vectors_path, count * row_bytes)
+        if new:
+            # Vectors before records, so a concurrent search never sees a record without its row
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimension))
+            self.records.extend(new)
+        self._records_offset = offset
+
+
+class HistoryStore:
+    """
+    Embeds, stores and retrieves project history.
+
+    Args:
+        embedder: Embedder producing vectors of ``embedder.dimension``.
+        root: Directory holding one sub-directory per project.
+        chunk_size: Words per chunk.
+        top_k: Default number of chunks returned by ``retrieve``.
+        max_open: Number of project indexes kept open.
+    """
+
+    def __init__(self, embedder: Embedder, root: str, chunk_size: int = 100, top_k: int = 5, max_open: int = 128):
+        self.embedder = embedder
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.top_k = top_k
+        self.max_open = max_open
+        self._indexes: "OrderedDict[str, ProjectHistoryIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def add_prompt(self, project_id: str, prompt: str) -> int:
+        """Index a user prompt. Returns the number of chunks added."""
+        return await self._add(project_id, "prompt", chunk_text(prompt, self.chunk_size))
+
+    async def add_site(self, project_id: str, *pages: str) -> int:
+        """Index the sections of generated pages with one embedding call. Returns the number of chunks added."""
+        chunks = [
+            chunk for html in pages for section in split_sections(html) for chunk in chunk_text(section, self.chunk_size)
+        ]
+        return await self._add(project_id, "section", chunks)
+
+    async def retrieve(self, project_id: str, query: str, k: int = None) -> List[str]:
+        """Most relevant history chunks for ``query``, best first. Never raises."""
+        try:
+            index = await self._index(project_id)
+            if not len(index):
+                return []
+            query_vector = (await self.embedder.embed([query], task_type="RETRIEVAL_QUERY"))[0]
+            return [f"[{record['kind']}] {record['text']}" for _, record in index.search(query_vector, k or self.top_k)]
+        except Exception as e:
+            logger.error(f"Error retrieving history for project {project_id}: {e}")
+            return []
+
+    async def _add(self, project_id: str, kind: str, chunks: List[str]) -> int:
+        if not chunks:
+            return 0
+        try:
+            vectors = await self.embedder.embed(chunks)
+            created_at = datetime.now(timezone.utc).isoformat()
+            records = [{"kind": kind, "text": chunk, "created_at": created_at} for chunk in chunks]
+            async with self._locks.setdefault(project_id, asyncio.Lock()):
+                index = await self._index(project_id)
+                await asyncio.to_thread(index.add, vectors, records)
+            return len(chunks)
+        except Exception as e:
+            logger.error(f"Error indexing {kind} history for project {project_id}: {e}")
+            return 0
+
+    async def _index(self, project_id: str) -> ProjectHistoryIndex:
+        """The project's index, with what other workers appended read in. Disk access runs in a thread."""
+        index = self._indexes.get(project_id)
+        if index is None:
+            directory = self.root / _UNSAFE_PATH_RE.sub("_", str(project_id))
+            index = await asyncio.to_thread(ProjectHistoryIndex, directory, self.embedder.dimension)
+            self._indexes[project_id] = index
+            if len(self._indexes) > self.max_open:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(project_id)
+            await asyncio.to_thread(index.refresh)
+        return index
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
@@ -0,0 +1,218 @@
+"""
+Outbound message scheduler.
+
+Messages are queued per recipient. Messages queued within the coalescing
+window are merged into one, final results go out before progress updates
+(and make queued progress updates for the same recipient redundant), and each
+sender number is paced by a token bucket so bursts stay under the provider's
+throughput limit.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.services.resilience import deadline_scope, get_upstream
+
+
+logger = get_logger(__name__)
+
+# WhatsApp message bodies are limited to 1600 characters
+MAX_MESSAGE_LENGTH = 1600
+
+
+class Priority(IntEnum):
+    FINAL = 0
+    PROGRESS = 1
+
+
+@dataclass(order=True)
+class OutboundMessage:
+    priority: Priority
+    seq: int
+    client: Any = field(compare=False)
+    sender: str = field(compare=False)
+    recipient: str = field(compare=False)
+    text: str = field(compare=False)
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class OutboundScheduler:
+    """
+    Per-recipient outbound queues.
+
+    Args:
+        deliver: Blocking function ``(client, sender, recipient, text)`` that sends one message.
+        coalesce_window: Seconds to wait for more messages before sending.
+        rate_per_sender: Messages per second allowed per sender number.
+        burst: Token-bucket burst size per sender number.
+    """
+
+    def __init__(self, deliver: Callable[[Any, str, str, str], None], coalesce_window: float = 0.3, rate_per_sender: float = 20.0, burst: int = 20):
+        self.deliver = deliver
+        self.coalesce_window = coalesce_window
+        self.rate_per_sender = rate_per_sender
+        self.burst = burst
+        self._queues: Dict[str, List[OutboundMessage]] = {}
+        self._drainers: Dict[str, asyncio.Task] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._seq = itertools.count()
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def enqueue(self, client: Any, sender: str, recipient: str, text: str, priority: Priority = Priority.FINAL) -> None:
+        """Queue a message for ``recipient``; it is sent after the coalescing window."""
+        heapq.heappush(
+            self._queues.setdefault(recipient, []),
+            OutboundMessage(priority, next(self._seq), client, sender, recipient, text),
+        )
+        drainer = self._drainers.get(recipient)
+        if drainer is None or drainer.done():
+            self._drainers[recipient] = asyncio.create_task(self._drain(recipient))
+
+    def depth(self, recipient: Optional[str] = None) -> int:
+        """Queued messages for ``recipient``, or across all recipients."""
+        if recipient is not None:
+            return len(self._queues.get(recipient, []))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.depth(),
+            "recipients": sum(1 for queue in self._queues.values() if queue),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def close(self) -> None:
+        """Send everything still queued, then stop."""
+        self.coalesce_window = 0
+        drainers = [task for task in self._drainers.values() if not task.done()]
+        for recipient, queue in self._queues.items():
+            if queue and recipient not in self._drainers:
+                drainers.append(asyncio.create_task(self._drain(recipient)))
+        if drainers:
+            await asyncio.gather(*drainers, return_exceptions=True)
+
+    async def _drain(self, recipient: str) -> None:
+        queue = self._queues[recipient]
+        twilio = get_upstream("twilio")
+        # Delivery outlives the request that queued the message, so its deadline does not apply
+        with deadline_scope(None, detach=True):
+            await self._drain_queue(recipient, queue, twilio)
+
+    async def _drain_queue(self, recipient: str, queue: List[OutboundMessage], twilio) -> None:
+        try:
+            while queue:
+                if self.coalesce_window:
+                    await asyncio.sleep(self.coalesce_window)
+                message = self._next_batch(queue)
+                await self._bucket(message.sender).acquire()
+                try:
+                    await twilio.call(
+                        lambda: asyncio.to_thread(self.deliver, message.client, message.sender, message.recipient, message.text)
+                    )
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to send message to {recipient}: {e}")
+        finally:
+            if not queue:
+                self._queues.pop(recipient, None)
+            self._drainers.pop(recipient, None)
+
+    def _next_batch(self, queue: List[OutboundMessage]) -> OutboundMessage:
+        """Pop the highest-priority message, merged with queued peers of the same priority and sender."""
+        first = heapq.heappop(queue)
+        batch = [first]
+        rest = []
+        length = len(first.text)
+        for message in sorted(queue):
+            if message.priority == first.priority and message.sender == first.sender and length + 2 + len(message.text) <= MAX_MESSAGE_LENGTH:
+                batch.append(message)
+                length += 2 + len(message.text)
+            elif first.priority == Priority.FINAL and message.priority == Priority.PROGRESS and message.seq < first.seq:
+                # A final result supersedes progress updates queued before it
+                self.dropped += 1
+            else:
+                rest.append(message)
+        queue[:] = rest
+        heapq.heapify(queue)
+        self.coalesced += len(batch) - 1
+        if len(batch) == 1:
+            return first
+        batch.sort(key=lambda m: m.seq)
+        return OutboundMessage(first.priority, first.seq, first.client, first.sender, first.recipient, "\n\n".join(m.text for m in batch))
+
+    def _bucket(self, sender: str) -> TokenBucket:
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            bucket = self._buckets[sender] = TokenBucket(self.rate_per_sender, self.burst)
+        return bucket
+
+
+_scheduler: Optional[OutboundScheduler] = None
+
+
+def start_outbound_scheduler(deliver: Callable[[Any, str, str, str], None]) -> OutboundScheduler:
+    """
+    Create the global outbound scheduler.
+    """
+    global _scheduler
+
+    _scheduler = OutboundScheduler(
+        deliver,
+        coalesce_window=settings.OUTBOUND_COALESCE_WINDOW_SECONDS,
+        rate_per_sender=settings.OUTBOUND_MESSAGES_PER_SECOND,
+        burst=settings.OUTBOUND_BURST,
+    )
+    return _scheduler
+
+
+def get_outbound_scheduler() -> Optional[OutboundScheduler]:
+    """
+    Get the global outbound scheduler, or None when it is not running.
+    """
+    return _scheduler
+
+
+async def stop_outbound_scheduler() -> None:
+    """
+    Flush queued messages and remove the global outbound scheduler.
+    """
+    global _scheduler
+
+    if _scheduler is not None:
+        scheduler, _scheduler = _scheduler, None
+        await scheduler.close()
@@ -0,0 +1,247 @@
+"""
+Prompt-prefix caching for LLM calls.
+
+The fixed system instructions are registered once per model with the
+provider's explicit context cache and referenced by name on every call, so
+only the per-request suffix is processed as fresh input. Caches are created
+and extended in the background while the prefix is in use, never on the
+request path. Prefixes below the provider's minimum cacheable size for a
+model are not cached at all.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Protocol, Set
+
+import google.genai as genai
+from google.genai import types
+from src.common.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class CacheProvider(Protocol):
+    """Explicit context-cache operations a provider must support."""
+
+    async def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str: ...
+
+    async def refresh(self, name: str, ttl_seconds: int) -> None: ...
+
+    async def delete(self, name: str) -> None: ...
+
+
+class GeminiCacheProvider:
+    """Context caching backed by the Gemini ``caches`` API."""
+
+    def __init__(self, client: genai.Client):
+        self.client = client
+
+    async def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        cached = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name="siteship-system-instructions",
+                system_instruction=system_instruction,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cached.name
+
+    async def refresh(self, name: str, ttl_seconds: int) -> None:
+        await self.client.aio.caches.update(
+            name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s")
+        )
+
+    async def delete(self, name: str) -> None:
+        await self.client.aio.caches.delete(name=name)
+
+
+class FakeCacheProvider:
+    """In-memory provider for tests and offline development."""
+
+    def __init__(self, fail_create: bool = False):
+        self.fail_create = fail_create
+        self.caches: Dict[str, Dict[str, Any]] = {}
+        self.created = 0
+        self.refreshed = 0
+
+    async def create(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        if self.fail_create:
+            raise RuntimeError("Cached content is too small")
+        self.created += 1
+        name = f"cachedContents/fake-{self.created}"
+        self.caches[name] = {"model": model, "system_instruction": system_instruction, "ttl": ttl_seconds}
+        return name
+
+    async def refresh(self, name: str, ttl_seconds: int) -> None:
+        self.refreshed += 1
+        self.caches[name]["ttl"] = ttl_seconds
+
+    async def delete(self, name: str) -> None:
+        self.caches.pop(name, None)
+
+
+@dataclass
+class CachedPrefix:
+    name: str
+    expires_at: float
+    last_used: float
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of ``text`` (about four characters per token)."""
+    return len(text) // 4
+
+
+class PromptPrefixCache:
+    """
+    Keeps one cached copy of the system instructions per model.
+
+    ``get`` only looks up existing caches; a model without one is queued for
+    the background refresher and callers send the instructions inline until
+    it exists. When the provider refuses to cache, the model is left uncached
+    for ``failure_backoff_seconds``.
+
+    Args:
+        min_tokens: Minimum cacheable prefix size per model.
+        default_min_tokens: Minimum for models not in ``min_tokens``.
+    """
+
+    def __init__(
+        self,
+        provider: CacheProvider,
+        system_instruction: str,
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        failure_backoff_seconds: int = 600,
+        min_tokens: Optional[Dict[str, int]] = None,
+        default_min_tokens: int = 0,
+    ):
+        self.provider = provider
+        self.system_instruction = system_instruction
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.failure_backoff_seconds = failure_backoff_seconds
+        self.min_tokens = min_tokens or {}
+        self.default_min_tokens = default_min_tokens
+        self.prefix_tokens = estimate_tokens(system_instruction)
+        self._entries: Dict[str, CachedPrefix] = {}
+        self._failed_until: Dict[str, float] = {}
+        # Models waiting for the refresher to create their cache
+        self._pending: Set[str] = set()
+        self._too_small: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._refresher: Optional[asyncio.Task] = None
+        self.cached_input_tokens = 0
+        self.uncached_input_tokens = 0
+        self.requests = 0
+
+    async def get(self, model: str) -> Optional[str]:
+        """Return the cache name to reference for ``model``, or None to send the instructions inline."""
+        now = time.monotonic()
+        entry = self._entries.get(model)
+        if entry and entry.expires_at > now:
+            entry.last_used = now
+            return entry.name
+        if not self.cacheable(model) or self._failed_until.get(model, 0) > now:
+            return None
+        if model not in self._pending:
+            self._pending.add(model)
+            self._wake.set()
+            self._ensure_refresher()
+        return None
+
+    def cacheable(self, model: str) -> bool:
+        """Whether the prefix reaches the provider's minimum cacheable size for ``model``."""
+        minimum = self.min_tokens.get(model, self.default_min_tokens)
+        if self.prefix_tokens >= minimum:
+            return True
+        if model not in self._too_small:
+            self._too_small.add(model)
+            logger.info(f"Not caching the prompt prefix for {model}: about {self.prefix_tokens} tokens, minimum {minimum}")
+        return False
+
+    async def create_pending(self) -> None:
+        """Create caches for the models ``get`` was asked for."""
+        while self._pending:
+            model = self._pending.pop()
+            now = time.monotonic()
+            try:
+                name = await self.provider.create(model, self.system_instruction, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Prompt prefix cache unavailable for {model}: {e}")
+                self._failed_until[model] = now + self.failure_backoff_seconds
+                continue
+            self._entries[model] = CachedPrefix(name, now + self.ttl_seconds, now)
+            logger.info(f"Created prompt prefix cache {name} for {model}")
+
+    def record_usage(self, usage_metadata) -> None:
+        """Accumulate cached vs uncached input tokens from a response's usage metadata."""
+        if usage_metadata is None:
+            return
+        prompt_tokens = usage_metadata.prompt_token_count or 0
+        cached_tokens = usage_metadata.cached_content_token_count or 0
+        self.requests += 1
+        self.cached_input_tokens += cached_tokens
+        self.uncached_input_tokens += max(prompt_tokens - cached_tokens, 0)
+        logger.info(f"Input tokens: {cached_tokens} cached, {prompt_tokens - cached_tokens} uncached")
+
+    def stats(self) -> Dict[str, Any]:
+        """Token counts, the models with a live cache and the models the prefix is too small to cache for."""
+        total = self.cached_input_tokens + self.uncached_input_tokens
+        return {
+            "requests": self.requests,
+            "cached_input_tokens": self.cached_input_tokens,
+            "uncached_input_tokens": self.uncached_input_tokens,
+            "cached_ratio": round(self.cached_input_tokens / total, 4) if total else 0.0,
+            "models": sorted(self._entries),
+            "prefix_tokens": self.prefix_tokens,
+            "below_minimum": {
+                model: minimum for model, minimum in sorted(self.min_tokens.items()) if self.prefix_tokens < minimum
+            },
+        }
+
+    async def refresh_due(self) -> None:
+        """Extend entries that are close to expiry and were used within the last TTL."""
+        now = time.monotonic()
+        for model, entry in list(self._entries.items()):
+            if entry.expires_at - now > self.refresh_margin_seconds:
+                continue
+            if now - entry.last_used > self.ttl_seconds:
+                # Idle prefix: let it lapse rather than paying to keep it warm
+                self._entries.pop(model, None)
+                continue
+            try:
+                await self.provider.refresh(entry.name, self.ttl_seconds)
+                entry.expires_at = now + self.ttl_seconds
+            except Exception as e:
+                logger.warning(f"Failed to refresh prompt cache {entry.name}: {e}")
+                self._entries.pop(model, None)
+
+    def stop(self) -> None:
+        """Cancel the background refresher."""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            self._wake.clear()
+            await self.create_pending()
+            if not self._entries:
+                if self._pending:
+                    continue
+                return
+            soonest = min(entry.expires_at for entry in self._entries.values())
+            delay = soonest - self.refresh_margin_seconds - time.monotonic()
+            try:
+                # Woken early when a model without a cache is requested
+                await asyncio.wait_for(self._wake.wait(), max(delay, 1.0))
+            except asyncio.TimeoutError:
+                await self.refresh_due()
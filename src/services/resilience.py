@@ -0,0 +1,409 @@
+"""
+Failure isolation for calls to slow upstreams (edge function, Gemini,
+storage, Twilio).
+
+Every upstream gets an ``Upstream`` that combines:
+
+- an adaptive concurrency limit: additive increase while latency stays near
+  its long-run average, multiplicative decrease when it rises or calls fail,
+  with a bounded wait queue;
+- a circuit breaker that opens after consecutive failures and lets a single
+  probe through once the reset period has passed. Only errors that say the
+  upstream is unhealthy (timeouts, transport errors, 5xx and 429 responses)
+  count as failures; a response the caller rejects does not;
+- deadline propagation: the time left for the current request or job (a
+  context variable set by ``DeadlineMiddleware`` or ``deadline_scope``) caps
+  every call's timeout, and calls that cannot finish in time are not started.
+
+Calls that are rejected without being tried raise ``UpstreamUnavailable`` so
+callers can shed load with a friendly reply instead of queueing forever.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+import httpx
+from src.common.config import settings
+from src.common.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+BUSY_MESSAGE = "We're getting a lot of requests right now. Please try again in a minute. 🙏"
+
+# Absolute time.monotonic() deadline of the current request or job
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a call is rejected without being sent to the upstream."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The upstream's circuit breaker is open."""
+
+
+class Overloaded(UpstreamUnavailable):
+    """The upstream's concurrency limit and wait queue are full."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Not enough time is left on the current deadline to make the call."""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Whether ``error`` says the upstream is unhealthy: a timeout, a transport
+    error, or a 5xx or 429 response. Other client errors and responses the
+    caller could not use do not count against it.
+    """
+    if isinstance(error, (asyncio.TimeoutError, OSError, httpx.TransportError)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status >= 500 or status == 429)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # Gemini errors carry ``code``, Twilio errors ``status``, httpx errors ``response.status_code``
+    response = getattr(error, "response", None)
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None), getattr(error, "status", None),
+                  getattr(response, "status_code", None)):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], detach: bool = False) -> Iterator[None]:
+    """
+    Run the block with a deadline ``seconds`` from now.
+
+    The deadline can only shorten an enclosing one, unless ``detach`` is set,
+    as for background jobs that outlive the request that started them;
+    ``deadline_scope(None, detach=True)`` removes the deadline.
+    """
+    deadline = None if seconds is None else time.monotonic() + seconds
+    current = _deadline.get()
+    if not detach and current is not None:
+        deadline = current if deadline is None else min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving every HTTP request a deadline of REQUEST_TIMEOUT_SECONDS."""
+
+    def __init__(self, app, timeout_seconds: Optional[float] = None):
+        self.app = app
+        self.timeout_seconds = timeout_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with deadline_scope(self.timeout_seconds or settings.REQUEST_TIMEOUT_SECONDS, detach=True):
+            await self.app(scope, receive, send)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by observed latency.
+
+    The limit grows by about one per limit's worth of fast calls and shrinks
+    by ``backoff`` when a call fails or takes more than ``tolerance`` times the
+    long-run average latency. Callers over the limit wait in a queue of at
+    most ``max_queue``; beyond that they are rejected with Overloaded.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 32,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        smoothing: float = 0.05,
+    ):
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.average_latency: Optional[float] = None
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit) or len(self._waiters) < self.max_queue
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Concurrency limit reached and wait queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Timed out waiting for a concurrency slot") from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as we were cancelled; give it back
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Adjust the limit after a call that took ``latency`` seconds."""
+        slow = self.average_latency is not None and latency > self.average_latency * self.tolerance
+        if ok:
+            self.average_latency = latency if self.average_latency is None else (
+                (1 - self.smoothing) * self.average_latency + self.smoothing * latency
+            )
+        if ok and not slow:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._wake()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "average_latency_seconds": round(self.average_latency, 3) if self.average_latency is not None else None,
+        }
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. Once open for
+    ``reset_seconds`` it goes half-open and lets one probe call through; the
+    probe's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def admitting(self) -> bool:
+        """Whether ``allow`` would currently let a call through, without claiming the probe."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._probing)
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; claims the probe when half-open."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Circuit closed after successful probe")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """Give up a claimed probe without an outcome (the call was cancelled or rejected)."""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class Upstream:
+    """
+    A limited, circuit-broken upstream dependency.
+
+    Args:
+        name: Name used in logs and monitoring.
+        timeout_seconds: Per-call timeout, further capped by the current deadline.
+        limiter: Adaptive concurrency limit for the upstream.
+        breaker: Circuit breaker for the upstream.
+        min_call_seconds: Calls are not started with less time than this left.
+        is_failure: Whether an exception from a call counts against the upstream's health.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout_seconds: float,
+        limiter: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        min_call_seconds: float = 0.05,
+        is_failure: Callable[[BaseException], bool] = is_upstream_failure,
+    ):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.min_call_seconds = min_call_seconds
+        self.is_failure = is_failure
+        self.calls = 0
+        self.failures = 0
+
+    def accepting(self) -> bool:
+        """Whether a new call would currently be admitted (for shedding work early)."""
+        return self.breaker.admitting() and self.limiter.has_capacity()
+
+    async def call(self, make_call: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Await ``make_call()`` under the limiter, breaker and deadline.
+        ``make_call`` should make a single request, so the timeout and the
+        breaker see that request alone.
+
+        Raises:
+            UpstreamUnavailable: If the call was rejected without being made.
+            asyncio.TimeoutError: If the call ran out of time.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name} circuit is open")
+
+        budget = self._budget(timeout)
+        if budget is not None and budget < self.min_call_seconds:
+            self.breaker.release_probe()
+            raise DeadlineExceeded(f"Deadline too close to call {self.name}")
+
+        started = time.monotonic()
+        try:
+            await self.limiter.acquire(timeout=budget)
+        except (UpstreamUnavailable, asyncio.CancelledError):
+            self.breaker.release_probe()
+            raise
+
+        ok = False
+        try:
+            self.calls += 1
+            remaining = None if budget is None else budget - (time.monotonic() - started)
+            call_started = time.monotonic()
+            result = await asyncio.wait_for(make_call(), remaining)
+            ok = True
+            return result
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            if not self.is_failure(e):
+                # The upstream answered; the caller just could not use the answer
+                ok = True
+                raise
+            self.failures += 1
+            self.breaker.record_failure()
+            self.limiter.record(time.monotonic() - call_started, ok=False)
+            raise
+        finally:
+            if ok:
+                self.breaker.record_success()
+                self.limiter.record(time.monotonic() - call_started, ok=True)
+            self.limiter.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.snapshot(),
+            "concurrency": self.limiter.snapshot(),
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+    def _budget(self, timeout: Optional[float]) -> Optional[float]:
+        budgets = [t for t in (timeout or self.timeout_seconds, remaining_time()) if t is not None]
+        return min(budgets) if budgets else None
+
+
+_upstreams: Dict[str, Upstream] = {}
+
+
+def create_upstream(name: str, max_concurrency: Optional[int] = None) -> Upstream:
+    """
+    Create an Upstream for ``name`` from settings and register it for monitoring.
+    """
+    limit = max_concurrency or settings.UPSTREAM_MAX_CONCURRENCY.get(name, settings.UPSTREAM_DEFAULT_MAX_CONCURRENCY)
+    upstream = _upstreams[name] = Upstream(
+        name,
+        timeout_seconds=settings.UPSTREAM_TIMEOUT_SECONDS.get(name, settings.UPSTREAM_DEFAULT_TIMEOUT_SECONDS),
+        limiter=AdaptiveLimiter(
+            initial_limit=limit,
+            max_limit=limit,
+            max_queue=settings.UPSTREAM_MAX_QUEUE,
+            tolerance=settings.UPSTREAM_LATENCY_TOLERANCE,
+        ),
+        breaker=CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS),
+    )
+    return upstream
+
+
+def get_upstream(name: str) -> Upstream:
+    """
+    Get the shared Upstream for ``name``, created from settings on first use.
+    """
+    return _upstreams.get(name) or create_upstream(name)
+
+
+def upstreams_snapshot() -> Dict[str, Dict[str, Any]]:
+    """State of every upstream created so far, for monitoring."""
+    return {name: upstream.snapshot() for name, upstream in _upstreams.items()}
@@ -0,0 +1,216 @@
+"""
+Latency-aware routing of LLM calls across model tiers.
+
+Each task type maps to an ordered list of models. The router keeps rolling
+latency and error statistics per model, falls back to the next model when a
+call fails or times out, and can hedge a slow call by starting the next model
+once the primary has run past its p95 latency.
+"""
+
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.services.resilience import UpstreamUnavailable
+
+
+logger = get_logger(__name__)
+
+
+class TaskType(str, Enum):
+    NEW_SITE = "new_site"
+    EDIT = "edit"
+    SUMMARY = "summary"
+    PLAN = "plan"
+
+
+REGENERATE_PATTERN = re.compile(
+    r"\b(?:redesign|rebuild|rewrite|recreate|regenerate|start over|from scratch|new (?:site|website|page)|"
+    r"whole (?:site|website|page)|entire (?:site|website|page)|completely|different (?:layout|design|style))\b",
+    re.IGNORECASE,
+)
+
+
+def classify_request(prompt: str, has_site: bool) -> TaskType:
+    """The tier for a site request: a short change to an existing site is an edit, anything else a full build."""
+    if not has_site or REGENERATE_PATTERN.search(prompt):
+        return TaskType.NEW_SITE
+    if len(prompt.split()) > settings.LLM_EDIT_MAX_WORDS:
+        return TaskType.NEW_SITE
+    return TaskType.EDIT
+
+
+class AllModelsFailed(Exception):
+    """Raised when every candidate model failed, timed out or returned an invalid response."""
+
+
+class InvalidResponse(Exception):
+    """Raised when a model response does not pass the caller's validation."""
+
+
+class ModelStats:
+    """Rolling latency and error statistics for one model."""
+
+    def __init__(self, window: int = 50):
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._samples.append((latency, ok))
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "samples": self.count,
+            "error_rate": round(self.error_rate(), 4),
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+@dataclass
+class RoutedResult:
+    model: str
+    value: Any
+    latency: float
+    hedged: bool = False
+
+
+class ModelRouter:
+    """
+    Route calls for a task type to the healthiest model in its tier.
+
+    Args:
+        tiers: Ordered candidate models per task type, most preferred first.
+        timeout_seconds: Per-attempt timeout before falling back.
+        hedge: Start the next model once the primary passes its p95 latency.
+        max_error_rate: Models above this rolling error rate are tried last.
+        min_samples: Samples required before p95/error-rate decisions apply.
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[TaskType, List[str]],
+        timeout_seconds: float = 120.0,
+        hedge: bool = False,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        window: int = 50,
+    ):
+        self.tiers = tiers
+        self.timeout_seconds = timeout_seconds
+        self.hedge = hedge
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.stats: Dict[str, ModelStats] = {
+            model: ModelStats(window) for models in tiers.values() for model in models
+        }
+
+    def candidates(self, task: TaskType) -> List[str]:
+        """Tier models in preference order, with currently degraded models moved last."""
+        models = self.tiers.get(task, [])
+        healthy = [m for m in models if not self._degraded(m)]
+        return healthy + [m for m in models if m not in healthy]
+
+    async def run(
+        self,
+        task: TaskType,
+        call: Callable[[str], Awaitable[Any]],
+        validate: Optional[Callable[[Any], bool]] = None,
+    ) -> RoutedResult:
+        """
+        Run ``call(model)`` against the tier for ``task``.
+
+        Returns the first valid response. Raises AllModelsFailed if none of the
+        candidates produced one.
+        """
+        queue = self.candidates(task)
+        if not queue:
+            raise AllModelsFailed(f"No models configured for task {task.value}")
+
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            model = queue.pop(0)
+            pending[asyncio.create_task(self._attempt(model, call, validate))] = (model, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                hedge_after = self._hedge_delay(pending) if (self.hedge and not hedged and queue) else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    logger.info(f"Hedging {task.value} request to {queue[0]} after p95 deadline")
+                    launch()
+                    continue
+                for attempt in done:
+                    model, started = pending.pop(attempt)
+                    try:
+                        value = attempt.result()
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"Model {model} failed for {task.value}: {e!r}")
+                        continue
+                    return RoutedResult(model, value, time.monotonic() - started, hedged)
+                if not pending and queue:
+                    launch()
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+        raise AllModelsFailed(f"All models failed for task {task.value}: {last_error!r}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {model: stats.snapshot() for model, stats in self.stats.items()}
+
+    async def _attempt(self, model: str, call: Callable[[str], Awaitable[Any]], validate) -> Any:
+        started = time.monotonic()
+        try:
+            value = await asyncio.wait_for(call(model), timeout=self.timeout_seconds)
+            if validate is not None and not validate(value):
+                raise InvalidResponse(f"Invalid response from {model}")
+        except (asyncio.CancelledError, UpstreamUnavailable):
+            # Lost a hedge race or was shed before reaching the model: says nothing about the model's health
+            raise
+        except Exception:
+            self.stats[model].record(time.monotonic() - started, ok=False)
+            raise
+        self.stats[model].record(time.monotonic() - started, ok=True)
+        return value
+
+    def _degraded(self, model: str) -> bool:
+        stats = self.stats[model]
+        return stats.count >= self.min_samples and stats.error_rate() > self.max_error_rate
+
+    def _hedge_delay(self, pending: Dict[asyncio.Task, Tuple[str, float]]) -> Optional[float]:
+        if len(pending) != 1:
+            return None
+        model, started = next(iter(pending.values()))
+        stats = self.stats[model]
+        p95 = stats.p95()
+        if stats.count < self.min_samples or p95 is None:
+            return None
+        return max(p95 - (time.monotonic() - started), 0.0)
@@ -0,0 +1,267 @@
+"""
+Token, latency and cost accounting for LLM calls.
+
+Every Gemini call produces an ``LLMUsage`` record: input, cached and output
+tokens, the model, how long the call queued for an upstream slot, how long
+it ran, and its estimated cost from ``LLM_MODEL_PRICES``. Records are added
+to the ``usage_scope`` of the deploy job that made the call, which is
+written to the job's prompt row, and to the ``UsageLedger``, which keeps
+per-user and per-project rollups in memory and periodically appends the
+increments since its last flush to the ``usage_rollups`` table.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.common.config import settings
+from src.common.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class LLMUsage:
+    model: str
+    task: str
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    queue_seconds: float = 0.0
+    call_seconds: float = 0.0
+    cost_usd: float = 0.0
+
+    @classmethod
+    def from_metadata(cls, model: str, task: str, usage_metadata, queue_seconds: float, call_seconds: float) -> "LLMUsage":
+        """Build a record from a Gemini response's ``usage_metadata``; thinking tokens are billed as output."""
+        def count(name: str) -> int:
+            return int(getattr(usage_metadata, name, None) or 0)
+
+        input_tokens = count("prompt_token_count")
+        cached_tokens = count("cached_content_token_count")
+        output_tokens = count("candidates_token_count") + count("thoughts_token_count")
+        return cls(
+            model=model,
+            task=task,
+            input_tokens=input_tokens,
+            cached_tokens=cached_tokens,
+            output_tokens=output_tokens,
+            queue_seconds=queue_seconds,
+            call_seconds=call_seconds,
+            cost_usd=estimate_cost(model, input_tokens, cached_tokens, output_tokens),
+        )
+
+
+def estimate_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call; 0 for models without a configured price."""
+    prices = settings.LLM_MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    # prompt_token_count includes the cached tokens, which are billed at the cached rate
+    uncached = max(0, input_tokens - cached_tokens)
+    return (
+        uncached * prices.get("input", 0.0)
+        + cached_tokens * prices.get("cached_input", prices.get("input", 0.0))
+        + output_tokens * prices.get("output", 0.0)
+    ) / 1_000_000
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    queue_seconds: float = 0.0
+    call_seconds: float = 0.0
+    cost_usd: float = 0.0
+    cost_by_model: Dict[str, float] = field(default_factory=dict)
+
+    def add(self, usage: LLMUsage) -> None:
+        self.calls += 1
+        self.input_tokens += usage.input_tokens
+        self.cached_tokens += usage.cached_tokens
+        self.output_tokens += usage.output_tokens
+        self.queue_seconds += usage.queue_seconds
+        self.call_seconds += usage.call_seconds
+        self.cost_usd += usage.cost_usd
+        self.cost_by_model[usage.model] = self.cost_by_model.get(usage.model, 0.0) + usage.cost_usd
+
+    @property
+    def model(self) -> Optional[str]:
+        """The model that accounted for most of the cost."""
+        return max(self.cost_by_model, key=self.cost_by_model.get) if self.cost_by_model else None
+
+    def columns(self) -> Dict[str, Any]:
+        """Usage columns of a prompts or usage_rollups row."""
+        return {
+            "model": self.model,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "queue_ms": round(self.queue_seconds * 1000),
+            "latency_ms": round(self.call_seconds * 1000),
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, **self.columns()}
+
+
+@dataclass(slots=True)
+class UsageScope:
+    user_id: Optional[str]
+    project_id: Optional[str]
+    totals: UsageTotals
+
+
+_scope: ContextVar[Optional[UsageScope]] = ContextVar("usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(user_id: Optional[str], project_id: Optional[str]) -> Iterator[UsageTotals]:
+    """
+    Attribute LLM calls made inside the block (including tasks it starts) to
+    ``user_id`` and ``project_id``, and collect their totals.
+    """
+    scope = UsageScope(user_id, project_id, UsageTotals())
+    token = _scope.set(scope)
+    try:
+        yield scope.totals
+    finally:
+        _scope.reset(token)
+
+
+def record_llm_usage(usage: LLMUsage) -> None:
+    """Add a call to the current usage scope and the global ledger."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.totals.add(usage)
+    if _ledger is not None:
+        _ledger.record(usage, scope.user_id if scope else None, scope.project_id if scope else None)
+
+
+class UsageLedger:
+    """
+    In-memory per-user and per-project usage rollups.
+
+    Totals since startup are kept for the summary endpoint; the increments
+    since the last flush are handed to ``write`` every ``interval_seconds``.
+    ``write`` only queues the rows, so a flush cannot fail.
+    """
+
+    def __init__(self, write: Callable[[List[Dict[str, Any]]], None], interval_seconds: float = 60.0):
+        self.write = write
+        self.interval_seconds = interval_seconds
+        self.total = UsageTotals()
+        self.users: Dict[str, UsageTotals] = {}
+        self.projects: Dict[str, UsageTotals] = {}
+        self._pending: Dict[Tuple[str, str], UsageTotals] = {}
+        self.started_at = self._period_start = datetime.now(timezone.utc)
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, usage: LLMUsage, user_id: Optional[str], project_id: Optional[str]) -> None:
+        self.total.add(usage)
+        for scope, scope_id, rollups in (("user", user_id, self.users), ("project", project_id, self.projects)):
+            if scope_id is None:
+                continue
+            key = str(scope_id)
+            rollups.setdefault(key, UsageTotals()).add(usage)
+            self._pending.setdefault((scope, key), UsageTotals()).add(usage)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def flush(self) -> None:
+        """Write the increments since the last flush."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        period_start, self._period_start = self._period_start, datetime.now(timezone.utc)
+        rows = [
+            {
+                "scope": scope,
+                "scope_id": scope_id,
+                "period_start": period_start.isoformat(),
+                "period_end": self._period_start.isoformat(),
+                "calls": totals.calls,
+                **totals.columns(),
+            }
+            for (scope, scope_id), totals in pending.items()
+        ]
+        self.write(rows)
+
+    async def close(self) -> None:
+        """Stop the flush loop and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.flush()
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """Totals since startup, with the ``top`` users and projects by cost."""
+        return {
+            "since": self.started_at.isoformat(),
+            "total": self.total.as_dict(),
+            "users": self._top(self.users, top),
+            "projects": self._top(self.projects, top),
+        }
+
+    @staticmethod
+    def _top(rollups: Dict[str, UsageTotals], top: int) -> List[Dict[str, Any]]:
+        ranked = sorted(rollups.items(), key=lambda item: item[1].cost_usd, reverse=True)[:top]
+        return [{"id": scope_id, **totals.as_dict()} for scope_id, totals in ranked]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Usage rollup flush failed: {e}")
+
+
+_ledger: Optional[UsageLedger] = None
+
+
+def start_usage_ledger(writes) -> UsageLedger:
+    """
+    Create the global usage ledger and start its flush loop; rollups are
+    appended through the write-behind buffer ``writes``.
+    """
+    global _ledger
+
+    def write(rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            writes.insert("usage_rollups", row)
+
+    _ledger = UsageLedger(
+        write,
+        interval_seconds=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+    )
+    _ledger.start()
+    return _ledger
+
+
+def get_usage_ledger() -> Optional[UsageLedger]:
+    """
+    Get the global usage ledger, or None when it is not running.
+    """
+    return _ledger
+
+
+async def stop_usage_ledger() -> None:
+    """
+    Flush pending rollups and remove the global usage ledger.
+    """
+    global _ledger
+
+    if _ledger is not None:
+        ledger, _ledger = _ledger, None
+        await ledger.close()
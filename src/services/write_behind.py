@@ -0,0 +1,339 @@
+"""
+Write-behind buffer for database writes that do not need read-your-writes.
+
+Rows are queued in memory per table and written as bulk upserts once a
+table's batch reaches WRITE_BEHIND_BATCH_SIZE rows, or at the latest every
+WRITE_BEHIND_FLUSH_INTERVAL_SECONDS. Failed batches are retried with
+exponential backoff and, after WRITE_BEHIND_MAX_ATTEMPTS, moved to the
+spool's ``failed.jsonl`` for manual replay.
+
+Every queued row is also appended to a per-worker spool file (on a
+dedicated I/O thread, so the event loop never blocks on disk), so rows that
+were not written yet survive a crash: on startup a worker adopts the spools
+of workers that are no longer running (their file locks are free). Inserts
+carry a client-generated ``id`` and are written as upserts that ignore
+duplicates, so replaying a batch that was written just before a crash does
+not duplicate rows.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.common.config import settings
+from src.common.logger import get_logger
+from src.services.db import write_rows
+
+
+logger = get_logger(__name__)
+
+BatchKey = Tuple[str, str, bool, Tuple[str, ...]]
+
+
+@dataclass
+class _Batch:
+    table: str
+    on_conflict: str
+    ignore_duplicates: bool
+    # Keyed by the conflict columns' values, so a later row replaces an earlier one
+    rows: Dict[Tuple[Any, ...], Dict[str, Any]] = field(default_factory=dict)
+    attempts: int = 0
+    retry_at: float = 0.0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.rows[tuple(row.get(column) for column in self.on_conflict.split(","))] = row
+
+
+class WriteBehindBuffer:
+    """
+    Batches rows per table into bulk upserts.
+
+    Args:
+        write: ``write(table, rows, on_conflict, ignore_duplicates)`` returning whether the rows were written.
+        spool_dir: Directory of the crash spools; None keeps queued rows in memory only.
+        batch_size: Rows of one batch that trigger an immediate flush.
+        flush_interval_seconds: Time between flushes of whatever is queued.
+        max_attempts: Failed attempts before a batch is moved to ``failed.jsonl``.
+        max_backoff_seconds: Upper bound of the retry delay of a failing batch.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str, List[Dict[str, Any]], str, bool], Awaitable[bool]],
+        spool_dir: Optional[str] = None,
+        batch_size: int = 100,
+        flush_interval_seconds: float = 1.0,
+        max_attempts: int = 10,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.write = write
+        self.directory = Path(spool_dir) if spool_dir else None
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_attempts = max_attempts
+        self.max_backoff_seconds = max_backoff_seconds
+        self.written = 0
+        self.failed = 0
+        self._batches: Dict[BatchKey, _Batch] = {}
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._spool = None
+        self._spool_path: Optional[Path] = None
+        self._lock_file = None
+        # One thread, so spool appends and rewrites happen in the order they were requested
+        self._spool_io: Optional[ThreadPoolExecutor] = None
+
+    def insert(self, table: str, row: Dict[str, Any]) -> str:
+        """Queue a new row and return its id, generated here unless the row has one."""
+        row = {"id": str(uuid.uuid4()), **row}
+        self._enqueue(table, row, "id", True)
+        return row["id"]
+
+    def upsert(self, table: str, row: Dict[str, Any], on_conflict: str = "id") -> None:
+        """Queue a row that replaces the columns of any existing row with the same ``on_conflict`` values."""
+        self._enqueue(table, dict(row), on_conflict, False)
+
+    def depth(self, table: Optional[str] = None) -> int:
+        """Rows waiting to be written, for ``table`` or in total."""
+        return sum(len(batch.rows) for batch in self._batches.values() if table is None or batch.table == table)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.depth(),
+            "batches": len(self._batches),
+            "retrying": sum(1 for batch in self._batches.values() if batch.attempts),
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    def start(self) -> None:
+        """Recover spooled rows and start the flush loop."""
+        if self.directory is not None:
+            self._open_spool()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self, table: Optional[str] = None) -> bool:
+        """
+        Write everything queued (for ``table``) now, ignoring retry backoff.
+        Returns True if nothing is left queued for it.
+        """
+        async with self._lock:
+            due = [(key, batch) for key, batch in self._batches.items() if table is None or batch.table == table]
+            await self._write_batches(due)
+        return self.depth(table) == 0
+
+    async def close(self) -> None:
+        """Stop the flush loop and write what is queued; rows that still fail stay in the spool."""
+        if self._task is not None:
+            # Let a flush in progress finish rather than cancelling it mid-write
+            self._closing = True
+            self._wake.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._spool_io is not None:
+            await asyncio.get_running_loop().run_in_executor(self._spool_io, self._close_spool, not self._batches)
+            self._spool_io.shutdown(wait=True)
+            self._spool_io = None
+
+    def _enqueue(self, table: str, row: Dict[str, Any], on_conflict: str, ignore_duplicates: bool) -> None:
+        key = (table, on_conflict, ignore_duplicates, tuple(sorted(row)))
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(table, on_conflict, ignore_duplicates)
+        batch.add(row)
+        if self._spool_io is not None:
+            self._spool_io.submit(self._append, _spool_line(batch, row))
+        if len(batch.rows) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            interval_due = False
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                interval_due = True
+            if self._closing:
+                return
+            self._wake.clear()
+            try:
+                async with self._lock:
+                    # Woken early, only the batches that reached the size threshold are written
+                    now = time.monotonic()
+                    await self._write_batches([
+                        (key, batch) for key, batch in self._batches.items()
+                        if batch.retry_at <= now and (interval_due or len(batch.rows) >= self.batch_size)
+                    ])
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    async def _write_batches(self, batches: List[Tuple[BatchKey, _Batch]]) -> None:
+        if not batches:
+            return
+        for key, batch in batches:
+            await self._write_batch(key, batch)
+        await self._compact()
+
+    async def _write_batch(self, key: BatchKey, batch: _Batch) -> None:
+        # Rows queued while the batch is being written start a new batch
+        del self._batches[key]
+        rows = list(batch.rows.values())
+        try:
+            written = await self.write(batch.table, rows, batch.on_conflict, batch.ignore_duplicates)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} {batch.table} rows: {e}")
+            written = False
+        if written:
+            self.written += len(rows)
+            return
+
+        batch.attempts += 1
+        if batch.attempts >= self.max_attempts:
+            self.failed += len(rows)
+            logger.error(f"Giving up on {len(rows)} {batch.table} rows after {batch.attempts} attempts")
+            if self._spool_io is not None:
+                self._spool_io.submit(self._dead_letter, [_spool_line(batch, row) for row in batch.rows.values()])
+            return
+        delay = min(self.max_backoff_seconds, self.flush_interval_seconds * 2 ** batch.attempts)
+        logger.warning(f"Writing {len(rows)} {batch.table} rows failed, retrying in {delay:.0f}s")
+        batch.retry_at = time.monotonic() + delay
+        newer = self._batches.get(key)
+        if newer is not None:
+            batch.rows.update(newer.rows)
+        self._batches[key] = batch
+
+    def _open_spool(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock_file = open(self.directory / f"{name}.lock", "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._spool_path = self.directory / f"{name}.jsonl"
+
+        adopted = []
+        for path in sorted(self.directory.glob("*.jsonl")):
+            if path == self._spool_path or path.name == "failed.jsonl":
+                continue
+            lock_path = path.with_suffix(".lock")
+            owner = open(lock_path, "a") if lock_path.exists() else None
+            try:
+                if owner is not None:
+                    fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # The spool belongs to a running worker
+                owner.close()
+                continue
+            try:
+                text = path.read_text()
+            except FileNotFoundError:
+                # Another worker adopted the spool first
+                if owner is not None:
+                    owner.close()
+                continue
+            adopted.append((path, lock_path, owner))
+            for line in text.splitlines():
+                try:
+                    record = json.loads(line)
+                    self._enqueue(record["table"], record["row"], record["on_conflict"], record["ignore_duplicates"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Skipping malformed line in write-behind spool {path.name}")
+
+        self._spool = open(self._spool_path, "w")
+        self._rewrite(self._spool_lines())
+        self._spool_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-behind-spool")
+        for path, lock_path, owner in adopted:
+            path.unlink(missing_ok=True)
+            lock_path.unlink(missing_ok=True)
+            if owner is not None:
+                owner.close()
+        if adopted:
+            logger.info(f"Recovered {self.depth()} unwritten rows from {len(adopted)} write-behind spools")
+
+    async def _compact(self) -> None:
+        """Rewrite the spool with only the rows still queued."""
+        if self._spool_io is None:
+            return
+        # The snapshot is taken and the rewrite submitted without yielding, so
+        # rows queued afterwards are appended to the rewritten file
+        await asyncio.get_running_loop().run_in_executor(self._spool_io, self._rewrite, self._spool_lines())
+
+    def _spool_lines(self) -> str:
+        return "".join(_spool_line(batch, row) for batch in self._batches.values() for row in batch.rows.values())
+
+    # The methods below run on the spool I/O thread (or before it starts)
+
+    def _append(self, line: str) -> None:
+        self._spool.write(line)
+        self._spool.flush()
+
+    def _rewrite(self, text: str) -> None:
+        staging = self._spool_path.with_suffix(".tmp")
+        staging.write_text(text)
+        staging.replace(self._spool_path)
+        self._spool.close()
+        self._spool = open(self._spool_path, "a")
+
+    def _dead_letter(self, lines: List[str]) -> None:
+        with open(self.directory / "failed.jsonl", "a") as failed:
+            failed.writelines(lines)
+
+    def _close_spool(self, empty: bool) -> None:
+        self._spool.close()
+        self._spool = None
+        if empty:
+            self._spool_path.unlink(missing_ok=True)
+            self._spool_path.with_suffix(".lock").unlink(missing_ok=True)
+        self._lock_file.close()
+
+
+def _spool_line(batch: _Batch, row: Dict[str, Any]) -> str:
+    record = {"table": batch.table, "on_conflict": batch.on_conflict, "ignore_duplicates": batch.ignore_duplicates, "row": row}
+    return json.dumps(record, default=str) + "\n"
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+
+
+def start_write_behind(supabase) -> WriteBehindBuffer:
+    """
+    Create the global write-behind buffer, recover spooled rows and start flushing.
+    """
+    global _buffer
+
+    _buffer = WriteBehindBuffer(
+        lambda table, rows, on_conflict, ignore_duplicates: write_rows(supabase, table, rows, on_conflict, ignore_duplicates),
+        spool_dir=settings.WRITE_BEHIND_SPOOL_DIR,
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_seconds=settings.WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+        max_attempts=settings.WRITE_BEHIND_MAX_ATTEMPTS,
+    )
+    _buffer.start()
+    return _buffer
+
+
+def get_write_behind() -> Optional[WriteBehindBuffer]:
+    """
+    Get the global write-behind buffer, or None when it is not running.
+    """
+    return _buffer
+
+
+async def stop_write_behind() -> None:
+    """
+    Write queued rows and remove the global write-behind buffer.
+    """
+    global _buffer
+
+    if _buffer is not None:
+        buffer, _buffer = _buffer, None
+        await buffer.close()
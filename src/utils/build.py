@@ -0,0 +1,429 @@
+"""
+Build-optimisation stage for generated sites.
+
+Runs between parsing the model response and uploading the site: minifies
+HTML/CSS/JS conservatively, inlines the stylesheet when it is small enough to
+fit in the first round trip, and produces precompressed variants.
+"""
+
+import gzip
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.common.config import settings
+from src.common.logger import get_logger
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+
+logger = get_logger(__name__)
+
+# Elements whose surrounding whitespace never renders, so it can be dropped.
+BLOCK_TAGS = {
+    "html", "head", "body", "title", "meta", "link", "script", "style", "base",
+    "header", "footer", "main", "nav", "section", "article", "aside", "div",
+    "p", "ul", "ol", "li", "dl", "dt", "dd", "table", "thead", "tbody", "tfoot",
+    "tr", "td", "th", "form", "fieldset", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "br", "figure", "figcaption", "blockquote", "address", "noscript",
+    "iframe", "video", "audio", "source", "picture", "option", "select",
+}
+
+_RAW_BLOCK_RE = re.compile(
+    r"<!--.*?-->|<(pre|textarea|script|style)\b([^>]*)>(.*?)</\1\s*>",
+    re.DOTALL | re.IGNORECASE,
+)
+_TAG_NAME_RE = re.compile(r"</?\s*([a-zA-Z][a-zA-Z0-9-]*)")
+# A start/end tag, comment or doctype; quoted attribute values may contain ">"
+_HTML_TAG_RE = re.compile(r"""<[a-zA-Z/!?](?:[^>"']|"[^"]*"|'[^']*')*>""")
+_QUOTED_RE = re.compile(r"""("[^"]*"|'[^']*')""")
+_STYLESHEET_LINK_RE = re.compile(
+    r"<link\b[^>]*\bhref\s*=\s*[\"']?(?:\./)?style\.css[\"']?[^>]*>"
+    r"|<style\b[^>]*\bsrc\s*=\s*[\"']?(?:\./)?style\.css[\"']?[^>]*>\s*</style\s*>",
+    re.IGNORECASE,
+)
+_JS_SCRIPT_TYPES = {"", "text/javascript", "application/javascript", "module"}
+
+# Characters after which a "/" starts a regex literal rather than a division.
+_JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_JS_REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+
+@dataclass
+class BuildResult:
+    """Optimised site files plus their compressed variants."""
+
+    files: Dict[str, bytes]
+    compressed: Dict[str, Dict[str, bytes]] = field(default_factory=dict)
+    size_before: int = 0
+    inlined_css: bool = False
+
+    @property
+    def size_after(self) -> int:
+        return sum(len(data) for data in self.files.values())
+
+    def compressed_size(self, encoding: str) -> int:
+        return sum(len(v[encoding]) for v in self.compressed.values() if encoding in v)
+
+    def report(self) -> str:
+        saved = self.size_before - self.size_after
+        ratio = (saved / self.size_before * 100) if self.size_before else 0.0
+        parts = [f"{self.size_before} -> {self.size_after} bytes ({ratio:.1f}% smaller)"]
+        for encoding in ("gzip", "br"):
+            size = self.compressed_size(encoding)
+            if size:
+                parts.append(f"{encoding}: {size} bytes")
+        if self.inlined_css:
+            parts.append("style.css inlined")
+        return ", ".join(parts)
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and dead whitespace from a stylesheet and drop duplicate rules."""
+    out = []
+    i, n = 0, len(css)
+    pending_space = False
+    while i < n:
+        ch = css[i]
+        if ch in "\"'":
+            end = _scan_string(css, i, ch)
+            if pending_space and out and out[-1][-1:] not in "{};,>:(":
+                out.append(" ")
+            pending_space = False
+            out.append(css[i:end])
+            i = end
+            continue
+        if css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+            continue
+        if ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        if pending_space and out and out[-1][-1:] not in "{};,>:(" and ch not in "{};,>)!":
+            out.append(" ")
+        pending_space = False
+        if ch == "}" and out and out[-1] == ";":
+            out.pop()
+        out.append(ch)
+        i += 1
+    return _dedupe_css_rules("".join(out)).strip()
+
+
+def minify_js(js: str) -> str:
+    """
+    Remove comments, indentation and blank lines from a script.
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly as in
+    the original source.
+    """
+    out = []
+    i, n = 0, len(js)
+    last_sig = ""
+    while i < n:
+        ch = js[i]
+        if ch in "\"'`":
+            end = _scan_string(js, i, ch)
+            out.append(js[i:end])
+            last_sig = ch
+            i = end
+            continue
+        if js.startswith("//", i):
+            end = js.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if js.startswith("/*", i):
+            end = js.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            if out and out[-1] not in " \n":
+                out.append(" ")
+            continue
+        if ch == "/" and _starts_js_regex(last_sig, out):
+            end = _scan_js_regex(js, i)
+            out.append(js[i:end])
+            last_sig = "/"
+            i = end
+            continue
+        if ch == "\n":
+            while out and out[-1] == " ":
+                out.pop()
+            if out and out[-1] != "\n":
+                out.append("\n")
+            i += 1
+            continue
+        if ch.isspace():
+            if out and out[-1] not in " \n":
+                out.append(" ")
+            i += 1
+            continue
+        out.append(ch)
+        last_sig = ch
+        i += 1
+    return "".join(out).strip()
+
+
+def minify_html(html: str) -> str:
+    """
+    Collapse whitespace in text between tags and drop comments, leaving
+    attribute values and raw-text elements (pre, textarea, script, style) intact.
+    """
+    raw_blocks = []
+
+    def stash(match: re.Match) -> str:
+        token = match.group(0)
+        if token.startswith("<!--"):
+            return token if token.startswith("<!--[if") else ""
+        tag, attrs, body = match.group(1), match.group(2), match.group(3)
+        if tag.lower() == "style":
+            body = minify_css(body)
+        elif tag.lower() == "script" and _script_type(attrs) in _JS_SCRIPT_TYPES:
+            body = minify_js(body)
+        raw_blocks.append(f"<{tag}{_collapse_attrs(attrs)}>{body}</{tag}>")
+        # Placeholder keeps the tag name so block-level whitespace rules still apply.
+        return f"<{tag} \x00{len(raw_blocks) - 1}>"
+
+    html = _RAW_BLOCK_RE.sub(stash, html)
+    # Alternating text and tags, starting and ending with (possibly empty) text
+    tokens = []
+    position = 0
+    for match in _HTML_TAG_RE.finditer(html):
+        tokens.append(re.sub(r"\s+", " ", html[position:match.start()]))
+        tokens.append(_collapse_outside_quotes(match.group(0)))
+        position = match.end()
+    tokens.append(re.sub(r"\s+", " ", html[position:]))
+    html = "".join(_strip_block_whitespace(tokens)).strip()
+    return re.sub(r"<[a-zA-Z]+ \x00(\d+)>", lambda m: raw_blocks[int(m.group(1))], html)
+
+
+def inline_critical_css(html: str, css: str, max_bytes: int) -> Optional[str]:
+    """
+    Replace the ``style.css`` reference with an inline ``<style>`` block.
+
+    Returns the new HTML, or None when the stylesheet is too large or the page
+    does not reference it.
+    """
+    if len(css.encode("utf-8")) > max_bytes or not _STYLESHEET_LINK_RE.search(html):
+        return None
+    inline = "<style>" + css.replace("</", "<\\/") + "</style>"
+    return _STYLESHEET_LINK_RE.sub(lambda _: inline, html, count=1)
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """Gzip (and brotli, when installed) encodings of ``data``."""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build_site(files: Dict[str, str]) -> BuildResult:
+    """
+    Optimise a generated site.
+
+    Args:
+        files: Mapping of file name (e.g. ``index.html``) to source text.
+
+    Returns:
+        BuildResult with the minified files and compressed variants.
+    """
+    size_before = sum(len(text.encode("utf-8")) for text in files.values())
+    optimised: Dict[str, str] = {}
+    for name, text in files.items():
+        if name.endswith(".html"):
+            optimised[name] = minify_html(text)
+        elif name.endswith(".css"):
+            optimised[name] = minify_css(text)
+        elif name.endswith(".js"):
+            optimised[name] = minify_js(text)
+        else:
+            optimised[name] = text
+
+    inlined = False
+    css = optimised.get("style.css")
+    pages = [name for name in optimised if name.endswith(".html")]
+    if css is not None and pages:
+        inlined_pages = {}
+        for name in pages:
+            html = inline_critical_css(optimised[name], css, settings.BUILD_INLINE_CSS_MAX_BYTES)
+            if html is not None:
+                inlined_pages[name] = html
+        optimised.update(inlined_pages)
+        inlined = bool(inlined_pages)
+        # Nothing references the stylesheet any more, so don't ship it twice
+        if len(inlined_pages) == len(pages):
+            del optimised["style.css"]
+
+    result = BuildResult(
+        files={name: text.encode("utf-8") for name, text in optimised.items()},
+        size_before=size_before,
+        inlined_css=inlined,
+    )
+    for name, data in result.files.items():
+        result.compressed[name] = compress_variants(data)
+
+    logger.info(f"Build stage: {result.report()}")
+    return result
+
+
+def _scan_string(src: str, start: int, quote: str) -> int:
+    """Return the index just past the string literal starting at ``start``."""
+    i, n = start + 1, len(src)
+    while i < n:
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == quote:
+            return i + 1
+        if ch == "\n" and quote != "`":
+            return i
+        i += 1
+    return n
+
+
+def _starts_js_regex(last_sig: str, out: list) -> bool:
+    if last_sig == "" or last_sig in _JS_REGEX_PRECEDERS:
+        return True
+    word = re.search(r"([A-Za-z_$]+)\s*$", "".join(out[-12:]))
+    return bool(word and word.group(1) in _JS_REGEX_KEYWORDS)
+
+
+def _scan_js_regex(src: str, start: int) -> int:
+    i, n = start + 1, len(src)
+    in_class = False
+    while i < n:
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            return i
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            i += 1
+            while i < n and src[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def _dedupe_css_rules(css: str) -> str:
+    """Drop repeated identical declarations and rules, keeping the last occurrence."""
+    statements = _split_css_statements(css)
+    processed = []
+    for stmt in statements:
+        if stmt.endswith("}") and "{" in stmt:
+            head, body = stmt.split("{", 1)
+            body = body[:-1]
+            if head.startswith("@"):
+                body = _dedupe_css_rules(body) if "{" in body else _dedupe_declarations(body)
+            else:
+                body = _dedupe_declarations(body)
+            stmt = f"{head}{{{body}}}"
+        processed.append(stmt)
+    seen = set()
+    kept = []
+    for stmt in reversed(processed):
+        if stmt in seen and stmt.endswith("}"):
+            continue
+        seen.add(stmt)
+        kept.append(stmt)
+    return "".join(reversed(kept))
+
+
+def _dedupe_declarations(body: str) -> str:
+    decls = []
+    for decl in _split_top_level(body, ";"):
+        prop, sep, value = decl.partition(":")
+        if decl:
+            decls.append(f"{prop.strip()}{sep}{value.strip()}")
+    seen = set()
+    kept = []
+    for decl in reversed(decls):
+        if decl in seen:
+            continue
+        seen.add(decl)
+        kept.append(decl)
+    return ";".join(reversed(kept))
+
+
+def _split_css_statements(css: str) -> list:
+    statements = []
+    depth, start, i, n = 0, 0, 0, len(css)
+    while i < n:
+        ch = css[i]
+        if ch in "\"'":
+            i = _scan_string(css, i, ch)
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                statements.append(css[start:i + 1])
+                start = i + 1
+        elif ch == ";" and depth == 0:
+            statements.append(css[start:i + 1])
+            start = i + 1
+        i += 1
+    if css[start:]:
+        statements.append(css[start:])
+    return statements
+
+
+def _split_top_level(text: str, sep: str) -> list:
+    parts = []
+    depth, start, i, n = 0, 0, 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            i = _scan_string(text, i, ch)
+            continue
+        if ch in "({[":
+            depth += 1
+        elif ch in ")}]":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _collapse_attrs(attrs: str) -> str:
+    attrs = _collapse_outside_quotes(attrs)
+    return attrs.rstrip() if attrs.strip() else ""
+
+
+def _collapse_outside_quotes(tag: str) -> str:
+    """Collapse whitespace runs in a tag, leaving quoted attribute values verbatim."""
+    parts = _QUOTED_RE.split(tag)
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+def _script_type(attrs: str) -> str:
+    match = re.search(r"\btype\s*=\s*[\"']?([^\"'\s>]+)", attrs, re.IGNORECASE)
+    return match.group(1).lower() if match else ""
+
+
+def _strip_block_whitespace(tokens: List[str]) -> List[str]:
+    """Drop whitespace-only text between two tags when either is block-level (text at even indexes, tags at odd)."""
+    for i in range(2, len(tokens) - 1, 2):
+        if tokens[i] == " " and (_tag_name(tokens[i - 1]) in BLOCK_TAGS or _tag_name(tokens[i + 1]) in BLOCK_TAGS):
+            tokens[i] = ""
+    return tokens
+
+
+def _tag_name(tag: str) -> str:
+    match = _TAG_NAME_RE.match(tag)
+    return match.group(1).lower() if match else ""
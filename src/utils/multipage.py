@@ -0,0 +1,184 @@
+"""
+Multi-page site plans and assembly.
+
+A multi-page site is generated in two phases: one planning call returns the
+page list and the shared design (tokens and CSS), then every page is
+generated on its own. This module parses the plan, pulls the blocks out of
+each page response and assembles the pages into one set of site files with
+shared navigation and stylesheet, and a script of its own for each page.
+"""
+
+import html
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.utils.parser import find_code_block
+from src.utils.validator import drop_references, link_assets
+
+
+MULTI_PAGE_PATTERN = re.compile(
+    r"multi[- ]?page|multiple pages|separate pages|"
+    r"\b(?:[2-9]|two|three|four|five|six|seven|eight|nine)[- ]pages?\b",
+    re.IGNORECASE,
+)
+NAV_PLACEHOLDER = re.compile(r"<nav\b[^>]*\bdata-site-nav\b[^>]*>.*?</nav>", re.IGNORECASE | re.DOTALL)
+BODY_TAG = re.compile(r"<body\b[^>]*>", re.IGNORECASE)
+
+
+@dataclass
+class PagePlan:
+    file: str
+    title: str
+    purpose: str = ""
+
+    @property
+    def slug(self) -> str:
+        return self.file.rsplit(".", 1)[0]
+
+
+@dataclass
+class SitePlan:
+    pages: List[PagePlan]
+    design: Dict[str, Any] = field(default_factory=dict)
+    shared_css: str = ""
+
+    def outline(self) -> str:
+        """The plan as prompt text: pages first, then the design tokens."""
+        pages = "\n".join(f"- {page.file}: {page.title}. {page.purpose}".rstrip() for page in self.pages)
+        return f"Pages:\n{pages}\n\nDesign tokens:\n{json.dumps(self.design, indent=2)}"
+
+
+def wants_multi_page(user_input: str) -> bool:
+    """Whether the request asks for a site with more than one page."""
+    return bool(MULTI_PAGE_PATTERN.search(user_input or ""))
+
+
+def parse_site_plan(text: str, max_pages: int) -> SitePlan:
+    """
+    Parse the planning call's JSON into a SitePlan.
+
+    File names are normalised to unique ``<slug>.html`` names and the first
+    page is always ``index.html``.
+
+    Raises:
+        ValueError: If the response is not a plan with at least one page.
+    """
+    try:
+        data = json.loads(_strip_fence(text))
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Site plan is not valid JSON: {e}") from e
+
+    raw_pages = data.get("pages") if isinstance(data, dict) else None
+    if not raw_pages or not isinstance(raw_pages, list):
+        raise ValueError("Site plan has no pages")
+
+    pages: List[PagePlan] = []
+    seen = set()
+    for index, raw in enumerate(raw_pages[:max_pages]):
+        if not isinstance(raw, dict):
+            continue
+        title = str(raw.get("title") or f"Page {index + 1}").strip()
+        slug = "index" if not pages else _slug(str(raw.get("file") or title))
+        while slug in seen:
+            slug += "-2"
+        seen.add(slug)
+        pages.append(PagePlan(file=f"{slug}.html", title=title, purpose=str(raw.get("purpose") or "").strip()))
+    if not pages:
+        raise ValueError("Site plan has no pages")
+
+    design = data.get("design") if isinstance(data.get("design"), dict) else {}
+    shared_css = str(design.pop("shared_css", "") or data.get("shared_css") or "")
+    return SitePlan(pages=pages, design=design, shared_css=shared_css.strip())
+
+
+def extract_page_blocks(model_response: str) -> Dict[str, str]:
+    """
+    Pull the ``html`` block and the optional ``css`` and ``javascript`` blocks
+    out of a page response.
+
+    Raises:
+        ValueError: If the HTML block is missing.
+    """
+    blocks = {
+        key: block
+        for key, languages in (("html", ("html",)), ("css", ("css",)), ("js", ("javascript", "js")))
+        if (block := find_code_block(model_response, *languages))
+    }
+    if not blocks.get("html"):
+        raise ValueError("HTML block missing in page response")
+    return blocks
+
+
+def assemble_site(plan: SitePlan, pages: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+    """
+    Combine generated pages into site files.
+
+    Every page gets the shared navigation (with the current page marked) and
+    a ``data-page`` attribute on ``<body>``. Page CSS is appended to the
+    shared stylesheet. Page JavaScript goes to ``<page>.js``, loaded only by
+    its own page, so its top-level functions stay global for inline handlers.
+    """
+    files: Dict[str, str] = {}
+    css = [plan.shared_css] if plan.shared_css else []
+
+    for page in plan.pages:
+        blocks = pages.get(page.file)
+        if blocks is None:
+            continue
+        page_html = _insert_nav(_tag_body(blocks["html"], page.slug), navigation(plan, page))
+        # There is no shared script; drop the link pages are asked to add
+        page_html = drop_references(page_html, ["script.js"])
+        assets = ["style.css"]
+        if blocks.get("js"):
+            script = f"{page.slug}.js"
+            files[script] = blocks["js"]
+            assets.append(script)
+        files[page.file] = link_assets(page_html, assets)
+        if blocks.get("css"):
+            css.append(f"/* {page.file} */\n{blocks['css']}")
+
+    if "index.html" not in files:
+        raise ValueError("Home page missing from generated site")
+    files["style.css"] = "\n\n".join(css)
+    return files
+
+
+def navigation(plan: SitePlan, current: Optional[PagePlan] = None) -> str:
+    """The shared ``<nav>`` element linking every page of the plan."""
+    links = []
+    for page in plan.pages:
+        attrs = ' aria-current="page"' if current is not None and page.file == current.file else ""
+        links.append(f'<li><a href="{page.file}"{attrs}>{html.escape(page.title)}</a></li>')
+    return f'<nav class="site-nav" data-site-nav><ul>{"".join(links)}</ul></nav>'
+
+
+def _insert_nav(page_html: str, nav: str) -> str:
+    if NAV_PLACEHOLDER.search(page_html):
+        return NAV_PLACEHOLDER.sub(lambda _: nav, page_html, count=1)
+    header = re.search(r"<header\b[^>]*>", page_html, re.IGNORECASE)
+    anchor = header or BODY_TAG.search(page_html)
+    if anchor is None:
+        return nav + page_html
+    return page_html[: anchor.end()] + nav + page_html[anchor.end():]
+
+
+def _tag_body(page_html: str, slug: str) -> str:
+    def tag(match: "re.Match[str]") -> str:
+        body = match.group(0)
+        if "data-page" in body:
+            return body
+        return body[:-1] + f' data-page="{slug}">'
+
+    return BODY_TAG.sub(tag, page_html, count=1)
+
+
+def _slug(name: str) -> str:
+    name = re.sub(r"\.html?$", "", name.strip().lower())
+    return re.sub(r"[^a-z0-9]+", "-", name).strip("-")[:40] or "page"
+
+
+def _strip_fence(text: str) -> str:
+    match = re.search(r"```(?:json)?\s*\n(.*?)```", text or "", re.DOTALL | re.IGNORECASE)
+    return match.group(1) if match else (text or "").strip()
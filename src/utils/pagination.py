@@ -0,0 +1,26 @@
+import base64
+import json
+from typing import Any, Dict, Tuple
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor for the page after ``row``: its (created_at, id) key."""
+    key = json.dumps([row["created_at"], str(row["id"])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not all(isinstance(part, str) and part and not set(part) & set('"\\,()') for part in (created_at, row_id)):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
@@ -2,11 +2,61 @@ import re
 import zipfile
 import shutil
 from pathlib import Path
+from typing import Dict, Optional
+from src.common.config import settings
 from src.common.logger import get_logger
+from src.utils.build import BuildResult, build_site
+from src.utils.validator import fix_site
 
 
 logger = get_logger(__name__)
 
+def find_code_block(model_response: str, *languages: str) -> Optional[str]:
+    """
+    Returns the first code block fenced with one of ``languages``, up to its
+    closing fence or the next opening one, or None if there is none.
+    """
+    pattern = rf"```[ \t]*(?:{'|'.join(map(re.escape, languages))})\b[ \t]*\n?(.*?)(?=```|\Z)"
+    match = re.search(pattern, model_response or "", re.DOTALL | re.IGNORECASE)
+    return match.group(1).strip() if match else None
+
+
+def extract_code_blocks(model_response: str) -> Dict[str, str]:
+    """
+    Extracts the HTML, CSS and JS code blocks from a Gemini response.
+
+    Blocks may come in any order, with or without closing fences. Missing CSS
+    or JS blocks are left out of the result for the validator to report.
+
+    Raises:
+        ValueError: If the HTML block is missing.
+    """
+    html = find_code_block(model_response, "html")
+    if not html:
+        logger.error("HTML code block missing in Gemini response")
+        raise ValueError("HTML code block missing in Gemini response")
+
+    files = {"index.html": html}
+    for name, languages in (("style.css", ("css",)), ("script.js", ("javascript", "js"))):
+        block = find_code_block(model_response, *languages)
+        if block is None:
+            logger.warning(f"No code block for {name} in Gemini response")
+        else:
+            files[name] = block
+    return files
+
+
+def build_site_files(files: Dict[str, str]) -> BuildResult:
+    """
+    Runs the build stage over the site files, or just encodes them when
+    BUILD_OPTIMIZE is disabled.
+    """
+    if settings.BUILD_OPTIMIZE:
+        return build_site(files)
+    encoded = {name: text.encode("utf-8") for name, text in files.items()}
+    return BuildResult(files=encoded, size_before=sum(len(data) for data in encoded.values()))
+
+
 async def parse_mode_response_code(model_response: str, user_id: str) -> str:
     """
     Parses Gemini response, writes HTML, CSS, JS to files,
@@ -16,41 +66,26 @@ async def parse_mode_response_code(model_response: str, user_id: str) -> str:
     base_dir = Path(f"./tmp/{user_id}")
     base_dir.mkdir(parents=True, exist_ok=True)
 
-    # Regex for ````html ... ````
-    html_match = re.search(r"```html(.*?)```css", model_response, re.DOTALL | re.IGNORECASE)
-    css_match = re.search(r"```css(.*?)```javascript", model_response, re.DOTALL | re.IGNORECASE)
-    js_match = re.search(r"```javascript(.*?)```", model_response, re.DOTALL | re.IGNORECASE)
-
-    if not html_match or not css_match or not js_match:
-        logger.error("One or more code blocks missing in Gemini response")
-
-    html_code = html_match.group(1).strip().encode("utf-8")
-    css_code = css_match.group(1).strip()
-    js_code = js_match.group(1).strip()
-
-    if isinstance(html_code, bytes):
-        html_code = html_code.decode("utf-8")
+    files, issues = fix_site(extract_code_blocks(model_response))
+    for issue in issues:
+        logger.warning(f"Generated site issue: {issue}")
+    build = build_site_files(files)
+    zip_file = base_dir / "site.zip"
 
-    if isinstance(css_code, bytes):
-        css_code = css_code.decode("utf-8")
+    # Precompressed variants sit next to the files for servers that can use them
+    for name, variants in build.compressed.items():
+        for encoding, data in variants.items():
+            suffix = ".gz" if encoding == "gzip" else f".{encoding}"
+            (base_dir / f"{name}{suffix}").write_bytes(data)
 
-    if isinstance(js_code, bytes):
-        js_code = js_code.decode("utf-8")
     # Write files
-    html_file = base_dir / "index.html"
-    css_file = base_dir / "style.css"
-    js_file = base_dir / "script.js"
-    zip_file = base_dir / "site.zip"
-
-    html_file.write_text(html_code)
-    css_file.write_text(css_code)
-    js_file.write_text(js_code)
+    for name, data in build.files.items():
+        (base_dir / name).write_bytes(data)
 
     # Zip them
-    with zipfile.ZipFile(zip_file, "w") as zipf:
-        zipf.write(html_file, arcname="index.html")
-        zipf.write(css_file, arcname="style.css")
-        zipf.write(js_file, arcname="script.js")
+    with zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
+        for name in build.files:
+            zipf.write(base_dir / name, arcname=name)
 
     return str(zip_file)
 
@@ -0,0 +1,482 @@
+"""
+Local validation and repair of generated site files.
+
+The checks are cheap and run before every build: HTML tag balance, links to
+local assets that were not generated, and CSS/JS syntax at the level of
+strings, comments and brackets. Small defects (a missing closing tag or
+brace, an unlinked stylesheet) are fixed deterministically. Anything left is
+sent back to the model one file at a time with a short repair prompt, so a
+broken stylesheet never costs a full regeneration.
+"""
+
+import asyncio
+import posixpath
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.common.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+# Elements whose end tag may be omitted in valid HTML
+OPTIONAL_END_TAGS = {"html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th", "thead", "tbody", "tfoot", "colgroup", "rt", "rp"}
+SHARED_ASSETS = ("style.css", "script.js")
+
+STYLE_SRC = re.compile(r"""<style\b[^>]*?\bsrc=(["'])([^"']+)\1[^>]*>\s*</style>""", re.IGNORECASE)
+DOCTYPE = re.compile(r"^\s*<!doctype\s+html", re.IGNORECASE)
+WORD = re.compile(r"[\w$]+")
+
+BRACKETS = {")": "(", "]": "[", "}": "{"}
+CLOSERS = {"(": ")", "[": "]", "{": "}"}
+# After these a "/" starts a regular expression rather than a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+Regenerate = Callable[[str, Dict[str, str], List[str]], Awaitable[str]]
+
+
+@dataclass
+class Issue:
+    file: str
+    message: str
+    line: Optional[int] = None
+    fixable: bool = False
+    severity: str = "error"
+
+    def __str__(self) -> str:
+        where = f"{self.file}:{self.line}" if self.line else self.file
+        return f"{where}: {self.message}"
+
+
+def validate_site(files: Dict[str, str]) -> List[Issue]:
+    """Check every file of the site and the links between them."""
+    issues: List[Issue] = []
+    for name, text in files.items():
+        if name.endswith(".html"):
+            issues += check_html(name, text)
+            issues += check_assets(name, text, files)
+        elif name.endswith(".css"):
+            issues += check_css(name, text)
+        elif name.endswith(".js"):
+            issues += check_js(name, text)
+    return issues
+
+
+def fix_site(files: Dict[str, str]) -> Tuple[Dict[str, str], List[Issue]]:
+    """
+    Apply the deterministic fixes.
+
+    Returns the fixed files and the issues that remain.
+    """
+    fixed: Dict[str, str] = {}
+    assets = [name for name in SHARED_ASSETS if files.get(name, "").strip()]
+    # A page works without a script, so a dangling one is dropped rather than regenerated
+    unused = [] if "script.js" in assets else ["script.js"]
+    for name, text in files.items():
+        if name.endswith(".html"):
+            fixed[name] = drop_references(link_assets(fix_html(text), assets), unused)
+        elif name.endswith(".css"):
+            fixed[name] = fix_css(text)
+        elif name.endswith(".js"):
+            fixed[name] = fix_js(text)
+        else:
+            fixed[name] = text
+    return fixed, validate_site(fixed)
+
+
+async def repair_site(files: Dict[str, str], regenerate: Optional[Regenerate] = None) -> Dict[str, str]:
+    """
+    Fix what can be fixed locally, then ask ``regenerate(name, files, problems)``
+    for a corrected version of each file that still has errors.
+
+    Links to assets that are still missing afterwards are removed, so the
+    deployed site never references files that do not exist.
+    """
+    files, issues = fix_site(files)
+    broken = _errors_by_file(issues)
+    if broken and regenerate is not None:
+        logger.info(f"Repairing {', '.join(sorted(broken))}: {'; '.join(str(issue) for issue in issues)}")
+        names = sorted(broken)
+        results = await asyncio.gather(
+            *(regenerate(name, files, broken[name]) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException) or not (result or "").strip():
+                logger.error(f"Repairing {name} failed: {result}")
+                continue
+            files[name] = result
+        files, issues = fix_site(files)
+        broken = _errors_by_file(issues)
+
+    missing = [name for name in broken if name not in files]
+    if missing:
+        files = {
+            name: drop_references(text, missing) if name.endswith(".html") else text for name, text in files.items()
+        }
+        files, issues = fix_site(files)
+    for issue in issues:
+        logger.warning(f"Unrepaired issue in generated site: {issue}")
+    return files
+
+
+def check_html(name: str, text: str) -> List[Issue]:
+    issues: List[Issue] = []
+    if not DOCTYPE.match(text):
+        issues.append(Issue(name, "Missing <!DOCTYPE html>", 1, fixable=True))
+    for match in STYLE_SRC.finditer(text):
+        issues.append(Issue(name, f"{match.group(2)} is loaded with <style src>, which browsers ignore", _line(text, match.start()), fixable=True))
+    balance = _HTMLBalance(text)
+    for offset, message in balance.problems:
+        issues.append(Issue(name, message, _line(text, offset), fixable=True))
+    return issues
+
+
+def check_assets(name: str, text: str, files: Dict[str, str]) -> List[Issue]:
+    """Local files referenced by the page that were not generated, and shared assets it does not load."""
+    issues: List[Issue] = []
+    for ref, offset in _HTMLBalance(text).references:
+        if ref in files:
+            continue
+        if ref.endswith((".css", ".js")):
+            issues.append(Issue(ref, f"Linked from {name} but missing", _line(text, offset)))
+        else:
+            issues.append(Issue(name, f"Links to missing file {ref}", _line(text, offset), severity="warning"))
+    for asset in SHARED_ASSETS:
+        if files.get(asset, "").strip() and not _references(text, asset):
+            issues.append(Issue(name, f"{asset} is not linked", fixable=True))
+    return issues
+
+
+def check_css(name: str, text: str) -> List[Issue]:
+    scan = _scan_code(text, js=False)
+    issues = [Issue(name, message, _line(text, offset)) for offset, message in scan.errors]
+    if scan.open_comment:
+        issues.append(Issue(name, "Unterminated comment", fixable=True))
+    for offset in scan.stray:
+        issues.append(Issue(name, "Unexpected '}'", _line(text, offset), fixable=True))
+    for char, offset in scan.unclosed:
+        issues.append(Issue(name, f"Unclosed '{char}'", _line(text, offset), fixable=not scan.errors))
+    return issues
+
+
+def check_js(name: str, text: str) -> List[Issue]:
+    scan = _scan_code(text, js=True)
+    issues = [Issue(name, message, _line(text, offset)) for offset, message in scan.errors]
+    if scan.open_comment:
+        issues.append(Issue(name, "Unterminated comment", fixable=True))
+    for offset in scan.stray:
+        issues.append(Issue(name, f"Unexpected '{text[offset]}'", _line(text, offset)))
+    fixable = not scan.errors and all(char != "${" for char, _ in scan.unclosed)
+    for char, offset in scan.unclosed:
+        issues.append(Issue(name, f"Unclosed '{char}'", _line(text, offset), fixable=fixable))
+    return issues
+
+
+def fix_html(text: str) -> str:
+    text = STYLE_SRC.sub(lambda m: f'<link rel="stylesheet" href="{m.group(2)}">', text)
+    balance = _HTMLBalance(text)
+    for offset, delete, insert in sorted(balance.edits, reverse=True):
+        text = text[:offset] + insert + text[offset + delete:]
+    if not DOCTYPE.match(text):
+        text = "<!DOCTYPE html>\n" + text.lstrip()
+    return text
+
+
+def fix_css(text: str) -> str:
+    scan = _scan_code(text, js=False)
+    if scan.errors:
+        return text
+    for offset in reversed(scan.stray):
+        text = text[:offset] + text[offset + 1:]
+    return _close(text, scan)
+
+
+def fix_js(text: str) -> str:
+    scan = _scan_code(text, js=True)
+    if scan.errors or scan.stray or any(char == "${" for char, _ in scan.unclosed):
+        return text
+    return _close(text, scan)
+
+
+def link_assets(page_html: str, assets: List[str]) -> str:
+    """Make sure the page loads each shared stylesheet and script in ``assets``."""
+    for asset in assets:
+        if _references(page_html, asset):
+            continue
+        if asset.endswith(".css"):
+            tag = f'<link rel="stylesheet" href="{asset}">'
+            page_html = _insert_before(page_html, "</head>", tag, at_end=False)
+        else:
+            tag = f'<script src="{asset}"></script>'
+            page_html = _insert_before(page_html, "</body>", tag, at_end=True)
+    return page_html
+
+
+def drop_references(page_html: str, assets: List[str]) -> str:
+    """Remove ``<link>`` and ``<script>`` tags that load any of ``assets``."""
+    for asset in assets:
+        name = re.escape(asset)
+        page_html = re.sub(rf"""<link\b[^>]*\bhref=["'](?:\./|/)?{name}["'][^>]*>\s*""", "", page_html, flags=re.IGNORECASE)
+        page_html = re.sub(
+            rf"""<script\b[^>]*\bsrc=["'](?:\./|/)?{name}["'][^>]*>\s*</script>\s*""", "", page_html, flags=re.IGNORECASE
+        )
+    return page_html
+
+
+class _HTMLBalance(HTMLParser):
+    """Finds unclosed and stray tags, with the edits that fix them, and local references."""
+
+    def __init__(self, text: str):
+        super().__init__(convert_charrefs=True)
+        self.text = text
+        self._line_starts = [0] + [m.end() for m in re.finditer(r"\n", text)]
+        self.stack: List[Tuple[str, int]] = []
+        self.problems: List[Tuple[int, str]] = []
+        self.edits: List[Tuple[int, int, str]] = []
+        self.references: List[Tuple[str, int]] = []
+        self.feed(text)
+        self.close()
+        self._close_remaining()
+
+    def handle_starttag(self, tag, attrs):
+        offset = self._offset()
+        self._record_references(tag, attrs, offset)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, offset))
+
+    def handle_startendtag(self, tag, attrs):
+        self._record_references(tag, attrs, self._offset())
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        offset = self._offset()
+        index = next((i for i in range(len(self.stack) - 1, -1, -1) if self.stack[i][0] == tag), None)
+        if index is None:
+            if tag not in OPTIONAL_END_TAGS:
+                match = re.compile(r"</[^>]*>").match(self.text, offset)
+                self.problems.append((offset, f"Stray </{tag}>"))
+                self.edits.append((offset, len(match.group(0)) if match else 0, ""))
+            return
+        unclosed = [item for item in self.stack[index + 1:] if item[0] not in OPTIONAL_END_TAGS]
+        for open_tag, open_offset in unclosed:
+            self.problems.append((open_offset, f"Unclosed <{open_tag}>"))
+        if unclosed:
+            self.edits.append((offset, 0, "".join(f"</{open_tag}>" for open_tag, _ in reversed(unclosed))))
+        del self.stack[index:]
+
+    def _close_remaining(self):
+        unclosed = [item for item in self.stack if item[0] not in OPTIONAL_END_TAGS]
+        for open_tag, open_offset in unclosed:
+            self.problems.append((open_offset, f"Unclosed <{open_tag}>"))
+        if unclosed:
+            self.edits.append((len(self.text), 0, "".join(f"</{open_tag}>" for open_tag, _ in reversed(unclosed))))
+
+    def _record_references(self, tag, attrs, offset):
+        attr = {"link": "href", "a": "href", "script": "src", "img": "src", "source": "src"}.get(tag)
+        value = dict(attrs).get(attr) if attr else None
+        ref = _local_file(value)
+        if ref:
+            self.references.append((ref, offset))
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+
+@dataclass
+class _Scan:
+    errors: List[Tuple[int, str]]
+    unclosed: List[Tuple[str, int]]
+    stray: List[int]
+    open_comment: bool
+
+
+def _scan_code(text: str, js: bool) -> _Scan:
+    """
+    Walk CSS or JavaScript source tracking strings, comments, template
+    literals, regular expressions and brackets.
+
+    Scanning stops at the first error it cannot recover from.
+    """
+    errors: List[Tuple[int, str]] = []
+    stack: List[Tuple[str, int]] = []
+    stray: List[int] = []
+    open_comment = False
+    n = len(text)
+    i = 0
+    last = ""
+
+    def template(j: int) -> Tuple[int, Optional[str]]:
+        while j < n:
+            if text[j] == "\\":
+                j += 2
+            elif text[j] == "`":
+                return j + 1, "`"
+            elif text.startswith("${", j):
+                return j + 2, "${"
+            else:
+                j += 1
+        return n, None
+
+    def enter_template(j: int) -> Optional[int]:
+        end, closed_by = template(j)
+        if closed_by is None:
+            errors.append((j - 1, "Unterminated template literal"))
+            return None
+        if closed_by == "${":
+            stack.append(("${", end - 2))
+        return end
+
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                open_comment = True
+                break
+            i = end + 2
+        elif js and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+        elif c in "'\"":
+            end = _string_end(text, i)
+            if end is None:
+                errors.append((i, "Unterminated string"))
+                break
+            i, last = end, "a"
+        elif js and c == "`":
+            end = enter_template(i + 1)
+            if end is None:
+                break
+            i, last = end, ("a" if text[end - 1] == "`" else "{")
+        elif js and c == "/" and (last == "" or last in REGEX_PRECEDERS or last in REGEX_KEYWORDS):
+            end = _regex_end(text, i)
+            if end is None:
+                errors.append((i, "Unterminated regular expression"))
+                break
+            i, last = end, "a"
+        elif c in CLOSERS:
+            stack.append((c, i))
+            i, last = i + 1, c
+        elif c in BRACKETS:
+            if js and c == "}" and stack and stack[-1][0] == "${":
+                stack.pop()
+                end = enter_template(i + 1)
+                if end is None:
+                    break
+                i, last = end, ("a" if text[end - 1] == "`" else "{")
+                continue
+            if not stack:
+                stray.append(i)
+            elif stack[-1][0] != BRACKETS[c]:
+                errors.append((i, f"'{c}' does not match '{stack[-1][0]}' on line {_line(text, stack[-1][1])}"))
+                break
+            else:
+                stack.pop()
+            i, last = i + 1, c
+        elif js and (c.isalnum() or c in "_$"):
+            word = WORD.match(text, i).group(0)
+            i, last = i + len(word), (word if word in REGEX_KEYWORDS else "a")
+        else:
+            i, last = i + 1, c
+
+    return _Scan(errors=errors, unclosed=stack, stray=stray, open_comment=open_comment)
+
+
+def _string_end(text: str, start: int) -> Optional[int]:
+    quote = text[start]
+    j = start + 1
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+        elif c == quote:
+            return j + 1
+        elif c == "\n":
+            return None
+        else:
+            j += 1
+    return None
+
+
+def _regex_end(text: str, start: int) -> Optional[int]:
+    j = start + 1
+    in_class = False
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "\n":
+            return None
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "/":
+            j += 1
+            while j < len(text) and text[j].isalpha():
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def _close(text: str, scan: _Scan) -> str:
+    suffix = ""
+    if scan.open_comment:
+        suffix += " */"
+    if scan.unclosed:
+        suffix += "\n" + "".join(CLOSERS[char] for char, _ in reversed(scan.unclosed))
+    return text + suffix if suffix else text
+
+
+def _errors_by_file(issues: List[Issue]) -> Dict[str, List[str]]:
+    broken: Dict[str, List[str]] = {}
+    for issue in issues:
+        if issue.severity == "error":
+            broken.setdefault(issue.file, []).append(str(issue))
+    return broken
+
+
+def _references(page_html: str, asset: str) -> bool:
+    return any(ref == asset for ref, _ in _HTMLBalance(page_html).references)
+
+
+def _local_file(value: Optional[str]) -> Optional[str]:
+    """
+    The site file a link points to, relative to the site root, or None for
+    external, anchor and data links and for paths that leave the site.
+    """
+    if not value:
+        return None
+    parts = urlsplit(value.strip())
+    if parts.scheme or parts.netloc or not parts.path or parts.path.endswith("/"):
+        return None
+    # Pages sit at the site root, so page-relative and root-relative paths resolve the same
+    path = posixpath.normpath(parts.path.removeprefix("/"))
+    if path in (".", "..") or path.startswith("../"):
+        return None
+    return path
+
+
+def _insert_before(page_html: str, closing_tag: str, tag: str, at_end: bool) -> str:
+    match = None
+    for match in re.finditer(re.escape(closing_tag), page_html, re.IGNORECASE):
+        if not at_end:
+            break
+    if match is None:
+        return page_html + f"\n{tag}" if at_end else f"{tag}\n" + page_html
+    return page_html[: match.start()] + f"{tag}\n" + page_html[match.start():]
+
+
+def _line(text: str, offset: int) -> int:
+    return text.count("\n", 0, offset) + 1
@@ -0,0 +1,43 @@
+-- Deploy job tracking and LLM usage on prompts, usage rollups, and the
+-- indexes behind keyset paging of the history API.
+
+-- Prompt ids are generated by the service, so the deploy job can insert the
+-- row and every later update can target it.
+alter table public.prompts
+    add column if not exists status text,
+    add column if not exists deploy_url text,
+    add column if not exists model text,
+    add column if not exists input_tokens integer,
+    add column if not exists cached_tokens integer,
+    add column if not exists output_tokens integer,
+    add column if not exists queue_ms integer,
+    add column if not exists latency_ms integer,
+    add column if not exists cost_usd numeric(12, 6);
+
+-- Appended by the usage ledger every USAGE_FLUSH_INTERVAL_SECONDS; one row
+-- per user or project with the increments of that period.
+create table if not exists public.usage_rollups (
+    id uuid primary key default gen_random_uuid(),
+    scope text not null check (scope in ('user', 'project')),
+    scope_id text not null,
+    period_start timestamptz not null,
+    period_end timestamptz not null,
+    calls integer not null default 0,
+    model text,
+    input_tokens bigint not null default 0,
+    cached_tokens bigint not null default 0,
+    output_tokens bigint not null default 0,
+    queue_ms bigint not null default 0,
+    latency_ms bigint not null default 0,
+    cost_usd numeric(14, 6) not null default 0,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists usage_rollups_scope_period_idx
+    on public.usage_rollups (scope, scope_id, period_start desc);
+
+-- Keyset paging on (created_at, id), newest first
+create index if not exists projects_user_id_created_at_id_idx
+    on public.projects (user_id, created_at desc, id desc);
+create index if not exists prompts_project_id_created_at_id_idx
+    on public.prompts (project_id, created_at desc, id desc);
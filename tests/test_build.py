@@ -0,0 +1,69 @@
+import gzip
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.build import build_site, minify_css, minify_html, minify_js
+
+
+HTML = """<!DOCTYPE html>
+<html>
+  <head>
+    <link rel="stylesheet" href="style.css">
+  </head>
+  <body>
+    <!-- hero -->
+    <p>Hello <b>big</b> <i>world</i></p>
+    <pre>  keep
+  this </pre>
+    <script src="script.js"></script>
+  </body>
+</html>
+"""
+
+
+def test_minify_css_keeps_significant_whitespace_and_drops_duplicates():
+    css = """
+    /* base */
+    .a { color : red ; color: red; }
+    .b { width: calc(100% - 2rem); font-family: Arial, "Segoe UI"; }
+    .a { color : red ; }
+    @media (max-width: 768px) and (min-width: 100px) {
+        div :first-child > p { margin: 0 auto !important; }
+    }
+    """
+    assert minify_css(css) == (
+        '.b{width:calc(100% - 2rem);font-family:Arial,"Segoe UI"}.a{color:red}'
+        "@media (max-width:768px) and (min-width:100px){div :first-child>p{margin:0 auto!important}}"
+    )
+
+
+def test_minify_js_preserves_strings_regexes_and_line_breaks():
+    js = "const re = /a\\/b/g; // comment\nlet s = `line\n    two`;\n\n/* block */\nx = a / b\n"
+    assert minify_js(js) == "const re = /a\\/b/g;\nlet s = `line\n    two`;\nx = a / b"
+
+
+def test_minify_html_leaves_raw_text_elements_alone():
+    html = minify_html(HTML)
+    assert "<!--" not in html
+    assert "<p>Hello <b>big</b> <i>world</i></p>" in html
+    assert "<pre>  keep\n  this </pre>" in html
+
+
+def test_minify_html_keeps_attribute_values_verbatim():
+    html = minify_html(
+        '<form>\n  <input  placeholder="two  spaces"  data-x="a > b">\n'
+        '  <textarea title="t  t">  typed\n  text </textarea>\n</form>'
+    )
+    assert html == '<form><input placeholder="two  spaces" data-x="a > b"> <textarea title="t  t">  typed\n  text </textarea></form>'
+
+
+def test_build_site_inlines_small_css_and_compresses():
+    result = build_site({"index.html": HTML, "style.css": "p { color: red; }", "script.js": "// noop\n"})
+
+    assert result.inlined_css
+    assert "style.css" not in result.files
+    assert b"<style>p{color:red}</style>" in result.files["index.html"]
+    assert result.size_after < result.size_before
+    assert gzip.decompress(result.compressed["index.html"]["gzip"]) == result.files["index.html"]
@@ -0,0 +1,145 @@
+import asyncio
+import sys
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import urlsplit
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from src.common.config import settings
+from src.services import deploy
+from src.services.deploy_jobs import DeployJob, callback_url, sign_job, verify_job_token
+
+
+class FakePromptsTable:
+    """Mimics update_prompt_status: rows with a final status are not updated again."""
+
+    def __init__(self):
+        self.rows = {"prompt1": {"status": None}}
+
+    async def update_prompt_status(self, supabase, prompt_id, data):
+        row = self.rows[prompt_id]
+        if row["status"] in ("READY", "ERROR"):
+            return False
+        row.update(data)
+        return True
+
+
+class FakeDeployer:
+    """Stands in for the edge function: reports progress and completion to the job's callback URL."""
+
+    def __init__(self, client: TestClient):
+        self.client = client
+
+    def run(self, job: DeployJob, url: str):
+        parts = urlsplit(callback_url(job))
+        path = f"{parts.path}?{parts.query}"
+        self.client.post(path, json={"event": "progress", "status": "BUILDING"})
+        self.client.post(path, json={"event": "completed", "status": "READY", "url": url, "summary": "A bakery site"})
+        # Retried delivery of the final event must not notify twice
+        return self.client.post(path, json={"event": "completed", "status": "READY", "url": url})
+
+
+def test_token_round_trip_and_tampering():
+    job = DeployJob.create("user1", "proj1", "prompt1", sender="whatsapp:+456", recipient="whatsapp:+123")
+    token = sign_job(job)
+
+    assert verify_job_token(token) == job
+    body, _, signature = token.partition(".")
+    assert verify_job_token(f"{body}x.{signature}") is None
+    assert verify_job_token("garbage") is None
+
+
+@patch('src.services.deploy.update_project', new_callable=AsyncMock)
+@patch('src.services.deploy.send_message')
+def test_callback_updates_rows_and_notifies_once(mock_send_message, mock_update_project):
+    mock_supabase = AsyncMock()
+    mock_twilio = MagicMock()
+    prompts = FakePromptsTable()
+    job = DeployJob.create("user1", "proj1", "prompt1", sender="whatsapp:+456", recipient="whatsapp:+123")
+
+    with patch('main.init_supabase_client', return_value=mock_supabase), \
+         patch('main.init_twilio_client', return_value=mock_twilio), \
+         patch('main.init_gemini_client'), \
+         patch('src.services.deploy.update_prompt_status', new=prompts.update_prompt_status), \
+         patch.object(settings, 'PUBLIC_BASE_URL', 'http://testserver'):
+
+        with TestClient(app) as client:
+            response = FakeDeployer(client).run(job, "https://bakery.vercel.app")
+
+            assert response.status_code == 200
+            assert response.json()["applied"] is False
+            assert prompts.rows["prompt1"] == {"status": "READY", "deploy_url": "https://bakery.vercel.app"}
+            mock_update_project.assert_awaited_once_with(mock_supabase, "proj1", {"last_ai_summary": "A bakery site"})
+            mock_send_message.assert_called_once_with(
+                mock_twilio, "whatsapp:+456", "whatsapp:+123",
+                "Your request has been processed. Current Status: READY\nhttps://bakery.vercel.app",
+            )
+
+            forged = client.post("/deploy-callback?token=forged.token", json={"event": "completed"})
+            assert forged.status_code == 403
+
+
+def test_expired_and_non_ascii_tokens_are_rejected():
+    job = DeployJob.create("user1", "proj1", "prompt1", sender="whatsapp:+456", recipient="whatsapp:+123")
+
+    assert verify_job_token(sign_job(job, issued_at=int(time.time()) - 60)) == job
+    assert verify_job_token(sign_job(job, issued_at=int(time.time()) - settings.DEPLOY_CALLBACK_TOKEN_MAX_AGE_SECONDS - 1)) is None
+    body, _, signature = sign_job(job).partition(".")
+    assert verify_job_token(f"{body}.{signature[:-1]}é") is None
+    assert verify_job_token(f"bödy.{signature}") is None
+
+
+@patch('src.services.deploy.send_message')
+def test_shutdown_cancels_stuck_deploys_and_notifies(mock_send_message):
+    job = DeployJob.create("user1", "proj1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+    app_state = SimpleNamespace(supabase=AsyncMock(), twilio=object())
+
+    async def run():
+        stuck = asyncio.create_task(asyncio.sleep(60))
+        deploy._running_jobs[stuck] = job
+        stuck.add_done_callback(lambda done: deploy._running_jobs.pop(done, None))
+        await deploy.drain_deploys(app_state, timeout=0.05)
+        return stuck
+
+    stuck = asyncio.run(run())
+
+    assert stuck.cancelled() and not deploy._running_jobs
+    mock_send_message.assert_called_once_with(app_state.twilio, "whatsapp:+456", "whatsapp:+123", "Something Went Wrong! Please Try Again.")
+
+
+@patch('src.services.deploy.send_message')
+def test_final_event_notifies_even_when_the_status_write_fails(mock_send_message):
+    job = DeployJob.create("user1", "proj1", "prompt1", sender="whatsapp:+456", recipient="whatsapp:+123")
+    app_state = SimpleNamespace(supabase=AsyncMock(), twilio=object())
+    event = {"event": "failed", "message": "build error"}
+
+    async def run():
+        return [await deploy.handle_deploy_event(app_state, job, event) for _ in range(2)]
+
+    with patch('src.services.deploy.update_prompt_status', new=AsyncMock(return_value=None)):
+        applied = asyncio.run(run())
+
+    assert applied == [True, False]
+    mock_send_message.assert_called_once_with(app_state.twilio, "whatsapp:+456", "whatsapp:+123", "Something Went Wrong! Please Try Again.")
+
+
+@patch('src.services.deploy.send_message')
+def test_deploy_job_past_its_timeout_fails_and_notifies(mock_send_message):
+    job = DeployJob.create("user1", "proj1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+    app_state = SimpleNamespace(supabase=AsyncMock(), twilio=object(), history=AsyncMock(**{"retrieve.return_value": []}))
+    payload = {"prompt": "A bakery site", "metadata": {}}
+
+    async def stuck(*args):
+        await asyncio.sleep(60)
+
+    with patch.object(settings, "DEPLOY_JOB_TIMEOUT_SECONDS", 0.05), \
+         patch('src.services.deploy._run_deploy_job', new=stuck):
+        asyncio.run(deploy.run_deploy_job(app_state, job, payload))
+
+    mock_send_message.assert_called_once_with(app_state.twilio, "whatsapp:+456", "whatsapp:+123", "Something Went Wrong! Please Try Again.")
@@ -0,0 +1,129 @@
+import asyncio
+import sys
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from src.common.config import settings
+from src.services.health import HealthMonitor
+
+
+class CountingProbe:
+    def __init__(self, result=True, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_readiness_is_served_from_cached_probes():
+    db, llm, browser = CountingProbe(), CountingProbe(), CountingProbe(result=RuntimeError("no chromium"))
+    monitor = HealthMonitor({"supabase": db, "gemini": llm, "browser": browser}, critical={"supabase", "gemini"})
+
+    ready, report = monitor.readiness()
+    assert not ready and "supabase not probed yet" in report["problems"]
+
+    asyncio.run(monitor.run_probes())
+    for _ in range(100):
+        ready, report = monitor.readiness()
+
+    assert (db.calls, llm.calls, browser.calls) == (1, 1, 1)
+    assert ready and report["status"] == "degraded"
+    assert report["degraded"] == ["browser"]
+    assert report["checks"]["browser"]["error"] == "RuntimeError"
+
+
+def test_failing_critical_probe_or_saturated_queue_is_not_ready():
+    slow = CountingProbe(delay=1)
+    saturation = {"deploy_jobs": {"depth": 0, "limit": 50}}
+    monitor = HealthMonitor({"supabase": slow}, critical={"supabase"}, timeout_seconds=0.05, saturation=lambda: saturation)
+
+    asyncio.run(monitor.run_probes())
+    ready, report = monitor.readiness()
+    assert not ready and report["problems"] == ["supabase unavailable"]
+    assert report["checks"]["supabase"]["error"] == "timed out"
+
+    monitor.probes["supabase"] = CountingProbe()
+    asyncio.run(monitor.run_probes())
+    assert monitor.readiness()[0]
+
+    saturation["deploy_jobs"]["depth"] = 50
+    ready, report = monitor.readiness()
+    assert not ready and report["problems"] == ["deploy_jobs saturated"]
+
+
+def test_probe_past_its_timeout_is_not_started_again():
+    blocked = threading.Event()
+    calls = []
+
+    def stuck_check():
+        calls.append(1)
+        blocked.wait(5)
+        return True
+
+    monitor = HealthMonitor({"twilio": lambda: asyncio.to_thread(stuck_check)}, timeout_seconds=0.05)
+
+    async def run():
+        first = (await monitor.run_probes())["twilio"]
+        second = (await monitor.run_probes())["twilio"]
+        blocked.set()
+        await asyncio.sleep(0.05)
+        third = (await monitor.run_probes())["twilio"]
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+
+    assert (first.error, second.error, third.ok) == ("timed out", "still running", True)
+    assert len(calls) == 2
+
+
+def test_blocked_event_loop_is_reported():
+    monitor = HealthMonitor({}, interval_seconds=1, lag_sample_seconds=0.01, max_loop_lag_seconds=0.05)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.03)
+        time.sleep(0.1)
+        await asyncio.sleep(0.03)
+        await monitor.close()
+
+    asyncio.run(run())
+
+    assert monitor.loop_lag >= 0.08
+    ready, report = monitor.readiness()
+    assert not ready and report["problems"] == ["shutting down", "event loop lagging"]
+
+
+def test_health_endpoints():
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.limit.return_value.execute = AsyncMock()
+
+    with patch('main.init_supabase_client', return_value=supabase), patch('main.init_twilio_client'), \
+         patch('main.init_gemini_client'), \
+         patch.object(settings, 'HEALTH_PROBES', ["supabase"]), \
+         TestClient(app) as client:
+        assert client.get("/healthz").json()["status"] == "alive"
+
+        client.portal.call(app.state.health.run_probes)
+        ready = client.get("/readyz")
+        assert ready.status_code == 200
+        assert ready.json()["checks"]["supabase"]["ok"]
+        assert set(ready.json()["saturation"]) == {"deploy_jobs", "outbound", "write_behind"}
+
+        supabase.table.side_effect = ConnectionError("refused")
+        client.portal.call(app.state.health.run_probes)
+        not_ready = client.get("/readyz")
+        assert not_ready.status_code == 503
+        assert not_ready.json()["problems"] == ["supabase unavailable"]
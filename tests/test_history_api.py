@@ -0,0 +1,136 @@
+import json
+import re
+import sys
+import os
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from src.common.config import settings
+
+
+class FakeQuery:
+    """Just enough of the PostgREST query builder for keyset pages."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.limit_count = None
+
+    def select(self, columns):
+        self.db.selects.append((self.table, columns))
+        self.columns = columns.split(",")
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def or_(self, expression):
+        created_at, row_id = re.fullmatch(
+            r'created_at\.lt\."(.+?)",and\(created_at\.eq\."(.+?)",id\.lt\."(.+?)"\)', expression
+        ).group(1, 3)
+        self.filters.append(lambda row: (row["created_at"], row["id"]) < (created_at, row_id))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    async def execute(self):
+        rows = [row for row in self.db.tables[self.table] if all(f(row) for f in self.filters)]
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        self.db.queries += 1
+        return MagicMock(data=[{c: row[c] for c in self.columns} for row in rows[: self.limit_count]])
+
+
+class FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.selects = []
+        self.queries = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def project(i, created_at):
+    return {"id": f"p{i}", "user_id": "u1", "name": f"Site {i}", "last_ai_summary": "", "created_at": created_at}
+
+
+def prompt(i, project_id):
+    return {
+        "id": f"q{i}", "project_id": project_id, "message_id": f"m{i}", "prompt_text": f"change {i}",
+        "model_response": "x" * 1000, "status": "READY", "deploy_url": None, "created_at": f"2025-01-0{i}T00:00:00+00:00",
+    }
+
+
+@contextmanager
+def history_client(db):
+    with patch('main.init_supabase_client', return_value=db), \
+         patch('main.init_twilio_client'), \
+         patch('main.init_gemini_client'), \
+         patch.object(settings, 'API_KEY', SecretStr("secret")), \
+         TestClient(app) as client:
+        yield client
+
+
+AUTH = {"Authorization": "Bearer secret"}
+
+
+def test_keyset_pages_cover_every_row_once():
+    # Two projects share a timestamp, so the id breaks the tie
+    same = "2025-02-01T10:00:00+00:00"
+    db = FakeSupabase({"projects": [project(1, "2025-01-01T00:00:00+00:00"), project(2, same), project(3, same),
+                                    project(4, "2025-03-01T00:00:00+00:00"), project(5, "2025-04-01T00:00:00+00:00")]})
+
+    with history_client(db) as client:
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            body = client.get("/users/u1/projects", params=params, headers=AUTH).json()
+            seen += [item["id"] for item in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == ["p5", "p4", "p3", "p2", "p1"]
+        assert client.get("/users/u1/projects", params={"cursor": "!!"}, headers=AUTH).status_code == 400
+        assert client.get("/users/u1/projects", params={"limit": 1000}, headers=AUTH).status_code == 422
+
+
+def test_requires_bearer_api_key():
+    db = FakeSupabase({"projects": []})
+
+    with history_client(db) as client:
+        assert client.get("/users/u1/projects").status_code == 401
+        assert client.get("/users/u1/projects", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/users/u1/projects", headers=AUTH).status_code == 200
+        assert db.queries == 1
+
+
+def test_export_streams_projects_and_prompts_as_ndjson():
+    db = FakeSupabase({
+        "projects": [project(1, "2025-01-01T00:00:00+00:00"), project(2, "2025-01-02T00:00:00+00:00")],
+        "prompts": [prompt(i, "p1") for i in range(1, 6)],
+    })
+
+    with patch.object(settings, 'EXPORT_PAGE_SIZE', 2), history_client(db) as client:
+        response = client.get("/users/u1/export", headers=AUTH)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [(line["type"], line["id"]) for line in lines] == [
+        ("project", "p2"), ("project", "p1"), ("prompt", "q5"), ("prompt", "q4"),
+        ("prompt", "q3"), ("prompt", "q2"), ("prompt", "q1"),
+    ]
+    assert all("model_response" not in columns for _, columns in db.selects)
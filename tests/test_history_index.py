@@ -0,0 +1,100 @@
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.config import settings
+from src.services.deploy import run_deploy_job
+from src.services.deploy_jobs import DeployJob
+from src.services.embeddings import HashingEmbedder
+from src.services.history_index import HistoryStore, ProjectHistoryIndex, chunk_text, split_sections
+
+
+def test_chunk_text_and_split_sections():
+    assert chunk_text("a b c d e", 2) == ["a b", "c d", "e"]
+    html = "<body><header>Top</header><section id='menu'>Menu</section><footer>Bye</footer></body>"
+    assert split_sections(html) == ["<header>Top</header>", "<section id='menu'>Menu</section>", "<footer>Bye</footer>"]
+    assert split_sections("<p>plain</p>") == ["<p>plain</p>"]
+
+
+def test_retrieves_most_relevant_history(tmp_path):
+    async def run():
+        store = HistoryStore(HashingEmbedder(), str(tmp_path), chunk_size=50, top_k=2)
+        await store.add_prompt("proj1", "Make the bakery menu show croissant prices")
+        await store.add_prompt("proj1", "Change the contact phone number in the footer")
+        await store.add_site("proj1", "<section id='gallery'>Photo gallery of cakes</section>")
+        return await store.retrieve("proj1", "update croissant prices on the menu", k=1)
+
+    assert asyncio.run(run()) == ["[prompt] Make the bakery menu show croissant prices"]
+
+
+def test_site_pages_are_indexed_with_one_embedding_call(tmp_path):
+    embedder = HashingEmbedder()
+    embedder.embed = AsyncMock(side_effect=embedder.embed)
+    store = HistoryStore(embedder, str(tmp_path))
+
+    added = asyncio.run(store.add_site("proj1", "<header>Home</header><footer>Bye</footer>", "<section>Menu</section>"))
+
+    assert added == 3
+    embedder.embed.assert_awaited_once()
+
+
+def test_index_is_memory_mapped_from_disk(tmp_path):
+    index = ProjectHistoryIndex(tmp_path / "proj", dimension=4)
+    index.add(np.eye(2, 4, dtype=np.float32) * 3, [{"kind": "prompt", "text": "x"}, {"kind": "prompt", "text": "y"}])
+
+    reopened = ProjectHistoryIndex(tmp_path / "proj", dimension=4)
+
+    assert len(reopened) == 2
+    assert isinstance(reopened._vectors, np.memmap)
+    assert reopened._vectors.dtype == np.float32
+    score, record = reopened.search(np.array([0, 1, 0, 0]), k=1)[0]
+    assert record["text"] == "y"
+    assert score == 1.0
+
+
+def test_retrieve_on_unknown_project_is_empty(tmp_path):
+    store = HistoryStore(HashingEmbedder(), str(tmp_path))
+    assert asyncio.run(store.retrieve("missing", "anything")) == []
+
+
+def test_crash_between_writes_is_truncated_to_consistent_rows(tmp_path):
+    index = ProjectHistoryIndex(tmp_path / "proj", dimension=4)
+    index.add(np.eye(2, 4, dtype=np.float32), [{"kind": "prompt", "text": "x"}, {"kind": "prompt", "text": "y"}])
+    # A crash after the vectors were appended, halfway through writing their records
+    with open(index.vectors_path, "ab") as f:
+        np.eye(2, 4, dtype=np.float32).tofile(f)
+    with open(index.records_path, "a") as f:
+        f.write('{"kind": "prompt", "text": "z", "row": 2}\n{"kind": "pro')
+
+    reopened = ProjectHistoryIndex(tmp_path / "proj", dimension=4)
+    assert [record["text"] for record in reopened.records] == ["x", "y", "z"]
+    assert index.vectors_path.stat().st_size == 3 * 4 * 4
+
+    reopened.add(np.array([[0, 0, 0, 1]]), [{"kind": "prompt", "text": "w"}])
+    assert reopened.search(np.array([0, 0, 0, 1]), k=1)[0][1]["text"] == "w"
+    # The first instance reads only the rows appended since it last synced
+    index.refresh()
+    assert [record["text"] for record in index.records] == ["x", "y", "z", "w"]
+
+
+def test_stalled_history_retrieval_does_not_hold_up_the_deploy():
+    async def stalled(project_id, query):
+        await asyncio.sleep(10)
+
+    history = SimpleNamespace(retrieve=stalled, add_prompt=AsyncMock())
+    app_state = SimpleNamespace(supabase=object(), history=history)
+    job = DeployJob.create("user1", "p1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+    payload = {"prompt": "a bakery site", "metadata": {}}
+
+    with patch.object(settings, "HISTORY_RETRIEVE_TIMEOUT_SECONDS", 0.05), \
+         patch("src.services.deploy._run_deploy_job", new_callable=AsyncMock) as deploy:
+        asyncio.run(asyncio.wait_for(run_deploy_job(app_state, job, payload), 1))
+
+    deploy.assert_awaited_once()
+    assert payload["metadata"]["relevant_history"] == []
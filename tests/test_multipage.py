@@ -0,0 +1,103 @@
+import asyncio
+import json
+import sys
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.config import settings
+from src.services.gemini import Gemini
+from src.utils.multipage import assemble_site, extract_page_blocks, parse_site_plan, wants_multi_page
+
+
+PLAN = {
+    "pages": [
+        {"file": "home.html", "title": "Home", "purpose": "Hero and highlights"},
+        {"file": "menu.html", "title": "Menu & Prices", "purpose": "Cakes and breads"},
+        {"file": "contact", "title": "Contact"},
+    ],
+    "design": {"palette": {"primary": "#c06"}, "shared_css": ":root{--primary:#c06}"},
+}
+
+
+def page_response(name):
+    return (
+        f"```html\n<html><head><title>{name}</title></head><body><header><nav data-site-nav></nav></header>"
+        f"<main>{name}</main><script src=\"script.js\"></script></body></html>\n```\n```css\nbody[data-page=\"{name}\"] main{{color:red}}\n```\n"
+        f"```javascript\nconsole.log('{name}');\n```"
+    )
+
+
+class FakeModels:
+    """Answers the planning call with PLAN and each page call after ``delay`` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model, contents, config):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if config.response_mime_type == "application/json":
+                return SimpleNamespace(text=json.dumps(PLAN), usage_metadata=None)
+            await asyncio.sleep(self.delay)
+            name = contents.rsplit('(page name "', 1)[1].split('"', 1)[0]
+            return SimpleNamespace(text=page_response(name), usage_metadata=None)
+        finally:
+            self.in_flight -= 1
+
+
+def test_detects_multi_page_requests():
+    assert wants_multi_page("A bakery site with 3 pages: home, menu, contact")
+    assert wants_multi_page("make it a multi-page website")
+    assert not wants_multi_page("A landing page for my bakery")
+
+
+def test_plan_is_normalised():
+    plan = parse_site_plan("```json\n" + json.dumps(PLAN) + "\n```", max_pages=6)
+
+    assert [page.file for page in plan.pages] == ["index.html", "menu.html", "contact.html"]
+    assert plan.shared_css == ":root{--primary:#c06}"
+    assert "shared_css" not in plan.design
+    assert len(parse_site_plan(json.dumps(PLAN), max_pages=2).pages) == 2
+
+
+def test_assembled_pages_share_navigation_and_assets():
+    plan = parse_site_plan(json.dumps(PLAN), max_pages=6)
+    pages = {page.file: extract_page_blocks(page_response(page.slug)) for page in plan.pages}
+
+    files = assemble_site(plan, pages)
+
+    assert set(files) == {"index.html", "menu.html", "contact.html", "style.css", "index.js", "menu.js", "contact.js"}
+    menu = files["menu.html"]
+    assert '<body data-page="menu">' in menu
+    assert '<a href="menu.html" aria-current="page">Menu &amp; Prices</a>' in menu
+    assert '<a href="index.html">Home</a>' in menu
+    assert 'href="style.css"' in menu and 'src="menu.js"' in menu
+    assert "script.js" not in menu and "contact.js" not in menu
+    assert files["style.css"].startswith(":root{--primary:#c06}")
+    # Page scripts are kept verbatim, so their functions stay global for inline handlers
+    assert files["contact.js"] == "console.log('contact');"
+
+
+def test_pages_are_generated_concurrently_within_the_limit():
+    models = FakeModels(delay=0.2)
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+
+    async def run():
+        with patch.object(settings, "LLM_MAX_CONCURRENCY", 2):
+            gemini = Gemini(client)
+        started = time.monotonic()
+        files = await gemini.generate_multi_page_site("A bakery site with 3 pages")
+        return files, time.monotonic() - started
+
+    files, elapsed = asyncio.run(run())
+
+    assert {"index.html", "menu.html", "contact.html"} <= set(files)
+    assert models.max_in_flight == 2
+    assert elapsed < 0.6
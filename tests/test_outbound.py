@@ -0,0 +1,64 @@
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.outbound import OutboundScheduler, Priority
+
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, client, sender, recipient, text):
+        self.sent.append((time.monotonic(), sender, recipient, text))
+
+
+def test_messages_in_window_are_merged():
+    deliver = Recorder()
+
+    async def run():
+        scheduler = OutboundScheduler(deliver, coalesce_window=0.05)
+        scheduler.enqueue(None, "wa:+1", "wa:+2", "Project not found. Returning to menu.")
+        scheduler.enqueue(None, "wa:+1", "wa:+2", "Welcome 👋")
+        assert scheduler.depth("wa:+2") == 2
+        await scheduler.close()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert [m[3] for m in deliver.sent] == ["Project not found. Returning to menu.\n\nWelcome 👋"]
+    assert scheduler.stats()["coalesced"] == 1
+    assert scheduler.depth() == 0
+
+
+def test_final_result_goes_first_and_supersedes_earlier_progress():
+    deliver = Recorder()
+
+    async def run():
+        scheduler = OutboundScheduler(deliver, coalesce_window=0.05)
+        scheduler.enqueue(None, "wa:+1", "wa:+2", "Building...", Priority.PROGRESS)
+        scheduler.enqueue(None, "wa:+1", "wa:+2", "Done: https://site")
+        scheduler.enqueue(None, "wa:+1", "wa:+3", "Building...", Priority.PROGRESS)
+        await scheduler.close()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert sorted((m[2], m[3]) for m in deliver.sent) == [("wa:+2", "Done: https://site"), ("wa:+3", "Building...")]
+    assert scheduler.stats()["dropped"] == 1
+
+
+def test_sender_rate_is_respected():
+    deliver = Recorder()
+
+    async def run():
+        scheduler = OutboundScheduler(deliver, coalesce_window=0, rate_per_sender=20, burst=1)
+        for i in range(3):
+            scheduler.enqueue(None, "wa:+1", f"wa:+{i + 10}", "hi")
+        await scheduler.close()
+
+    asyncio.run(run())
+    times = sorted(m[0] for m in deliver.sent)
+    assert len(times) == 3
+    assert times[-1] - times[0] >= 0.09
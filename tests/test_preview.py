@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from src.common.config import settings
+from src.services.artifacts import Artifact, ArtifactCache
+from src.services.deploy import publish_preview
+from src.services.deploy_jobs import DeployJob
+from src.services.outbound import Priority
+from src.utils.build import build_site
+
+
+HTML = "<!DOCTYPE html><html><head><link rel=\"stylesheet\" href=\"style.css\"></head><body><h1>Bakery</h1></body></html>"
+
+
+def site(title="Bakery"):
+    css = "".join(f".c{i}{{color:red}}" for i in range(2000))
+    return build_site({"index.html": HTML.replace("Bakery", title), "style.css": css})
+
+
+def test_lru_evicts_to_disk_and_reloads(tmp_path):
+    async def run():
+        cache = ArtifactCache(max_bytes=Artifact.from_build("p1", site()).size + 1024, directory=str(tmp_path))
+        first = await cache.put("p1", site("One"))
+        second = await cache.put("p1", site("Two"))
+        assert first.version != second.version
+        assert cache.stats()["artifacts"] == 1
+
+        reloaded = await cache.get(first.version)
+        assert reloaded.files == first.files and reloaded.etags == first.etags
+        assert reloaded.compressed["index.html"]["gzip"] == first.compressed["index.html"]["gzip"]
+        assert await cache.get("0" * 20) is None
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["disk_hits"], stats["misses"]) == (1, 1)
+
+
+def test_preview_serves_precompressed_bodies_with_etags():
+    cache = ArtifactCache(max_bytes=1 << 20)
+    job = DeployJob.create("user1", "p1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+
+    with patch('main.init_supabase_client'), patch('main.init_twilio_client'), patch('main.init_gemini_client'), \
+         patch('main.init_artifact_cache', return_value=cache), \
+         patch.object(settings, 'PUBLIC_BASE_URL', 'http://testserver'), \
+         TestClient(app) as client:
+        with patch('src.services.deploy.send_message') as send:
+            url = client.portal.call(publish_preview, app.state, job, site())
+        send.assert_called_once_with(
+            app.state.twilio, "whatsapp:+456", "whatsapp:+123", f"Preview ready while we deploy:\n{url}",
+            priority=Priority.PROGRESS,
+        )
+        root = url.removeprefix("http://testserver").rstrip("/")
+
+        redirect = client.get(root, follow_redirects=False)
+        assert redirect.status_code == 308 and redirect.headers["location"] == f"{root}/"
+
+        plain = client.get(f"{root}/", headers={"Accept-Encoding": "identity"})
+        assert plain.headers["content-type"] == "text/html; charset=utf-8"
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["content-security-policy"] == "sandbox allow-scripts"
+        assert plain.headers["x-content-type-options"] == "nosniff"
+
+        compressed = client.get(f"{root}/style.css", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.content.startswith(b".c0{color:red}")
+        assert compressed.headers["vary"] == "Accept-Encoding"
+        etag = compressed.headers["etag"]
+        assert etag.endswith('-gzip"') and etag != plain.headers["etag"]
+
+        cached = client.get(f"{root}/style.css", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+
+        assert client.get(root.replace("/p1/", "/p2/") + "/").status_code == 404
+        assert client.get(f"{root}/missing.js").status_code == 404
@@ -0,0 +1,96 @@
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.prompt_cache import FakeCacheProvider, PromptPrefixCache
+
+
+def test_prefix_is_created_once_per_model_and_reused():
+    async def run():
+        provider = FakeCacheProvider()
+        cache = PromptPrefixCache(provider, "instructions")
+        # Requests never wait for a cache to be created
+        assert await cache.get("gemini-2.5-pro") is None
+        assert await cache.get("gemini-2.5-flash") is None
+        await cache.create_pending()
+        first = await cache.get("gemini-2.5-pro")
+        second = await cache.get("gemini-2.5-pro")
+        other = await cache.get("gemini-2.5-flash")
+        cache.stop()
+        return provider, first, second, other
+
+    provider, first, second, other = asyncio.run(run())
+    assert first == second
+    assert other != first
+    assert provider.created == 2
+    assert provider.caches[first]["system_instruction"] == "instructions"
+
+
+def test_refresh_extends_prefixes_near_expiry():
+    async def run():
+        provider = FakeCacheProvider()
+        cache = PromptPrefixCache(provider, "instructions", ttl_seconds=60, refresh_margin_seconds=120)
+        await cache.get("gemini-2.5-pro")
+        await cache.create_pending()
+        await cache.refresh_due()
+        cache.stop()
+        return provider
+
+    assert asyncio.run(run()).refreshed == 1
+
+
+def test_failed_create_backs_off_and_falls_back_to_inline():
+    async def run():
+        provider = FakeCacheProvider(fail_create=True)
+        cache = PromptPrefixCache(provider, "instructions")
+        results = [await cache.get("gemini-2.5-pro")]
+        await cache.create_pending()
+        provider.fail_create = False
+        results.append(await cache.get("gemini-2.5-pro"))
+        await cache.create_pending()
+        cache.stop()
+        return provider, results
+
+    provider, results = asyncio.run(run())
+    assert results == [None, None]
+    assert provider.created == 0
+
+
+def test_prefix_below_the_minimum_is_never_cached():
+    async def run():
+        provider = FakeCacheProvider()
+        cache = PromptPrefixCache(provider, "instructions " * 100, min_tokens={"gemini-2.5-pro": 4096}, default_min_tokens=100)
+        results = [await cache.get("gemini-2.5-pro"), await cache.get("gemini-2.5-pro")]
+        await cache.create_pending()
+        results.append(await cache.get("gemini-2.5-flash"))
+        await cache.create_pending()
+        cache.stop()
+        return provider, results
+
+    provider, results = asyncio.run(run())
+    assert results == [None, None, None]
+    assert list(provider.caches.values()) == [{"model": "gemini-2.5-flash", "system_instruction": "instructions " * 100, "ttl": 3600}]
+
+
+def test_usage_reports_cached_and_uncached_tokens():
+    cache = PromptPrefixCache(FakeCacheProvider(), "instructions")
+    cache.record_usage(SimpleNamespace(prompt_token_count=1000, cached_content_token_count=800))
+    cache.record_usage(SimpleNamespace(prompt_token_count=300, cached_content_token_count=None))
+
+    stats = cache.stats()
+    assert stats["cached_input_tokens"] == 800
+    assert stats["uncached_input_tokens"] == 500
+    assert stats["requests"] == 2
+
+
+def test_prefix_below_the_minimum_is_reported_as_dormant():
+    cache = PromptPrefixCache(
+        FakeCacheProvider(), "instructions " * 100, min_tokens={"gemini-2.5-flash": 200, "gemini-2.5-pro": 4096}
+    )
+
+    stats = cache.stats()
+    assert stats["prefix_tokens"] == 325
+    assert stats["below_minimum"] == {"gemini-2.5-pro": 4096}
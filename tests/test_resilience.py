@@ -0,0 +1,144 @@
+import asyncio
+import sys
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.deploy import run_deploy_job
+from src.services.deploy_jobs import DeployJob
+from src.services.resilience import (
+    BUSY_MESSAGE, AdaptiveLimiter, CircuitBreaker, CircuitOpen, DeadlineExceeded, Overloaded, Upstream,
+    create_upstream, deadline_scope, is_upstream_failure,
+)
+
+
+def test_limiter_queues_then_sheds():
+    async def run():
+        upstream = Upstream("test", timeout_seconds=1, limiter=AdaptiveLimiter(initial_limit=1, max_limit=1, max_queue=1))
+        release = asyncio.Event()
+        first = asyncio.create_task(upstream.call(release.wait))
+        second = asyncio.create_task(upstream.call(release.wait))
+        await asyncio.sleep(0)
+        assert (upstream.limiter.in_flight, upstream.limiter.queued) == (1, 1)
+        with pytest.raises(Overloaded):
+            await upstream.call(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        return upstream
+
+    upstream = asyncio.run(run())
+    assert upstream.limiter.snapshot()["rejected"] == 1
+    assert upstream.limiter.in_flight == 0
+
+
+def test_limit_grows_while_fast_and_shrinks_when_slow_or_failing():
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=8)
+    for _ in range(8):
+        limiter.record(0.1, ok=True)
+    grown = limiter.limit
+    limiter.record(1.0, ok=True)
+    slowed = limiter.limit
+    limiter.record(0.1, ok=False)
+
+    assert grown > 5
+    assert slowed == pytest.approx(grown * 0.9)
+    assert limiter.limit == pytest.approx(slowed * 0.9)
+
+
+def test_breaker_opens_and_probes_once_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    upstream = Upstream("test", timeout_seconds=1, breaker=breaker)
+
+    async def fail():
+        raise ConnectionError("down")
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await upstream.call(fail)
+        with pytest.raises(CircuitOpen):
+            await upstream.call(fail)
+        assert not upstream.accepting()
+
+        await asyncio.sleep(0.06)
+        assert upstream.accepting()
+        probe = asyncio.create_task(upstream.call(lambda: asyncio.sleep(0.02, result="ok")))
+        await asyncio.sleep(0)
+        # Only the probe is admitted while half-open
+        assert not upstream.accepting()
+        with pytest.raises(CircuitOpen):
+            await upstream.call(fail)
+        return await probe
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_only_unhealthy_upstream_errors_count_against_it():
+    class StatusError(Exception):
+        def __init__(self, code):
+            self.code = code
+
+    assert is_upstream_failure(asyncio.TimeoutError()) and is_upstream_failure(ConnectionError("reset"))
+    assert is_upstream_failure(StatusError(503)) and is_upstream_failure(StatusError(429))
+    assert not is_upstream_failure(StatusError(400)) and not is_upstream_failure(ValueError("bad json"))
+
+    upstream = Upstream("test", timeout_seconds=1, breaker=CircuitBreaker(failure_threshold=1))
+
+    async def unparseable():
+        raise ValueError("bad json")
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await upstream.call(unparseable)
+
+    asyncio.run(run())
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+    assert upstream.failures == 0 and upstream.limiter.in_flight == 0
+
+
+def test_deadline_caps_and_skips_calls():
+    upstream = Upstream("test", timeout_seconds=10)
+    calls = []
+
+    async def slow():
+        calls.append(time.monotonic())
+        await asyncio.sleep(1)
+
+    async def run():
+        with deadline_scope(0.2):
+            with pytest.raises(asyncio.TimeoutError):
+                await upstream.call(slow)
+            with pytest.raises(DeadlineExceeded):
+                await upstream.call(slow)
+            with deadline_scope(None, detach=True):
+                assert upstream._budget(None) == 10
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert time.monotonic() - started < 0.5
+
+
+def test_shed_deploy_gets_a_friendly_reply():
+    edge = create_upstream("edge_function")
+    edge.breaker.opened_at = time.monotonic()
+    app_state = SimpleNamespace(supabase=AsyncMock(), twilio=object(), gemini=None, history=AsyncMock(**{"retrieve.return_value": []}))
+    job = DeployJob.create("user1", "p1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+    payload = {"prompt": "hi", "project_name": "Bakery", "metadata": {"project_id": "p1"}}
+
+    try:
+        with patch("src.services.deploy.get_vercel_client", return_value=None), \
+             patch("src.services.deploy.send_message") as send:
+            asyncio.run(run_deploy_job(app_state, job, payload))
+    finally:
+        create_upstream("edge_function")
+
+    app_state.supabase.functions.invoke.assert_not_called()
+    send.assert_called_once_with(app_state.twilio, "whatsapp:+456", "whatsapp:+123", BUSY_MESSAGE)
@@ -0,0 +1,84 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.router import AllModelsFailed, ModelRouter, TaskType, classify_request
+
+
+TIERS = {TaskType.NEW_SITE: ["primary", "secondary"]}
+
+
+def fake_models(delays, failures=()):
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        await asyncio.sleep(delays[model])
+        if model in failures:
+            raise RuntimeError(f"{model} is down")
+        return f"```html from {model}"
+
+    return call, calls
+
+
+def test_falls_back_when_primary_times_out():
+    router = ModelRouter(TIERS, timeout_seconds=0.05)
+    call, calls = fake_models({"primary": 1.0, "secondary": 0.0})
+
+    result = asyncio.run(router.run(TaskType.NEW_SITE, call))
+
+    assert result.model == "secondary"
+    assert calls == ["primary", "secondary"]
+    assert router.stats["primary"].error_rate() == 1.0
+
+
+def test_invalid_response_falls_back():
+    router = ModelRouter(TIERS)
+    call, _ = fake_models({"primary": 0.0, "secondary": 0.0})
+
+    result = asyncio.run(router.run(TaskType.NEW_SITE, call, validate=lambda text: "secondary" in text))
+
+    assert result.model == "secondary"
+
+
+def test_hedges_after_primary_p95():
+    router = ModelRouter(TIERS, hedge=True, min_samples=3)
+    for _ in range(3):
+        router.stats["primary"].record(0.01, ok=True)
+    call, calls = fake_models({"primary": 1.0, "secondary": 0.0})
+
+    result = asyncio.run(router.run(TaskType.NEW_SITE, call))
+
+    assert result.model == "secondary"
+    assert result.hedged
+    assert calls == ["primary", "secondary"]
+    # The cancelled primary is not counted against its health
+    assert router.stats["primary"].count == 3
+
+
+def test_degraded_model_is_tried_last():
+    router = ModelRouter(TIERS, min_samples=2)
+    for _ in range(2):
+        router.stats["primary"].record(1.0, ok=False)
+
+    assert router.candidates(TaskType.NEW_SITE) == ["secondary", "primary"]
+
+
+def test_raises_when_every_model_fails():
+    router = ModelRouter(TIERS)
+    call, _ = fake_models({"primary": 0.0, "secondary": 0.0}, failures={"primary", "secondary"})
+
+    with pytest.raises(AllModelsFailed):
+        asyncio.run(router.run(TaskType.NEW_SITE, call))
+
+
+def test_only_short_changes_to_an_existing_site_use_the_edit_tier():
+    assert classify_request("Make the header blue", has_site=True) == TaskType.EDIT
+    assert classify_request("Make the header blue", has_site=False) == TaskType.NEW_SITE
+    assert classify_request("Redesign it with a dark theme", has_site=True) == TaskType.NEW_SITE
+    assert classify_request("Build me a new site for my bakery", has_site=True) == TaskType.NEW_SITE
+    assert classify_request(" ".join(["word"] * 80), has_site=True) == TaskType.NEW_SITE
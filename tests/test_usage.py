@@ -0,0 +1,106 @@
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.config import settings
+from src.services.deploy import run_deploy_job
+from src.services.deploy_jobs import DeployJob
+from src.services.gemini import Gemini
+from src.services.usage import LLMUsage, UsageLedger, estimate_cost, record_llm_usage, usage_scope
+
+
+PRICES = {"gemini-2.5-flash": {"input": 0.30, "cached_input": 0.075, "output": 2.50}}
+
+
+class FakeModels:
+    async def generate_content(self, model, contents, config):
+        await asyncio.sleep(0.1)
+        usage = SimpleNamespace(
+            prompt_token_count=1000, cached_content_token_count=400, candidates_token_count=150, thoughts_token_count=50
+        )
+        return SimpleNamespace(text="A bakery site.", usage_metadata=usage)
+
+
+def test_cost_counts_cached_and_thinking_tokens():
+    with patch.object(settings, "LLM_MODEL_PRICES", PRICES):
+        assert estimate_cost("gemini-2.5-flash", 1_000_000, 400_000, 100_000) == pytest.approx(0.46)
+        assert estimate_cost("unknown-model", 1_000_000, 0, 0) == 0.0
+
+        usage = LLMUsage.from_metadata(
+            "gemini-2.5-flash", "summary", SimpleNamespace(prompt_token_count=10, thoughts_token_count=5),
+            queue_seconds=0, call_seconds=1,
+        )
+    assert (usage.input_tokens, usage.cached_tokens, usage.output_tokens) == (10, 0, 5)
+
+
+def test_calls_are_attributed_with_queue_and_call_latency():
+    client = SimpleNamespace(aio=SimpleNamespace(models=FakeModels()))
+    written = []
+    ledger = UsageLedger(written.append)
+
+    async def run():
+        with patch.object(settings, "LLM_MAX_CONCURRENCY", 1), \
+             patch.object(settings, "LLM_MODEL_TIERS", {"summary": ["gemini-2.5-flash"]}):
+            gemini = Gemini(client)
+        with patch.object(settings, "LLM_MODEL_PRICES", PRICES), patch("src.services.usage._ledger", ledger):
+            with usage_scope("user1", "p1") as totals:
+                await asyncio.gather(gemini.summarize_project("a bakery"), gemini.summarize_project("with a menu"))
+        return totals
+
+    totals = asyncio.run(run())
+
+    assert totals.calls == 2
+    assert (totals.input_tokens, totals.cached_tokens, totals.output_tokens) == (2000, 800, 400)
+    assert totals.model == "gemini-2.5-flash"
+    # The second call waited for the first one's upstream slot
+    assert totals.queue_seconds >= 0.09
+    assert totals.call_seconds >= 0.2
+    assert totals.cost_usd == pytest.approx(2 * (600 * 0.30 + 400 * 0.075 + 200 * 2.50) / 1_000_000)
+
+    summary = ledger.summary()
+    assert summary["users"][0]["id"] == "user1" and summary["users"][0]["calls"] == 2
+    assert summary["projects"][0]["cost_usd"] == round(totals.cost_usd, 6)
+
+
+def test_flush_writes_each_increment_once():
+    write = MagicMock()
+    ledger = UsageLedger(write)
+    usage = LLMUsage("gemini-2.5-flash", "edit", input_tokens=100, output_tokens=10, cost_usd=0.01)
+
+    ledger.record(usage, "user1", "p1")
+    ledger.record(usage, "user1", None)
+    ledger.flush()
+    ledger.flush()
+
+    assert write.call_count == 1
+    rows = {(row["scope"], row["scope_id"]): row for row in write.call_args.args[0]}
+    assert rows[("user", "user1")]["calls"] == 2 and rows[("user", "user1")]["input_tokens"] == 200
+    assert rows[("project", "p1")]["calls"] == 1
+    assert ledger.total.calls == 2
+
+
+def test_deploy_job_usage_is_written_to_its_prompt_row():
+    job = DeployJob.create("user1", "p1", "prompt1", sender="whatsapp:+456", recipient="whatsapp:+123")
+    app_state = SimpleNamespace(supabase=object(), history=AsyncMock(**{"retrieve.return_value": []}))
+
+    async def generate(app_state, job, payload):
+        record_llm_usage(LLMUsage("gemini-2.5-pro", "new_site", input_tokens=500, output_tokens=900, call_seconds=1.5, cost_usd=0.02))
+
+    with patch("src.services.deploy._run_deploy_job", generate), \
+         patch("src.services.deploy.save_prompt", AsyncMock(return_value={"id": "prompt1"})) as save, \
+         patch("src.services.deploy.update_prompt_usage", new_callable=AsyncMock) as update:
+        asyncio.run(run_deploy_job(app_state, job, {"prompt": "a bakery site", "metadata": {"message_id": "m1"}}))
+
+    assert save.await_args.kwargs["prompt_id"] == "prompt1"
+
+    update.assert_awaited_once()
+    _, prompt_id, columns = update.await_args.args
+    assert prompt_id == "prompt1"
+    assert columns["model"] == "gemini-2.5-pro"
+    assert (columns["input_tokens"], columns["output_tokens"], columns["latency_ms"]) == (500, 900, 1500)
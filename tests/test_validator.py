@@ -0,0 +1,92 @@
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.parser import extract_code_blocks
+from src.utils.validator import _local_file, check_js, fix_site, repair_site, validate_site
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Bakery</title><link rel="stylesheet" href="style.css"></head>
+<body>
+<main><section><p>Fresh bread</section></main>
+<script src="script.js"></script>
+</body>
+</html>"""
+
+
+class FakeRepairer:
+    def __init__(self, replies):
+        self.replies = replies
+        self.requests = []
+
+    async def __call__(self, name, files, problems):
+        self.requests.append((name, problems))
+        return self.replies.get(name, "")
+
+
+def test_extracts_closed_blocks_in_any_order():
+    response = "Here you go:\n```css\np { color: red; }\n```\n```html\n<p>Hi</p>\n```\n"
+
+    assert extract_code_blocks(response) == {"index.html": "<p>Hi</p>", "style.css": "p { color: red; }"}
+
+
+def test_valid_site_has_no_issues():
+    js = "const re = /[{(]/g;\nconst t = `a ${ {b: 1}.b } c`;\nif (a / 2 > 1) { run('}'); } // }"
+    files = {"index.html": PAGE.replace("</section>", "</p></section>"), "style.css": "a{color:red}", "script.js": js}
+
+    assert validate_site(files) == []
+
+
+def test_small_defects_are_fixed_locally():
+    files = {
+        "index.html": '<html><head><style src="style.css"></style></head><body><div><span>Hi</div></em></body></html>',
+        "style.css": "main { color: red; }}\n@media (max-width: 600px) { main { padding: 0; ",
+        "script.js": "document.addEventListener('DOMContentLoaded', () => {\n  init();\n",
+    }
+
+    fixed, remaining = fix_site(files)
+
+    assert remaining == []
+    assert fixed["index.html"].startswith("<!DOCTYPE html>")
+    assert '<link rel="stylesheet" href="style.css">' in fixed["index.html"]
+    assert "<div><span>Hi</span></div>" in fixed["index.html"]
+    assert "</em>" not in fixed["index.html"]
+    assert 'src="script.js"' in fixed["index.html"]
+    assert fixed["style.css"].endswith("}}") and "}}\n@media" not in fixed["style.css"]
+    assert fixed["script.js"].endswith("\n})")
+
+
+def test_only_broken_files_are_regenerated():
+    files = {"index.html": PAGE, "script.js": "const greeting = 'hello;\n"}
+    repairer = FakeRepairer({"style.css": "main { color: red; }", "script.js": "const greeting = 'hello';"})
+
+    repaired = asyncio.run(repair_site(files, repairer))
+
+    assert sorted(name for name, _ in repairer.requests) == ["script.js", "style.css"]
+    assert repaired["style.css"] == "main { color: red; }"
+    assert check_js("script.js", repaired["script.js"]) == []
+
+
+def test_link_to_a_script_that_was_not_generated_is_dropped_locally():
+    files = {"index.html": PAGE, "style.css": "main { color: red; }"}
+    repairer = FakeRepairer({})
+
+    repaired = asyncio.run(repair_site(files, repairer))
+
+    assert repairer.requests == []
+    assert "script.js" not in repaired["index.html"]
+    assert validate_site(repaired) == []
+
+
+def test_local_links_are_normalised_to_the_site_root():
+    assert _local_file("./style.css") == "style.css"
+    assert _local_file("/css/../style.css") == "style.css"
+    # Only a leading "./" is a prefix; dotfiles and dotted names are kept
+    assert _local_file(".well-known/site.json") == ".well-known/site.json"
+    assert _local_file("../secrets.txt") is None
+    assert _local_file("https://example.com/style.css") is None
+    assert _local_file("#menu") is None
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.handlers.vercel import VercelClient, VercelDeployError
+from src.services.deploy import project_slug, run_deploy_job
+from src.services.deploy_jobs import DeployJob
+
+
+class FakeVercelAPI:
+    """In-memory stand-in for the Vercel files and deployments endpoints."""
+
+    def __init__(self, building_polls=2, final_state="READY"):
+        self.blobs = {}
+        self.uploads = []
+        self.deployments = {}
+        self.building_polls = building_polls
+        self.final_state = final_state
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and request.url.path == "/v2/files":
+            sha = request.headers["x-vercel-digest"]
+            self.uploads.append(sha)
+            self.blobs[sha] = request.content
+            return httpx.Response(200, json={})
+        if request.method == "POST" and request.url.path == "/v13/deployments":
+            body = json.loads(request.content)
+            missing = [f["sha"] for f in body["files"] if f["sha"] not in self.blobs]
+            if missing:
+                return httpx.Response(400, json={"error": {"code": "missing_files", "missing": missing}})
+            deployment_id = f"dpl_{len(self.deployments) + 1}"
+            self.deployments[deployment_id] = {"polls": 0, "name": body["name"]}
+            return httpx.Response(200, json={"id": deployment_id, "readyState": "QUEUED"})
+        if request.method == "GET" and request.url.path.startswith("/v13/deployments/"):
+            deployment = self.deployments[request.url.path.rsplit("/", 1)[1]]
+            deployment["polls"] += 1
+            state = self.final_state if deployment["polls"] > self.building_polls else "BUILDING"
+            return httpx.Response(200, json={"id": "x", "readyState": state, "url": f"{deployment['name']}.vercel.app"})
+        return httpx.Response(404)
+
+    def client(self) -> VercelClient:
+        return VercelClient("token", poll_interval=0.001, transport=httpx.MockTransport(self.handler))
+
+
+FILES = {"index.html": b"<html></html>", "style.css": b"p{}", "script.js": b""}
+
+
+def test_deploy_uploads_only_missing_files_and_polls_until_ready():
+    api = FakeVercelAPI()
+
+    async def run():
+        client = api.client()
+        first = await client.deploy("bakery", FILES)
+        uploads_after_first = len(api.uploads)
+        second = await client.deploy("bakery", {**FILES, "about.html": b"<p>new</p>"})
+        await client.aclose()
+        return first, uploads_after_first, second
+
+    first, uploads_after_first, second = asyncio.run(run())
+    assert first["url"] == "https://bakery.vercel.app"
+    assert first["readyState"] == "READY"
+    assert uploads_after_first == 3
+    # Only the new file is uploaded on the second deploy
+    assert len(api.uploads) == 4
+
+
+def test_failed_deployment_raises():
+    api = FakeVercelAPI(final_state="ERROR")
+
+    with pytest.raises(VercelDeployError):
+        asyncio.run(api.client().deploy("bakery", FILES))
+
+
+def test_deploy_job_falls_back_to_edge_function():
+    failing = SimpleNamespace(deploy=AsyncMock(side_effect=VercelDeployError("down")))
+    app_state = SimpleNamespace(
+        supabase=object(),
+        twilio=object(),
+        gemini=SimpleNamespace(
+            generate_website_code=AsyncMock(return_value="```html<p></p>```css```javascript```"),
+            summarize_project=AsyncMock(return_value="summary"),
+            repair_file=AsyncMock(return_value=""),
+        ),
+        history=AsyncMock(**{"retrieve.return_value": []}),
+    )
+    job = DeployJob.create("user1", "p1", None, sender="whatsapp:+456", recipient="whatsapp:+123")
+    payload = {"prompt": "hi", "project_name": "Bakery", "metadata": {"project_id": "p1"}}
+
+    with patch("src.services.deploy.get_vercel_client", return_value=failing), \
+         patch("src.services.deploy.update_prompt_status", new=AsyncMock(return_value=True)), \
+         patch("src.services.deploy.send_message") as send, \
+         patch("src.services.deploy.trigger_edge_function_and_deploy_to_vercel",
+               new=AsyncMock(return_value={"status": "READY", "url": "https://bakery.vercel.app"})) as edge:
+        asyncio.run(run_deploy_job(app_state, job, payload))
+
+    edge.assert_awaited_once()
+    send.assert_called_once_with(
+        app_state.twilio, "whatsapp:+456", "whatsapp:+123",
+        "Your request has been processed. Current Status: READY\nhttps://bakery.vercel.app",
+    )
+
+
+def test_project_slug():
+    assert project_slug("Kathmandu Bakery!", "3f2a9c1e-0000") == "kathmandu-bakery-3f2a9c1e"
@@ -7,6 +7,15 @@ from unittest.mock import AsyncMock, MagicMock, patch
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from main import app
+from src.common.config import settings
+from src.handlers.whatsapp import compute_twilio_signature
+
+WEBHOOK_URL = "http://testserver/whatsapp-webhook"
+
+
+def twilio_headers(data):
+    """Sign a webhook form body the way Twilio does."""
+    return {"X-Twilio-Signature": compute_twilio_signature(WEBHOOK_URL, list(data.items()), settings.TWILIO_AUTH_TOKEN)}
 
 # Mock the lifespan to avoid actual client initialization
 @pytest.fixture
@@ -45,13 +54,14 @@ def test_new_user_flow(mock_send_message, mock_create_user, mock_get_user_by_pho
             mock_get_user_by_phone.return_value = None
             mock_create_user.return_value = {"id": "user123", "phone_number": "123", "state": "WAITING_FOR_PROJECT_NAME"}
             
-            response = client.post("/whatsapp-webhook", data={
+            data = {
                 "From": "whatsapp:+123",
                 "To": "whatsapp:+456",
                 "Body": "Hi",
                 "SmsMessageSid": "msg1",
                 "WaId": "123"
-            })
+            }
+            response = client.post("/whatsapp-webhook", data=data, headers=twilio_headers(data))
             
             assert response.status_code == 200
             mock_create_user.assert_called_once()
@@ -76,13 +86,14 @@ def test_create_project_flow(mock_send_message, mock_update_user_state, mock_cre
             mock_get_user_by_phone.return_value = {"id": "user123", "state": "WAITING_FOR_PROJECT_NAME"}
             mock_create_project.return_value = {"id": "proj1", "name": "Project X"}
             
-            response = client.post("/whatsapp-webhook", data={
+            data = {
                 "From": "whatsapp:+123",
                 "To": "whatsapp:+456",
                 "Body": "Project X",
                 "SmsMessageSid": "msg2",
                 "WaId": "123"
-            })
+            }
+            response = client.post("/whatsapp-webhook", data=data, headers=twilio_headers(data))
             
             assert response.status_code == 200
             mock_create_project.assert_called_with(mock_supabase, "user123", "Project X")
@@ -90,6 +101,28 @@ def test_create_project_flow(mock_send_message, mock_update_user_state, mock_cre
             mock_send_message.assert_called_with(mock_twilio, "whatsapp:+456", "whatsapp:+123", "Congratulations your project is created! Now, tell me more about this project so that I can help you build great websites.")
             print("Create Project Flow Passed")
 
+@patch('src.routes.webhook.get_user_by_phone')
+def test_unsigned_and_oversized_requests_are_rejected_before_db(mock_get_user_by_phone):
+    with patch('main.init_supabase_client', return_value=AsyncMock()), \
+         patch('main.init_twilio_client', return_value=MagicMock()), \
+         patch('main.init_gemini_client'):
+
+        with TestClient(app) as client:
+            data = {"From": "whatsapp:+123", "To": "whatsapp:+456", "Body": "Hi", "SmsMessageSid": "msg3", "WaId": "123"}
+
+            unsigned = client.post("/whatsapp-webhook", data=data)
+            forged = client.post("/whatsapp-webhook", data={**data, "Body": "Forged"}, headers=twilio_headers(data))
+            oversized = client.post(
+                "/whatsapp-webhook",
+                data={**data, "Body": "x" * (settings.WEBHOOK_MAX_BODY_BYTES + 1)},
+                headers=twilio_headers(data),
+            )
+
+            assert unsigned.status_code == 403
+            assert forged.status_code == 403
+            assert oversized.status_code == 413
+            mock_get_user_by_phone.assert_not_called()
+
 if __name__ == "__main__":
     try:
         # We need to run this with pytest usually, but for simple script execution:
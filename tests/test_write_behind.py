@@ -0,0 +1,115 @@
+import asyncio
+import sys
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.write_behind import WriteBehindBuffer
+
+
+class FakeWriter:
+    """Records bulk writes; the first ``failures`` calls fail."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, table, rows, on_conflict, ignore_duplicates):
+        self.calls.append((table, rows, on_conflict, ignore_duplicates))
+        if self.failures:
+            self.failures -= 1
+            return False
+        return True
+
+
+def test_rows_are_batched_per_table_and_flushed_on_size():
+    writer = FakeWriter()
+
+    async def run():
+        buffer = WriteBehindBuffer(writer, batch_size=3, flush_interval_seconds=10)
+        buffer.start()
+        ids = [buffer.insert("prompts", {"prompt_text": f"p{i}"}) for i in range(3)]
+        buffer.upsert("usage", {"user_id": "u1", "calls": 1}, on_conflict="user_id")
+        buffer.upsert("usage", {"user_id": "u1", "calls": 2}, on_conflict="user_id")
+        await asyncio.sleep(0.05)
+        assert [call[0] for call in writer.calls] == ["prompts"]
+        await buffer.close()
+        return ids
+
+    ids = asyncio.run(run())
+
+    table, rows, on_conflict, ignore_duplicates = writer.calls[0]
+    assert [row["id"] for row in rows] == ids
+    assert (on_conflict, ignore_duplicates) == ("id", True)
+    # Upserts of the same key are coalesced into the latest row
+    assert writer.calls[1] == ("usage", [{"user_id": "u1", "calls": 2}], "user_id", False)
+
+
+def test_failed_batches_are_retried_with_backoff():
+    writer = FakeWriter(failures=2)
+
+    async def run():
+        buffer = WriteBehindBuffer(writer, flush_interval_seconds=0.01)
+        buffer.start()
+        buffer.insert("prompts", {"prompt_text": "hi"})
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if not buffer.depth():
+                break
+        stats = buffer.stats()
+        await buffer.close()
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert len(writer.calls) == 3
+    assert (stats["queued"], stats["written"]) == (0, 1)
+
+
+def test_spooled_rows_survive_a_crash(tmp_path):
+    writer = FakeWriter()
+
+    async def run():
+        crashed = WriteBehindBuffer(FakeWriter(failures=100), spool_dir=str(tmp_path), flush_interval_seconds=10)
+        crashed.start()
+        row_id = crashed.insert("prompts", {"prompt_text": "hi"})
+        assert not await crashed.flush()
+
+        # A spool whose worker is still running is left alone
+        alive = WriteBehindBuffer(writer, spool_dir=str(tmp_path))
+        alive.start()
+        assert alive.depth() == 0
+        await alive.close()
+
+        crashed._lock_file.close()
+        recovered = WriteBehindBuffer(writer, spool_dir=str(tmp_path))
+        recovered.start()
+        assert recovered.depth() == 1
+        await recovered.close()
+        return row_id
+
+    row_id = asyncio.run(run())
+
+    assert writer.calls == [("prompts", [{"id": row_id, "prompt_text": "hi"}], "id", True)]
+    assert [path.name for path in tmp_path.iterdir()] == []
+
+
+def test_spool_adopted_by_another_worker_first_is_skipped(tmp_path):
+    (tmp_path / "1-dead.jsonl").write_text('{"table": "prompts", "on_conflict": "id", "ignore_duplicates": true, "row": {"id": "a"}}\n')
+    read_text = Path.read_text
+
+    def adopted_elsewhere(path, *args, **kwargs):
+        if path.name == "1-dead.jsonl":
+            path.unlink()
+        return read_text(path, *args, **kwargs)
+
+    async def run():
+        with patch.object(Path, "read_text", adopted_elsewhere):
+            buffer = WriteBehindBuffer(FakeWriter(), spool_dir=str(tmp_path))
+            buffer.start()
+        assert buffer.depth() == 0
+        await buffer.close()
+
+    asyncio.run(run())